@@ -18,7 +18,7 @@ const SeatBooking = ({ restaurant }) => {
   const [bookingCode, setBookingCode] = useState('');
   const [showConfirmation, setShowConfirmation] = useState(false);
   
-  const { user, guestSession, getCurrentUserId } = useAuth();
+  const { getCurrentUserId, getAuthHeaders } = useAuth();
   const { addToast } = useToast();
 
   useEffect(() => {
@@ -121,16 +121,11 @@ const SeatBooking = ({ restaurant }) => {
         total_amount: totalCost
       };
 
-      if (user) {
-        bookingData.user_id = user.user_id;
-      } else if (guestSession) {
-        bookingData.guest_id = guestSession.guest_id;
-      }
-
       const response = await fetch(`${process.env.REACT_APP_API_URL}/restaurants/${restaurant.id}/book/`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...getAuthHeaders(),
         },
         body: JSON.stringify(bookingData),
       });
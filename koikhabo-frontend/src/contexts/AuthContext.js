@@ -26,10 +26,22 @@ export const AuthProvider = ({ children }) => {
     const savedUniversity = localStorage.getItem('koikhabo_university');
 
     if (savedUser) {
-      setUser(JSON.parse(savedUser));
+      const saved = JSON.parse(savedUser);
+      if (saved.token) {
+        setUser(saved);
+      } else {
+        // Saved before logins returned a session token; log in again
+        localStorage.removeItem('koikhabo_user');
+      }
     }
     if (savedGuest) {
-      setGuestSession(JSON.parse(savedGuest));
+      const guest = JSON.parse(savedGuest);
+      if (guest.guest_token) {
+        setGuestSession(guest);
+      } else {
+        // Saved before guests were identified by token; start a fresh session
+        localStorage.removeItem('koikhabo_guest');
+      }
     }
     if (savedAdmin) {
       setAdmin(JSON.parse(savedAdmin));
@@ -132,9 +144,9 @@ export const AuthProvider = ({ children }) => {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...getAuthHeaders(),
         },
         body: JSON.stringify({
-          user_id: user.user_id,
           areas: areas
         }),
       });
@@ -155,10 +167,21 @@ export const AuthProvider = ({ children }) => {
 
   const getCurrentUserId = () => {
     if (user) return user.user_id;
-    if (guestSession) return guestSession.guest_id;
+    if (guestSession) return guestSession.session_id;
     return null;
   };
 
+  // Users send the session token from /auth/login/, guests the signed token from /auth/guest/
+  const getAuthHeaders = () => {
+    if (user && user.token) {
+      return { 'Authorization': `Bearer ${user.token}` };
+    }
+    if (guestSession && guestSession.guest_token) {
+      return { 'X-Guest-Token': guestSession.guest_token };
+    }
+    return {};
+  };
+
   const isLoggedIn = () => {
     return !!(user || guestSession);
   };
@@ -198,6 +221,7 @@ export const AuthProvider = ({ children }) => {
     selectUniversity,
     updateUserAreas,
     getCurrentUserId,
+    getAuthHeaders,
     isLoggedIn,
     isAdmin,
     isGuest,
@@ -7,7 +7,7 @@ import './Cart.css';
 
 const Cart = () => {
   const { cartItems, removeFromCart, updateQuantity, getCartTotal, clearCart } = useCart();
-  const { user, guestSession, getCurrentUserId } = useAuth();
+  const { getCurrentUserId, getAuthHeaders } = useAuth();
   const { addToast } = useToast();
   const navigate = useNavigate();
 
@@ -150,16 +150,11 @@ const Cart = () => {
           special_instructions: checkoutData.specialInstructions
         };
 
-        if (user) {
-          orderData.user_id = user.user_id;
-        } else if (guestSession) {
-          orderData.guest_id = guestSession.guest_id;
-        }
-
         const response = await fetch(`${process.env.REACT_APP_API_URL}/orders/`, {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
+            ...getAuthHeaders(),
           },
           body: JSON.stringify(orderData),
         });
@@ -8,7 +8,7 @@ const MyBookings = () => {
   const [bookings, setBookings] = useState([]);
   const [loading, setLoading] = useState(true);
   const [filter, setFilter] = useState('all'); // all, upcoming, past, cancelled
-  const { user, guestSession, getCurrentUserId } = useAuth();
+  const { getCurrentUserId, getAuthHeaders } = useAuth();
   const { addToast } = useToast();
 
   useEffect(() => {
@@ -25,14 +25,9 @@ const MyBookings = () => {
         return;
       }
 
-      let url = `${process.env.REACT_APP_API_URL}/bookings/`;
-      if (user) {
-        url += `?user_id=${user.user_id}`;
-      } else if (guestSession) {
-        url += `?guest_id=${guestSession.guest_id}`;
-      }
+      const url = `${process.env.REACT_APP_API_URL}/bookings/`;
 
-      const response = await fetch(url);
+      const response = await fetch(url, { headers: getAuthHeaders() });
 
       if (response.ok) {
         const data = await response.json();
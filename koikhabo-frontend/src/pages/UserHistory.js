@@ -9,7 +9,7 @@ const UserHistory = () => {
   const [loading, setLoading] = useState(true);
   const [filter, setFilter] = useState('all'); // all, pending, delivered, cancelled
   const [rewardPoints, setRewardPoints] = useState(0);
-  const { user, guestSession, getCurrentUserId } = useAuth();
+  const { user, getCurrentUserId, getAuthHeaders } = useAuth();
   const { addToast } = useToast();
 
   useEffect(() => {
@@ -29,15 +29,10 @@ const UserHistory = () => {
         return;
       }
 
-      let url = `${process.env.REACT_APP_API_URL}/orders/history/`;
-      if (user) {
-        url += `?user_id=${user.user_id}`;
-      } else if (guestSession) {
-        url += `?guest_id=${guestSession.guest_id}`;
-      }
+      const url = `${process.env.REACT_APP_API_URL}/orders/history/`;
 
       console.log('🔍 Fetching order history from:', url);
-      const response = await fetch(url);
+      const response = await fetch(url, { headers: getAuthHeaders() });
 
       if (response.ok) {
         const data = await response.json();
@@ -0,0 +1,167 @@
+# Aggregations behind the admin dashboard
+
+from datetime import datetime, timedelta
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncWeek
+from django.utils import timezone
+
+from .models import UserProfile, Order, Booking, Review, DailyOrderRollup
+from . import rollups
+
+
+def build_dashboard_analytics():
+    """Compute the user, restaurant and revenue aggregates shown on the admin dashboard"""
+    users = UserProfile.objects.all()
+    all_orders = Order.objects.all().order_by('-created_at')
+    all_bookings = Booking.objects.all().order_by('-created_at')
+    all_reviews = Review.objects.all()
+
+    # Revenue and per-restaurant statistics come from the daily rollups
+    by_status = rollups.summary()
+    recent = rollups.summary(since=rollups.recent_day(7))
+    total_orders = sum(row['orders'] for row in by_status.values())
+    total_revenue = sum(row['revenue'] for row in by_status.values())
+    confirmed_revenue = by_status.get('delivered', {}).get('revenue') or 0
+    recent_revenue = sum(row['revenue'] for row in recent.values())
+    restaurant_stats = rollups.restaurant_stats()
+
+    def orders_with_status(order_status):
+        return by_status.get(order_status, {}).get('orders') or 0
+
+    # User activity stats with detailed order information
+    user_stats = []
+    for user in users:
+        user_orders = all_orders.filter(user=user)
+        user_bookings = all_bookings.filter(user=user)
+        user_spent = user_orders.aggregate(total=Sum('total_amount'))['total'] or 0
+
+        # Get user's recent orders with restaurant info
+        recent_user_orders = user_orders[:5]  # Last 5 orders
+        order_details = []
+        for order in recent_user_orders:
+            order_details.append({
+                'order_id': order.id,
+                'restaurant_name': order.restaurant.name,
+                'total_amount': float(order.total_amount),
+                'status': order.status,
+                'created_at': order.created_at,
+                'items_count': order.items.count()
+            })
+
+        user_stats.append({
+            'user_id': user.id,
+            'email': user.email,
+            'name': user.name,
+            'institution': user.institution.name if user.institution else 'No Institution',
+            'total_orders': user_orders.count(),
+            'total_bookings': user_bookings.count(),
+            'total_spent': float(user_spent),
+            'reward_points': user.reward_points,
+            'last_order': user_orders.first().created_at if user_orders.exists() else None,
+            'recent_orders': order_details
+        })
+
+    # Sort users by total spent (highest spenders first)
+    user_stats.sort(key=lambda x: x['total_spent'], reverse=True)
+
+    return {
+        'generated_at': timezone.now(),
+        'users': user_stats,
+        'restaurant_stats': restaurant_stats,
+        'stats': {
+            'total_users': users.count(),
+            'total_orders': total_orders,
+            'total_bookings': all_bookings.count(),
+            'total_reviews': all_reviews.count(),
+            'total_revenue': float(total_revenue),
+            'confirmed_revenue': float(confirmed_revenue),
+            'recent_revenue': float(recent_revenue),
+            'avg_order_value': float(total_revenue / total_orders) if total_orders else 0.0,
+            'pending_orders': orders_with_status('pending'),
+            'confirmed_orders': orders_with_status('confirmed'),
+            'delivered_orders': orders_with_status('delivered'),
+            'cancelled_orders': orders_with_status('cancelled'),
+        }
+    }
+
+
+# -------------------- Time Series --------------------
+METRICS = ('revenue', 'orders', 'bookings')
+BUCKETS = {
+    'hour': (TruncHour, timedelta(hours=1)),
+    'day': (TruncDay, timedelta(days=1)),
+    'week': (TruncWeek, timedelta(weeks=1)),
+}
+MAX_POINTS = 5000
+
+
+def _bucket_start(moment, bucket):
+    """Naive local datetime at the start of the bucket containing `moment`"""
+    local = timezone.localtime(moment).replace(tzinfo=None)
+    if bucket == 'hour':
+        return local.replace(minute=0, second=0, microsecond=0)
+    local = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == 'week':
+        local -= timedelta(days=local.weekday())  # weeks start on Monday, like TruncWeek
+    return local
+
+
+def _as_local_key(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).replace(tzinfo=None) if timezone.is_aware(value) else value
+    return datetime.combine(value, datetime.min.time())  # date buckets from the rollups
+
+
+def timeseries(metric, bucket, start, end, restaurant_id=None):
+    """Bucketed metric between two aware datetimes, with empty buckets filled with 0.
+
+    Bucketing happens in SQL. Day and week revenue/order series read the daily
+    rollups; hourly series and bookings (by start_time) read the base tables.
+    """
+    trunc, step = BUCKETS[bucket]
+    first, last = _bucket_start(start, bucket), _bucket_start(end - timedelta(microseconds=1), bucket)
+    if (last - first) / step >= MAX_POINTS:
+        raise ValueError(f'Range too large for {bucket} buckets (max {MAX_POINTS} points)')
+    tz = timezone.get_current_timezone()
+
+    if metric == 'bookings':
+        rows = Booking.objects.filter(start_time__gte=start, start_time__lt=end)
+        if restaurant_id:
+            rows = rows.filter(restaurant_id=restaurant_id)
+        rows = rows.annotate(bucket=trunc('start_time', tzinfo=tz)).values('bucket').annotate(
+            value=Count('id')
+        )
+    elif bucket == 'hour':
+        rows = Order.objects.filter(created_at__gte=start, created_at__lt=end)
+        if restaurant_id:
+            rows = rows.filter(restaurant_id=restaurant_id)
+        aggregate = Sum('total_amount') if metric == 'revenue' else Count('id')
+        rows = rows.annotate(bucket=trunc('created_at', tzinfo=tz)).values('bucket').annotate(
+            value=aggregate
+        )
+    else:
+        rows = DailyOrderRollup.objects.filter(
+            # end is exclusive: a date `to` arrives as the next day's midnight
+            day__gte=timezone.localtime(start).date(),
+            day__lte=timezone.localtime(end - timedelta(microseconds=1)).date()
+        )
+        if restaurant_id:
+            rows = rows.filter(restaurant_id=restaurant_id)
+        aggregate = Sum('revenue') if metric == 'revenue' else Sum('order_count')
+        rows = rows.annotate(
+            bucket=TruncWeek('day') if bucket == 'week' else F('day')
+        ).values('bucket').annotate(value=aggregate)
+
+    values = {_as_local_key(row['bucket']): row['value'] or 0 for row in rows.order_by('bucket')}
+
+    points = []
+    current = first
+    while current <= last:
+        value = values.get(current, 0)
+        points.append({
+            't': timezone.make_aware(current).isoformat(),
+            'value': float(value) if metric == 'revenue' else int(value),
+        })
+        current += step
+    return points
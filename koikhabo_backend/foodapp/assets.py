@@ -0,0 +1,96 @@
+# Content-addressed store for restaurant branding (logo SVGs, wallpapers).
+# Each asset is written once under its SHA-256 and served by that hash with
+# immutable cache headers, so restaurant responses carry the hash, not the bytes.
+
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+
+ROOT = getattr(settings, 'ASSET_ROOT', os.path.join(settings.BASE_DIR, 'media', 'assets'))
+MAX_BYTES = getattr(settings, 'ASSET_MAX_BYTES', 2 * 1024 * 1024)
+CACHE_CONTROL = 'public, max-age=31536000, immutable'  # the bytes behind a hash never change
+# SVG may carry script; as a sandboxed document it can draw but not run anything
+SVG_POLICY = "default-src 'none'; style-src 'unsafe-inline'; sandbox"
+KINDS = ('logo', 'wallpaper')
+
+_digest_re = re.compile(r'^[0-9a-f]{64}$')
+
+
+class AssetError(Exception):
+    """Rejected asset; the message is safe to show to the uploader"""
+
+
+def sniff(data):
+    """Content type of an image we accept, judged by its bytes, or None"""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    head = data[:1024].lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if head.startswith(b'<svg') or (head.startswith((b'<?xml', b'<!--', b'<!doctype')) and b'<svg' in head):
+        return 'image/svg+xml'
+    return None
+
+
+def is_inline_svg(logo):
+    """Whether a Restaurant.logo value is SVG markup rather than an emoji"""
+    return bool(logo) and sniff(logo[:1024].encode()) == 'image/svg+xml'
+
+
+def is_digest(value):
+    return bool(_digest_re.match(value))
+
+
+def path(digest):
+    return os.path.join(ROOT, digest[:2], digest)
+
+
+def put(data):
+    """Store bytes and return their SHA-256; storing the same bytes twice is a no-op"""
+    if len(data) > MAX_BYTES:
+        raise AssetError(f'Asset is larger than {MAX_BYTES} bytes')
+    if sniff(data) is None:
+        raise AssetError('Asset must be an SVG, PNG, JPEG or WebP image')
+    digest = hashlib.sha256(data).hexdigest()
+    target = path(digest)
+    if os.path.exists(target):
+        return digest
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(target))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp, target)  # readers never see a partial file
+    except BaseException:
+        os.unlink(temp)
+        raise
+    return digest
+
+
+def read(digest):
+    with open(path(digest), 'rb') as f:
+        return f.read()
+
+
+def open_asset(digest):
+    """(binary file, content type) for a stored asset; FileNotFoundError if there is none"""
+    if not is_digest(digest):
+        raise FileNotFoundError(digest)
+    f = open(path(digest), 'rb')
+    content_type = sniff(f.read(1024)) or 'application/octet-stream'
+    f.seek(0)
+    return f, content_type
+
+
+def move_inline_logo(restaurant, default_logo):
+    """Move SVG markup in restaurant.logo to the store; True if the instance changed"""
+    if not is_inline_svg(restaurant.logo):
+        return False
+    restaurant.logo_asset = put(restaurant.logo.encode())
+    restaurant.logo = default_logo
+    return True
@@ -0,0 +1,218 @@
+# Cross-restaurant table availability. Every process keeps an index of each
+# open restaurant's capacity, features and hours plus its confirmed bookings
+# as start-sorted intervals, so a search is a bisect and a short sweep per
+# restaurant instead of a Booking query per restaurant.
+
+import bisect
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Booking, Restaurant
+
+GENERATION_KEY = 'availability:generation'
+# Query parameter -> Restaurant flag
+FEATURES = {
+    'private_room': 'has_private_room',
+    'smoking': 'has_smoking_zone',
+    'prayer': 'has_prayer_zone',
+}
+HORIZON_DAYS = getattr(settings, 'AVAILABILITY_HORIZON_DAYS', 14)  # How far ahead searches may look
+# Indexes older than this are rebuilt even without writes (rolls the horizon)
+REBUILD_SECONDS = getattr(settings, 'AVAILABILITY_REBUILD_SECONDS', 300)
+DEFAULT_DURATION = timedelta(hours=2)
+MAX_DURATION = timedelta(hours=12)
+MAX_PARTY_SIZE = 50
+SLOT_STEP = timedelta(minutes=30)  # Alternative slots are the window shifted by multiples of this
+SLOT_RANGE = timedelta(hours=2)  # ... up to this far either way
+MAX_SLOTS = 3
+
+
+class AvailabilityError(Exception):
+    """Invalid search; the message is safe to show"""
+
+
+class RestaurantSlots:
+    """One restaurant's capacity and its bookings as intervals sorted by start"""
+
+    def __init__(self, info):
+        self.info = info  # id, name, area, capacity, feature flags, opening/closing time
+        self.starts = []
+        self.intervals = []  # (start, end, seats), parallel to starts
+        self.longest = timedelta(0)  # longest booking, bounds how far back an overlap can start
+
+    def add(self, start, end, seats):
+        position = bisect.bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.intervals.insert(position, (start, end, seats))
+        self.longest = max(self.longest, end - start)
+
+    def peak(self, start, end):
+        """Most seats booked at any moment of [start, end)"""
+        first = bisect.bisect_left(self.starts, start - self.longest)
+        last = bisect.bisect_left(self.starts, end)
+        events = []
+        for booking_start, booking_end, seats in self.intervals[first:last]:
+            if booking_end > start:
+                events.append((max(booking_start, start), seats))
+                events.append((min(booking_end, end), -seats))
+        events.sort(key=lambda event: (event[0], event[1]))  # releases before claims at the same instant
+        peak = used = 0
+        for _, change in events:
+            used += change
+            peak = max(peak, used)
+        return peak
+
+    def free_seats(self, start, end):
+        return self.info['capacity'] - self.peak(start, end)
+
+    def is_open_during(self, start, end):
+        """Whether [start, end) lies inside one opening period (closing after midnight is allowed)"""
+        opening, closing = self.info['opening_time'], self.info['closing_time']
+        local_start = timezone.localtime(start)
+        for day in (local_start.date() - timedelta(days=1), local_start.date()):
+            opens = timezone.make_aware(datetime.combine(day, opening))
+            closes = timezone.make_aware(datetime.combine(day, closing))
+            if closes <= opens:
+                closes += timedelta(days=1)
+            if opens <= start and end <= closes:
+                return True
+        return False
+
+
+class AvailabilityIndex:
+    def __init__(self, generation):
+        self.generation = generation
+        self.built_at = time.monotonic()
+        now = timezone.now()
+        self.horizon = (now - MAX_DURATION, now + timedelta(days=HORIZON_DAYS) + MAX_DURATION)
+
+        self.restaurants = {
+            row['id']: RestaurantSlots(row) for row in Restaurant.objects.filter(is_open=True).values(
+                'id', 'name', 'area', 'capacity', 'opening_time', 'closing_time', *FEATURES.values()
+            )
+        }
+        bookings = Booking.objects.filter(
+            restaurant_id__in=list(self.restaurants), status='confirmed',
+            end_time__gt=self.horizon[0], start_time__lt=self.horizon[1]
+        ).annotate(seat_count=Count('seats')).values_list(
+            'restaurant_id', 'start_time', 'end_time', 'seat_codes', 'seat_count'
+        ).order_by('start_time')
+        for restaurant_id, start, end, seat_codes, seat_count in bookings:
+            seats = seat_count + len(seat_codes or [])
+            self.restaurants[restaurant_id].add(start, end, max(seats, 1))
+
+    def is_current(self, generation):
+        return generation == self.generation and time.monotonic() - self.built_at < REBUILD_SECONDS
+
+    def search(self, party_size, start, end, area=None, features=(), alternatives=False):
+        """(restaurants that can seat the party, others with free alternative slots)"""
+        available, elsewhere = [], []
+        area = area.lower() if area else None
+        for slots in self.restaurants.values():
+            info = slots.info
+            if area and info['area'].lower() != area:
+                continue
+            if not all(info[FEATURES[feature]] for feature in features):
+                continue
+            if info['capacity'] < party_size:
+                continue
+            if slots.is_open_during(start, end):
+                free = slots.free_seats(start, end)
+                if free >= party_size:
+                    available.append({**_card(info), 'free_seats': free})
+                    continue
+            if alternatives:
+                found = _alternative_slots(slots, party_size, start, end)
+                if found:
+                    elsewhere.append({**_card(info), 'slots': found})
+        available.sort(key=lambda item: (-item['free_seats'], item['name']))
+        elsewhere.sort(key=lambda item: (abs(item['slots'][0]['start'] - start), item['name']))
+        return available, elsewhere
+
+
+def _card(info):
+    return {
+        'id': info['id'], 'name': info['name'], 'area': info['area'],
+        **{flag: info[flag] for flag in FEATURES.values()},
+    }
+
+
+def _alternative_slots(slots, party_size, start, end):
+    """The nearest shifted windows (same length) that can seat the party, earliest first"""
+    now = timezone.now()
+    found = []
+    shifts = range(1, int(SLOT_RANGE / SLOT_STEP) + 1)
+    for offset in (step * SLOT_STEP * sign for step in shifts for sign in (-1, 1)):
+        slot_start, slot_end = start + offset, end + offset
+        if slot_start < now or not slots.is_open_during(slot_start, slot_end):
+            continue
+        free = slots.free_seats(slot_start, slot_end)
+        if free >= party_size:
+            found.append({'start': slot_start, 'end': slot_end, 'free_seats': free})
+            if len(found) == MAX_SLOTS:
+                break
+    return sorted(found, key=lambda slot: slot['start'])
+
+
+# -------------------- Process-wide index --------------------
+_index = None
+_index_lock = threading.Lock()
+
+
+def invalidate():
+    """Called on booking and restaurant writes; every process rebuilds on its next search"""
+    # A fresh value rather than incr: incr rewrites the key with the default
+    # timeout, and an expired-then-recounted generation could match a stale index
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def get_index():
+    global _index
+    generation = cache.get(GENERATION_KEY, 0)
+    index = _index
+    if index is None or not index.is_current(generation):
+        with _index_lock:
+            if _index is None or not _index.is_current(generation):
+                _index = AvailabilityIndex(generation)
+            index = _index
+    return index
+
+
+def parse_window(start, end):
+    """(start, end) as aware datetimes from ISO strings; end defaults to DEFAULT_DURATION later"""
+    def parse(value, name):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            raise AvailabilityError(f'{name} must be an ISO 8601 date-time')
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+    if not start:
+        raise AvailabilityError('start is required')
+    start = parse(start, 'start')
+    end = parse(end, 'end') if end else start + DEFAULT_DURATION
+    if end <= start:
+        raise AvailabilityError('end must be after start')
+    if end - start > MAX_DURATION:
+        raise AvailabilityError(f'A booking can last at most {int(MAX_DURATION.total_seconds() // 3600)} hours')
+    now = timezone.now()
+    if end <= now:
+        raise AvailabilityError('The window is in the past')
+    if start > now + timedelta(days=HORIZON_DAYS):
+        raise AvailabilityError(f'start must be within {HORIZON_DAYS} days')
+    return start, end
+
+
+def search(party_size, start, end, area=None, features=(), alternatives=False):
+    unknown = [feature for feature in features if feature not in FEATURES]
+    if unknown:
+        raise AvailabilityError(f"Unknown feature(s): {', '.join(unknown)}")
+    if not 1 <= party_size <= MAX_PARTY_SIZE:
+        raise AvailabilityError(f'party_size must be between 1 and {MAX_PARTY_SIZE}')
+    return get_index().search(party_size, start, end, area, features, alternatives)
@@ -0,0 +1,78 @@
+# Batched multi-get: the detail, menu and seat map of many restaurants in one
+# request, resolved with one query per resource type instead of one request
+# (and a handful of queries) per restaurant.
+
+from django.conf import settings
+
+from .models import MenuItem, Restaurant
+from .serializers import MenuItemSerializer, RestaurantSerializer
+from . import bestsellers, fieldsets, seatmap
+
+RESOURCES = ('detail', 'menu', 'seats')
+MAX_IDS = getattr(settings, 'BATCH_MAX_IDS', 50)
+
+
+def _restaurants(restaurant_ids, include, selected):
+    """{id: Restaurant} for the ids that exist, in request order, loading only the columns needed"""
+    restaurants = Restaurant.objects.all()
+    if 'detail' not in include:
+        restaurants = restaurants.only('id', 'name')
+    else:
+        needed = fieldsets.columns(RestaurantSerializer, selected) if selected is not None else None
+        if needed is not None:
+            restaurants = restaurants.only(*needed, 'name')  # menu items show restaurant.name
+    found = restaurants.in_bulk(restaurant_ids)
+    return {restaurant_id: found[restaurant_id] for restaurant_id in restaurant_ids if restaurant_id in found}
+
+
+def _menus(restaurants, window, selected):
+    """{id: [menu item data]} in the shape restaurant_menu returns, from one query"""
+    menu_items = MenuItem.objects.filter(restaurant_id__in=list(restaurants), is_available=True).order_by('id')
+    if selected is None or 'category_name' in selected:
+        menu_items = menu_items.select_related('category')
+    needed = fieldsets.columns(MenuItemSerializer, selected) if selected is not None else None
+    if needed is not None:
+        menu_items = menu_items.only(*needed, 'restaurant')
+    menu_items = list(menu_items)
+    for menu_item in menu_items:
+        menu_item.restaurant = restaurants[menu_item.restaurant_id]  # already loaded, no join
+
+    ranks = bestsellers.rankings(list(restaurants), window)
+    menus = {restaurant_id: [] for restaurant_id in restaurants}
+    items_data = MenuItemSerializer(menu_items, many=True, fields=selected).data
+    for item, menu_item in zip(items_data, menu_items):
+        if selected is None or 'popular_rank' in selected:
+            item['popular_rank'] = ranks[menu_item.restaurant_id].get(menu_item.id)
+        menus[menu_item.restaurant_id].append(item)
+    return menus
+
+
+def _seats(restaurants):
+    seat_maps = seatmap.get_seat_maps(list(restaurants))
+    seats = {}
+    for restaurant_id, seat_map in seat_maps.items():
+        version, seat_data = seat_map.snapshot()
+        seats[restaurant_id] = {'seats': seat_data, 'version': version, 'layout': 'restaurant'}
+    return seats
+
+
+def load(restaurant_ids, include=RESOURCES, window=bestsellers.DEFAULT_WINDOW,
+         restaurant_fields=None, menu_fields=None):
+    """{'restaurants': {id: ...}, 'menus': {id: [...]}, 'seats': {id: {...}}, 'not_found': [ids]}
+
+    Only the resources in `include` are present; the field selections are as
+    returned by fieldsets.select().
+    """
+    restaurants = _restaurants(restaurant_ids, include, restaurant_fields)
+    data = {}
+    if 'detail' in include:
+        data['restaurants'] = {
+            restaurant_id: RestaurantSerializer(restaurant, fields=restaurant_fields).data
+            for restaurant_id, restaurant in restaurants.items()
+        }
+    if 'menu' in include:
+        data['menus'] = _menus(restaurants, window, menu_fields)
+    if 'seats' in include:
+        data['seats'] = _seats(restaurants)
+    data['not_found'] = [restaurant_id for restaurant_id in restaurant_ids if restaurant_id not in restaurants]
+    return data
@@ -0,0 +1,105 @@
+# Per-restaurant best sellers over rolling 7/30-day windows, read from daily
+# per-item quantities that order writes keep up to date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyItemSales, OrderItem
+from . import rollups
+
+WINDOWS = (7, 30)
+DEFAULT_WINDOW = 7
+CACHE_SECONDS = getattr(settings, 'BESTSELLER_CACHE_SECONDS', 300)
+
+
+def _cache_key(restaurant_id, window):
+    return f'bestsellers:{restaurant_id}:{window}'
+
+
+def invalidate(restaurant_id):
+    cache.delete_many([_cache_key(restaurant_id, window) for window in WINDOWS])
+
+
+def apply(restaurant_id, menu_item_id, day, quantity):
+    if not quantity:
+        return
+    bucket = DailyItemSales.objects.filter(menu_item_id=menu_item_id, day=day)
+    if bucket.update(quantity=F('quantity') + quantity):
+        return
+    try:
+        with transaction.atomic():
+            DailyItemSales.objects.create(
+                restaurant_id=restaurant_id, menu_item_id=menu_item_id, day=day, quantity=quantity
+            )
+    except IntegrityError:
+        bucket.update(quantity=F('quantity') + quantity)  # another writer created the bucket first
+
+
+def items_ordered(order, quantities):
+    """Add (or with negative values, remove) {menu_item_id: quantity} for an order.
+
+    Called from the OrderItem signals; bulk_create callers must call this themselves.
+    """
+    day = rollups.local_day(order.created_at)
+    if day <= rollups.recent_day(max(WINDOWS)):
+        return  # outside every window
+    for menu_item_id, quantity in quantities.items():
+        apply(order.restaurant_id, menu_item_id, day, quantity)
+    invalidate(order.restaurant_id)
+
+
+def ranking(restaurant_id, window=DEFAULT_WINDOW):
+    """{menu_item_id: rank} for items sold in the last `window` days, 1 = best seller"""
+    return rankings([restaurant_id], window)[restaurant_id]
+
+
+def rankings(restaurant_ids, window=DEFAULT_WINDOW):
+    """ranking() for many restaurants: one cache round trip, one query for the misses"""
+    keys = {restaurant_id: _cache_key(restaurant_id, window) for restaurant_id in restaurant_ids}
+    cached = cache.get_many(list(keys.values()))
+    result = {restaurant_id: cached.get(key) for restaurant_id, key in keys.items()}
+    missing = [restaurant_id for restaurant_id, ranks in result.items() if ranks is None]
+    if missing:
+        rows = DailyItemSales.objects.filter(
+            restaurant_id__in=missing, day__gt=rollups.recent_day(window)
+        ).values('restaurant_id', 'menu_item_id').annotate(sold=Sum('quantity')).filter(sold__gt=0).order_by(
+            'restaurant_id', '-sold', 'menu_item_id'
+        )
+        for restaurant_id in missing:
+            result[restaurant_id] = {}
+        for row in rows:
+            ranks = result[row['restaurant_id']]
+            ranks[row['menu_item_id']] = len(ranks) + 1
+        cache.set_many({keys[restaurant_id]: result[restaurant_id] for restaurant_id in missing}, CACHE_SECONDS)
+    return result
+
+
+def rebuild():
+    """Recompute the days covered by the longest window from OrderItem.
+
+    Repairs drift in the incremental counts (e.g. from .update() or raw SQL
+    writes that skip the signals); returns the number of rows written.
+    """
+    since = rollups.recent_day(max(WINDOWS))
+
+    rows = OrderItem.objects.filter(order__created_at__date__gt=since).annotate(
+        local_day=TruncDate('order__created_at', tzinfo=timezone.get_current_timezone())
+    ).values('order__restaurant_id', 'menu_item_id', 'local_day').annotate(quantity=Sum('quantity'))
+
+    sales = [
+        DailyItemSales(restaurant_id=row['order__restaurant_id'], menu_item_id=row['menu_item_id'],
+                       day=row['local_day'], quantity=row['quantity'])
+        for row in rows if row['local_day'] > since and row['quantity']
+    ]
+    with transaction.atomic():
+        current = DailyItemSales.objects.filter(day__gt=since)
+        restaurant_ids = set(current.values_list('restaurant_id', flat=True).distinct())
+        current.delete()
+        DailyItemSales.objects.bulk_create(sales, batch_size=500)
+    for restaurant_id in restaurant_ids | {sale.restaurant_id for sale in sales}:
+        invalidate(restaurant_id)
+    return len(sales)
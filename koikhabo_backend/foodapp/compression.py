@@ -0,0 +1,119 @@
+# Response compression negotiated per request: brotli when the client accepts
+# it (and the brotli package is installed), otherwise gzip. Bodies under
+# COMPRESSION_MIN_BYTES are sent as they are, since the headers would eat the gain.
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_BYTES = getattr(settings, 'COMPRESSION_MIN_BYTES', 1024)
+BROTLI_QUALITY = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)  # 0-11; 4-6 suits dynamic responses
+MAX_RANDOM_BYTES = 100  # Random gzip header padding against BREACH, as in Django's GZipMiddleware
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/x-ndjson', 'text/', 'application/javascript',
+    'application/xml', 'image/svg+xml',
+)
+# Compressors buffer until they have a block's worth of input, which would hold
+# back every event of a live stream until it closes
+UNBUFFERED_TYPES = ('text/event-stream',)
+
+
+def supported_encodings():
+    """Encodings we can produce, in order of preference"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding, available=None):
+    """The best encoding of `available` that the Accept-Encoding header allows, or None"""
+    available = available or supported_encodings()
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+
+    best, best_q = None, 0.0
+    for coding in available:  # ties go to the earlier (preferred) encoding
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return compress_string(content, max_random_bytes=MAX_RANDOM_BYTES)
+
+
+def _brotli_sequence(chunks):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def _is_unbuffered(response):
+    return (
+        response.get('Content-Type', '').startswith(UNBUFFERED_TYPES)
+        or response.get('X-Accel-Buffering', '').lower() == 'no'
+    )
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        if response.streaming:
+            if response.is_async or _is_unbuffered(response):
+                return response
+        elif len(response.content) < MIN_BYTES:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if encoding == 'br':
+                response.streaming_content = _brotli_sequence(response.streaming_content)
+            else:
+                response.streaming_content = compress_sequence(
+                    response.streaming_content, max_random_bytes=MAX_RANDOM_BYTES
+                )
+            del response.headers['Content-Length']
+        else:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag  # the bytes differ from the identity ETag
+        response.headers['Content-Encoding'] = encoding
+        return response
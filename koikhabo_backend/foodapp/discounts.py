@@ -0,0 +1,118 @@
+# In-memory discount engine: active Discount rows compiled into a per-restaurant
+# index so the best discount for a cart is found with two binary searches.
+
+import threading
+import time
+from bisect import bisect_right
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Discount
+
+VERSION_CACHE_KEY = 'discounts:version'
+# How often a process checks the shared version for changes made by other processes
+VERSION_CHECK_SECONDS = getattr(settings, 'DISCOUNT_VERSION_CHECK_SECONDS', 5)
+
+CENT = Decimal('0.01')
+
+
+class DiscountIndex:
+    """Discounts of one restaurant split into time segments with a fixed active set.
+
+    Within a segment, discounts are sorted by minimum_order and carry the best
+    percentage seen so far, so the best applicable discount for a subtotal is the
+    entry at the rightmost minimum_order <= subtotal.
+    """
+
+    def __init__(self, discounts):
+        bounds = sorted({d['valid_from'] for d in discounts} | {d['valid_until'] for d in discounts})
+        self.bounds = bounds
+        self.segments = []  # one per [bounds[i], bounds[i + 1])
+        for start, end in zip(bounds, bounds[1:]):
+            active = sorted(
+                (d for d in discounts if d['valid_from'] <= start and d['valid_until'] >= end),
+                key=lambda d: (d['minimum_order'], -d['discount_percentage'])
+            )
+            thresholds, best = [], []
+            for discount in active:
+                # A higher threshold is only worth an entry if it unlocks a better rate
+                if best and best[-1]['discount_percentage'] >= discount['discount_percentage']:
+                    continue
+                thresholds.append(discount['minimum_order'])
+                best.append(discount)
+            self.segments.append((thresholds, best))
+
+    def best(self, subtotal, at):
+        segment = bisect_right(self.bounds, at) - 1
+        if segment < 0 or segment >= len(self.segments):
+            return None
+        thresholds, best = self.segments[segment]
+        position = bisect_right(thresholds, subtotal) - 1
+        return best[position] if position >= 0 else None
+
+
+_indexes = {}
+_lock = threading.Lock()
+_state = {'version': None, 'checked_at': 0}
+
+
+def _load(restaurant_id):
+    discounts = list(
+        Discount.objects.filter(
+            restaurant_id=restaurant_id,
+            is_active=True,
+            valid_until__gt=timezone.now()
+        ).values('id', 'name', 'discount_percentage', 'minimum_order', 'valid_from', 'valid_until')
+    )
+    return DiscountIndex(discounts)
+
+
+def _check_version():
+    """Drop every compiled index when another process has changed discounts"""
+    now = time.monotonic()
+    if now - _state['checked_at'] < VERSION_CHECK_SECONDS:
+        return
+    version = cache.get(VERSION_CACHE_KEY, 0)
+    with _lock:
+        if version != _state['version']:
+            _indexes.clear()
+            _state['version'] = version
+        _state['checked_at'] = now
+
+
+def invalidate(restaurant_id=None):
+    """Called when Discount rows change; bumps the shared version for other processes"""
+    with _lock:
+        if restaurant_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(restaurant_id, None)
+    try:
+        version = cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        version = 1
+        cache.set(VERSION_CACHE_KEY, version, None)
+    _state['version'] = version
+
+
+def get_index(restaurant_id):
+    _check_version()
+    index = _indexes.get(restaurant_id)
+    if index is None:
+        index = _load(restaurant_id)
+        with _lock:
+            _indexes[restaurant_id] = index
+    return index
+
+
+def best_discount(restaurant_id, subtotal, at=None):
+    """Return (discount dict or None, discount amount) for a cart subtotal"""
+    subtotal = Decimal(str(subtotal))
+    discount = get_index(restaurant_id).best(subtotal, at or timezone.now())
+    if discount is None:
+        return None, Decimal('0.00')
+    amount = (subtotal * discount['discount_percentage'] / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+    return discount, amount
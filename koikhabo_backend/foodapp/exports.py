@@ -0,0 +1,139 @@
+# Streaming order export for finance reconciliation
+
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order, OrderItem
+
+FORMATS = ('ndjson', 'csv')
+CHUNK_SIZE = 2000
+
+CSV_FIELDS = [
+    'order_id', 'created_at', 'restaurant_id', 'restaurant_name', 'customer_type',
+    'customer', 'status', 'payment_method', 'payment_status', 'subtotal',
+    'discount_amount', 'delivery_fee', 'total_amount', 'items_count', 'items',
+]
+STATUSES = {code for code, _ in Order.ORDER_STATUS}
+
+
+def parse_bound(value, end=False):
+    """Accept a date (whole day) or an ISO datetime; returns an aware datetime"""
+    if not value:
+        return None
+    try:
+        day = parse_date(value)  # checked first: parse_datetime also accepts bare dates
+        moment = None if day else parse_datetime(value)
+    except ValueError:
+        day = moment = None
+    if day:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    elif moment is None:
+        raise ValueError(f"Invalid date '{value}'")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_orders(date_from=None, date_to=None, restaurant=None, statuses=None):
+    orders = Order.objects.all()
+    start = parse_bound(date_from)
+    end = parse_bound(date_to, end=True)
+    if start:
+        orders = orders.filter(created_at__gte=start)
+    if end:
+        orders = orders.filter(created_at__lt=end)
+    if restaurant:
+        if not str(restaurant).isdigit():
+            raise ValueError(f"Invalid restaurant '{restaurant}'")
+        orders = orders.filter(restaurant_id=int(restaurant))
+    if statuses:
+        unknown = set(statuses) - STATUSES
+        if unknown:
+            raise ValueError(f"Unknown status '{sorted(unknown)[0]}'")
+        orders = orders.filter(status__in=statuses)
+    return orders
+
+
+def _iter_batches(orders, chunk_size):
+    """Server-side iteration in chunks, with each chunk's items fetched in one query"""
+    rows = orders.select_related('restaurant', 'user', 'guest_session').order_by('id').iterator(
+        chunk_size=chunk_size
+    )
+    batch = []
+    for order in rows:
+        batch.append(order)
+        if len(batch) >= chunk_size:
+            yield batch, _items_for(batch)
+            batch = []
+    if batch:
+        yield batch, _items_for(batch)
+
+
+def _items_for(batch):
+    items = {}
+    for item in OrderItem.objects.filter(order_id__in=[o.id for o in batch]).values(
+        'order_id', 'menu_item_id', 'menu_item__name', 'quantity', 'price'
+    ).order_by('id'):
+        items.setdefault(item['order_id'], []).append({
+            'menu_item_id': item['menu_item_id'],
+            'name': item['menu_item__name'],
+            'quantity': item['quantity'],
+            'price': str(item['price']),
+        })
+    return items
+
+
+def _order_record(order, items):
+    if order.user_id:
+        customer_type, customer = 'user', order.user.email
+    elif order.guest_session_id:
+        customer_type, customer = 'guest', order.guest_session.session_id
+    else:
+        customer_type, customer = None, None
+    return {
+        'order_id': order.id,
+        'created_at': order.created_at.isoformat(),
+        'restaurant_id': order.restaurant_id,
+        'restaurant_name': order.restaurant.name,
+        'customer_type': customer_type,
+        'customer': customer,
+        'status': order.status,
+        'payment_method': order.payment_method,
+        'payment_status': order.payment_status,
+        'subtotal': str(order.subtotal),
+        'discount_amount': str(order.discount_amount),
+        'delivery_fee': str(order.delivery_fee),
+        'total_amount': str(order.total_amount),
+        'items_count': len(items),
+        'items': items,
+    }
+
+
+def export_orders(orders, fmt, chunk_size=CHUNK_SIZE):
+    """Generator of encoded text, one chunk of orders at a time"""
+    if fmt == 'ndjson':
+        for batch, items in _iter_batches(orders, chunk_size):
+            yield ''.join(
+                json.dumps(_order_record(order, items.get(order.id, []))) + '\n'
+                for order in batch
+            )
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for batch, items in _iter_batches(orders, chunk_size):
+        for order in batch:
+            record = _order_record(order, items.get(order.id, []))
+            record['items'] = json.dumps(record['items'])
+            writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.getvalue():
+        yield buffer.getvalue()
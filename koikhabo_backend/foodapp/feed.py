@@ -0,0 +1,204 @@
+# Personalized restaurant feed. Everything that does not depend on the request
+# is precomputed: per-restaurant columns (rating + popularity base score,
+# proximity to each institution, area and cuisine postings) once per process,
+# and every user's cuisine affinities by the refresh_feed_features job into the
+# durable cache. A request is a profile lookup plus one pass over the columns.
+
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Restaurant, OrderItem
+from .serializers import RestaurantSerializer
+from . import jobs, leaderboards, profiles
+
+WEIGHTS = {
+    'proximity': 0.30,  # closeness to the user's institution
+    'area': 0.20,  # restaurant is in one of the user's preferred areas
+    'cuisine': 0.20,  # share of the user's past orders in cuisines it serves
+    'rating': 0.20,
+    'popularity': 0.10,  # orders over the last 7 days
+    **getattr(settings, 'FEED_WEIGHTS', {}),
+}
+FEATURES_TTL = getattr(settings, 'FEED_FEATURES_TTL', 300)
+CACHE_SECONDS = getattr(settings, 'FEED_CACHE_SECONDS', 60)
+USER_FEATURES_CACHE_KEY = 'feed:user-features'  # no timeout; kept in the durable cache
+# How often a process looks for a newer user-feature snapshot
+USER_FEATURES_SYNC_SECONDS = getattr(settings, 'FEED_USER_FEATURES_SYNC_SECONDS', 10)
+# Snapshots older than this get a rebuild queued (picks up new orders)
+USER_FEATURES_REBUILD_SECONDS = getattr(settings, 'FEED_USER_FEATURES_REBUILD_SECONDS', 300)
+MAX_RESULTS = 50
+PROXIMITY_SCALE_KM = 3.0  # distance at which the proximity score halves
+EARTH_RADIUS_KM = 6371
+
+
+def _cuisine_key(name):
+    return str(name).strip().lower().replace(' ', '_')
+
+
+class RestaurantFeatures:
+    """Column-oriented features of every open restaurant, index-aligned with `cards`"""
+
+    def __init__(self, restaurants, popularity):
+        self.cards = [RestaurantSerializer(r).data for r in restaurants]
+        self.ids = [r.id for r in restaurants]
+        self.lat = [math.radians(float(r.latitude)) for r in restaurants]
+        self.lon = [math.radians(float(r.longitude)) for r in restaurants]
+        self.cos_lat = [math.cos(lat) for lat in self.lat]
+        peak = max((popularity.get(r.id, 0) for r in restaurants), default=0) or 1
+        # The user-independent part of every score
+        self.base = [
+            WEIGHTS['rating'] * float(r.average_rating) / 5 + WEIGHTS['popularity'] * popularity.get(r.id, 0) / peak
+            for r in restaurants
+        ]
+        # area / cuisine -> positions of the restaurants in it, so a user's few
+        # areas and cuisines touch only the restaurants they match
+        self.by_area = defaultdict(list)
+        self.by_cuisine = defaultdict(list)
+        for i, r in enumerate(restaurants):
+            self.by_area[r.area].append(i)
+            for cuisine in {_cuisine_key(c) for c in r.cuisines or ()}:
+                self.by_cuisine[cuisine].append(i)
+        self._proximity = {}  # institution id -> weighted proximity column
+        self.built_at = time.monotonic()
+
+    def proximity(self, institution):
+        """Weighted proximity of every restaurant to an institution, computed once per institution"""
+        column = self._proximity.get(institution.id)
+        if column is None:
+            lat0, lon0 = math.radians(float(institution.latitude)), math.radians(float(institution.longitude))
+            cos_lat0 = math.cos(lat0)
+            column = []
+            for lat, lon, cos_lat in zip(self.lat, self.lon, self.cos_lat):
+                # Haversine, with the restaurant's cos(latitude) precomputed
+                h = math.sin((lat - lat0) / 2) ** 2 + cos_lat0 * cos_lat * math.sin((lon - lon0) / 2) ** 2
+                km = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+                column.append(WEIGHTS['proximity'] / (1 + km / PROXIMITY_SCALE_KM))
+            self._proximity[institution.id] = column
+        return column
+
+
+_features = None
+_lock = threading.Lock()
+
+
+def get_features():
+    global _features
+    if _features is None or time.monotonic() - _features.built_at > FEATURES_TTL:
+        popularity = leaderboards.get_leaderboards().scores['trending']
+        restaurants = list(Restaurant.objects.filter(is_open=True).order_by('id'))
+        features = RestaurantFeatures(restaurants, popularity)
+        with _lock:
+            _features = features
+    return _features
+
+
+# -------------------- User Features --------------------
+def build_user_cuisines():
+    """{user id: {cuisine: share of the user's ordered quantity}} in one GROUP BY"""
+    rows = OrderItem.objects.filter(order__user__isnull=False).values(
+        'order__user_id', 'menu_item__cuisine_type'
+    ).annotate(quantity=Sum('quantity'))
+    quantities = defaultdict(dict)
+    for row in rows:
+        if row['quantity']:
+            quantities[row['order__user_id']][_cuisine_key(row['menu_item__cuisine_type'])] = row['quantity']
+    return {
+        user_id: {cuisine: quantity / sum(by_cuisine.values()) for cuisine, quantity in by_cuisine.items()}
+        for user_id, by_cuisine in quantities.items()
+    }
+
+
+_user_cuisines = None
+_user_state = {'checked_at': 0, 'generated_at': None}
+_user_lock = threading.Lock()
+
+
+def _install_user_cuisines(cuisines, generated_at):
+    global _user_cuisines
+    _user_cuisines = cuisines
+    _user_state['generated_at'] = generated_at
+
+
+def rebuild_user_features():
+    """Recompute every user's cuisine shares and persist them; run by the refresh_feed_features job"""
+    cuisines, generated_at = build_user_cuisines(), timezone.now()
+    caches['durable'].set(USER_FEATURES_CACHE_KEY, {'cuisines': cuisines, 'generated_at': generated_at}, None)
+    with _user_lock:
+        _install_user_cuisines(cuisines, generated_at)
+    return len(cuisines)
+
+
+def request_user_features_rebuild():
+    jobs.enqueue('refresh_feed_features', priority=-10, dedup_key='refresh-feed-features')
+
+
+def get_user_cuisines():
+    """Current user -> cuisine shares, reloading a newer persisted snapshot every USER_FEATURES_SYNC_SECONDS"""
+    now = time.monotonic()
+    if _user_cuisines is not None and now - _user_state['checked_at'] < USER_FEATURES_SYNC_SECONDS:
+        return _user_cuisines
+    _user_state['checked_at'] = now
+
+    snapshot = caches['durable'].get(USER_FEATURES_CACHE_KEY)
+    if snapshot is None:
+        rebuild_user_features()  # cold cache: build once in-process
+        return _user_cuisines
+    if _user_cuisines is None or snapshot['generated_at'] > _user_state['generated_at']:
+        with _user_lock:
+            _install_user_cuisines(snapshot['cuisines'], snapshot['generated_at'])
+    if (timezone.now() - snapshot['generated_at']).total_seconds() > USER_FEATURES_REBUILD_SECONDS:
+        request_user_features_rebuild()
+    return _user_cuisines
+
+
+def user_features(user):
+    """(institution or None, preferred areas, cuisine -> share of past orders)"""
+    if user is None:
+        return None, set(), {}
+    return user.institution, set(user.preferred_areas or ()), get_user_cuisines().get(user.id, {})
+
+
+# -------------------- Ranking --------------------
+def score(features, institution, areas, cuisines):
+    """Weighted score per restaurant, in the order of features.ids"""
+    if institution is not None:
+        scores = [base + near for base, near in zip(features.base, features.proximity(institution))]
+    else:
+        scores = list(features.base)
+    for area in areas:
+        for i in features.by_area.get(area, ()):
+            scores[i] += WEIGHTS['area']
+    for cuisine, share in cuisines.items():
+        weight = WEIGHTS['cuisine'] * share
+        for i in features.by_cuisine.get(cuisine, ()):
+            scores[i] += weight
+    return scores
+
+
+def _cache_key(user_id):
+    return f'feed:{user_id or "anonymous"}'
+
+
+def invalidate(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def build_feed(user_id=None, limit=20):
+    """Ranked restaurant cards for a user (or a generic ranking without one), cached briefly"""
+    key = _cache_key(user_id)
+    results = cache.get(key)
+    if results is None:
+        user = profiles.get_profile(user_id) if user_id else None
+        features = get_features()
+        scores = score(features, *user_features(user))
+        ranked = sorted(range(len(scores)), key=lambda i: (-scores[i], features.ids[i]))[:MAX_RESULTS]
+        results = [{**features.cards[i], 'feed_score': round(scores[i], 4)} for i in ranked]
+        cache.set(key, results, CACHE_SECONDS)
+    return results[:limit]
@@ -0,0 +1,114 @@
+# Sparse fieldsets: ?fields=a,b and ?exclude=c pick the serializer fields a
+# response carries, and named presets (?fields=card) cover the usual screens.
+# The selection is pushed down with .only(), so unused columns are never read.
+
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+FULL = 'full'  # Preset every serializer has: all of its fields
+
+_field_names = {}
+
+
+class FieldsetError(APIException):
+    """Raised from views; DRF turns it into a 400 with the usual error body"""
+    status_code = status.HTTP_400_BAD_REQUEST
+
+    def __init__(self, message):
+        super().__init__(detail={'error': message})
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def field_names(serializer_class):
+    if serializer_class not in _field_names:
+        _field_names[serializer_class] = tuple(serializer_class().fields)
+    return _field_names[serializer_class]
+
+
+def select(request, serializer_class, extra=(), prefix=''):
+    """Field names requested by ?fields=/?exclude=, or None for the full representation.
+
+    `extra` names keys a view adds to the serialized data itself; `prefix` reads
+    ?<prefix>fields= instead, for responses that carry more than one kind of object.
+    """
+    fields = _split(request.GET.get(f'{prefix}fields', ''))
+    exclude = _split(request.GET.get(f'{prefix}exclude', ''))
+    if not fields and not exclude:
+        return None
+
+    known = field_names(serializer_class) + tuple(extra)
+    presets = getattr(serializer_class.Meta, 'presets', {})
+    selected, unknown = set(), []
+    for name in fields or [FULL]:
+        if name == FULL:
+            selected.update(known)
+        elif name in presets:
+            selected.update(presets[name])
+        elif name in known:
+            selected.add(name)
+        else:
+            unknown.append(name)
+    unknown += [name for name in exclude if name not in known]
+    if unknown:
+        raise FieldsetError(f"Unknown field(s): {', '.join(unknown)}")
+    selected.difference_update(exclude)
+    return None if selected.issuperset(known) else frozenset(selected)
+
+
+def cache_key(selected):
+    """Short, stable key part for a selection"""
+    if selected is None:
+        return '*'
+    return hashlib.sha1(','.join(sorted(selected)).encode()).hexdigest()[:12]
+
+
+def columns(serializer_class, selected):
+    """Model fields the selected serializer fields read, or None if that cannot be told.
+
+    Method fields declare what they read in Meta.field_sources.
+    """
+    model = serializer_class.Meta.model
+    field_sources = getattr(serializer_class.Meta, 'field_sources', {})
+    declared = serializer_class().fields
+    needed = {model._meta.pk.name}
+    for name in selected:
+        if name not in declared:
+            continue  # added by the view
+        field = declared[name]
+        if name in field_sources:
+            sources = field_sources[name]
+        elif isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            return None
+        else:
+            sources = [field.source]
+        for source in sources:
+            try:
+                model_field = model._meta.get_field(source.split('.')[0])
+            except FieldDoesNotExist:
+                return None  # a property; it may read anything
+            if model_field.concrete:
+                needed.add(model_field.name)
+    return needed
+
+
+def restrict(queryset, serializer_class, selected):
+    """Load only the columns the selection needs"""
+    if selected is None:
+        return queryset
+    needed = columns(serializer_class, selected)
+    return queryset if needed is None else queryset.only(*needed)
+
+
+def project(data, selected):
+    """Apply a selection to already serialized data (a dict or a list of dicts)"""
+    if selected is None:
+        return data
+    if isinstance(data, dict):
+        return {key: value for key, value in data.items() if key in selected}
+    return [project(item, selected) for item in data]
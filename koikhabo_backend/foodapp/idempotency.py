@@ -0,0 +1,116 @@
+# Idempotency-Key support for write views: the first successful response is
+# stored for a while and replayed to retries, and a retry that arrives while the
+# original is still running waits for it instead of executing a second time.
+
+import functools
+import hashlib
+import hmac
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import locks
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+TTL = getattr(settings, 'IDEMPOTENCY_TTL', 60 * 60 * 24)
+# How long a duplicate waits for the in-flight original before giving up
+WAIT_SECONDS = getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 10)
+LOCK_SECONDS = 60  # In-flight marker lifetime, in case a worker dies mid-request
+POLL_SECONDS = 0.05
+
+
+def _scope(request, view_name, key):
+    """Keys are per view and per caller, so two clients can never collide.
+
+    The address is left out on purpose: a client retrying from another network
+    (Wi-Fi to mobile) must still hit its original request. Legacy clients that
+    identify themselves with user_id / guest_id in the body are scoped by those.
+    """
+    data = request.data if hasattr(request.data, 'get') else {}
+    caller = '|'.join([
+        request.META.get('HTTP_AUTHORIZATION', ''),
+        request.META.get('HTTP_X_GUEST_TOKEN', ''),
+        str(data.get('user_id') or ''),
+        str(data.get('guest_id') or ''),
+    ])
+    return hashlib.sha256(f'{view_name}\n{caller}\n{key}'.encode()).hexdigest()
+
+
+def _fingerprint(request, kwargs, fields):
+    """Keyed hash of the URL arguments and the body (or only its `fields`).
+
+    It is stored for TTL, so it is an HMAC: bodies may hold phone numbers,
+    and an unkeyed hash of a short secret can be brute-forced.
+    """
+    data = request.data if fields is None else {field: request.data.get(field) for field in fields}
+    body = json.dumps({'args': kwargs, 'data': data}, sort_keys=True, default=str)
+    return hmac.new(settings.SECRET_KEY.encode(), body.encode(), hashlib.sha256).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response({'error': 'Idempotency-Key was already used with a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view=None, *, fields=None):
+    """Decorator for DRF function views; requests without the header are untouched.
+
+    `fields` limits which body fields tell a retry from a different request;
+    pass the non-secret ones for views that receive card numbers or PINs.
+    """
+    if view is None:
+        return functools.partial(idempotent, fields=fields)
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': 'Idempotency-Key is too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+        scope = _scope(request, view.__name__, key)
+        result_key, lock_key = f'idempotency:{scope}', f'idempotency:{scope}:lock'
+        fingerprint = _fingerprint(request, kwargs, fields)
+
+        deadline = time.monotonic() + WAIT_SECONDS
+        while True:
+            stored = cache.get(result_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            if locks.try_lock(lock_key, LOCK_SECONDS):
+                # The original may have stored its result and unlocked between
+                # our read and the lock; running the view again would repeat it
+                stored = cache.get(result_key)
+                if stored is None:
+                    break  # we are the original
+                locks.unlock(lock_key)
+                return _replay(stored, fingerprint)
+            if time.monotonic() >= deadline:
+                response = Response({'error': 'A request with this Idempotency-Key is still in progress'},
+                                    status=status.HTTP_409_CONFLICT)
+                response['Retry-After'] = '1'
+                return response
+            time.sleep(POLL_SECONDS)
+
+        try:
+            response = view(request, *args, **kwargs)
+            # Only successes are stored: failed attempts had no effect and may be retried
+            if 200 <= response.status_code < 300:
+                cache.set(result_key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                }, TTL)
+            return response
+        finally:
+            locks.unlock(lock_key)
+    return wrapper
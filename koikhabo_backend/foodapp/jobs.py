@@ -0,0 +1,151 @@
+# Durable background job queue stored in the application database
+
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Retry delay grows as BACKOFF_BASE * 2^attempt seconds, capped at BACKOFF_MAX
+BACKOFF_BASE = getattr(settings, 'JOB_BACKOFF_BASE_SECONDS', 5)
+BACKOFF_MAX = getattr(settings, 'JOB_BACKOFF_MAX_SECONDS', 3600)
+# A running job whose worker has been silent this long is handed to another worker
+LOCK_TIMEOUT = getattr(settings, 'JOB_LOCK_TIMEOUT_SECONDS', 600)
+
+_tasks = {}
+
+
+def task(name):
+    """Register a function as a background task under `name`"""
+    def decorator(func):
+        _tasks[name] = func
+        return func
+    return decorator
+
+
+def enqueue(task_name, payload=None, priority=0, run_at=None, delay=None,
+            dedup_key=None, max_attempts=5):
+    """Queue a task; a queued job with the same dedup_key is returned instead of a duplicate"""
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay or 0)
+
+    if dedup_key:
+        existing = Job.objects.filter(dedup_key=dedup_key, status='queued').first()
+        if existing:
+            return existing
+
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                task=task_name,
+                payload=payload or {},
+                priority=priority,
+                run_at=run_at,
+                dedup_key=dedup_key or None,
+                max_attempts=max_attempts
+            )
+    except IntegrityError:
+        # Lost a race with another request queueing the same key
+        return Job.objects.filter(dedup_key=dedup_key, status='queued').first()
+
+
+def backoff_seconds(attempts):
+    return min(BACKOFF_BASE * (2 ** max(attempts - 1, 0)), BACKOFF_MAX)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def release_stale_jobs():
+    """Requeue jobs whose worker died mid-run"""
+    cutoff = timezone.now() - timedelta(seconds=LOCK_TIMEOUT)
+    released = 0
+    for job in Job.objects.filter(status='running', locked_at__lt=cutoff):
+        try:
+            with transaction.atomic():
+                released += Job.objects.filter(id=job.id, status='running').update(
+                    status='queued', locked_by='', locked_at=None
+                )
+        except IntegrityError:
+            Job.objects.filter(id=job.id).update(status='done', finished_at=timezone.now())
+    return released
+
+
+def claim_next(worker_id):
+    """Atomically take the highest-priority due job, or return None"""
+    now = timezone.now()
+    candidates = Job.objects.filter(status='queued', run_at__lte=now).order_by(
+        '-priority', 'run_at', 'id'
+    ).values_list('id', flat=True)[:10]
+
+    for job_id in candidates:
+        # The status guard makes the UPDATE a compare-and-swap between workers
+        claimed = Job.objects.filter(id=job_id, status='queued').update(
+            status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    func = _tasks.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f"Unknown task '{job.task}'")
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Job %s (%s) failed on attempt %s", job.id, job.task, job.attempts)
+        if job.attempts >= job.max_attempts:
+            Job.objects.filter(id=job.id).update(
+                status='failed', last_error=error, locked_by='', locked_at=None,
+                finished_at=timezone.now()
+            )
+        else:
+            try:
+                with transaction.atomic():
+                    Job.objects.filter(id=job.id).update(
+                        status='queued', last_error=error, locked_by='', locked_at=None,
+                        run_at=timezone.now() + timedelta(seconds=backoff_seconds(job.attempts))
+                    )
+            except IntegrityError:
+                # A newer job with the same dedup key is already queued and supersedes this one
+                Job.objects.filter(id=job.id).update(
+                    status='done', last_error=error, locked_by='', locked_at=None,
+                    finished_at=timezone.now()
+                )
+        return False
+
+    Job.objects.filter(id=job.id).update(
+        status='done', locked_by='', locked_at=None, finished_at=timezone.now()
+    )
+    return True
+
+
+def work(worker_id=None, max_jobs=None):
+    """Run due jobs until the queue is empty (or max_jobs ran); returns the number run"""
+    worker_id = worker_id or default_worker_id()
+    release_stale_jobs()
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        job = claim_next(worker_id)
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+# Task modules register themselves on import
+from . import tasks  # noqa: E402,F401
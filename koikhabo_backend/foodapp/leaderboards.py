@@ -0,0 +1,170 @@
+# Top-K restaurant leaderboards (revenue, orders, rating, 7-day trend), per area
+# and global. Served from process memory; order writes update them in place and
+# a background job rebuilds and persists a snapshot to the shared 'durable' cache.
+
+import heapq
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Restaurant, DailyOrderRollup
+from . import jobs, rollups
+
+SNAPSHOT_CACHE_KEY = 'leaderboards:snapshot'  # no timeout; kept in the durable cache so culling does not drop it
+METRICS = ('revenue', 'orders', 'rating', 'trending')
+GLOBAL = None  # scope key of the all-areas boards
+
+TOP_K = getattr(settings, 'LEADERBOARD_SIZE', 20)
+TREND_DAYS = 7
+# How often a process looks for a newer persisted snapshot
+SYNC_SECONDS = getattr(settings, 'LEADERBOARD_SYNC_SECONDS', 10)
+# Snapshots older than this get a rebuild queued (rolls the trend window, picks up
+# writes made by other processes)
+REBUILD_SECONDS = getattr(settings, 'LEADERBOARD_REBUILD_SECONDS', 300)
+
+
+class Leaderboards:
+    """Per-metric scores for every restaurant plus the top K of each scope.
+
+    Scores are one number per restaurant, so keeping all of them is cheap; the
+    boards themselves are bounded, and a full re-rank of a scope only happens
+    when a restaurant falls out of its top K.
+    """
+
+    def __init__(self, restaurants, scores, generated_at):
+        self.restaurants = restaurants  # id -> display fields (incl. area)
+        self.scores = scores  # metric -> {restaurant id: score}
+        self.generated_at = generated_at
+        self.boards = {}  # (metric, area or GLOBAL) -> [(score, id)] best first
+        for metric in METRICS:
+            for scope in self._scopes_of_all():
+                self._rerank(metric, scope)
+
+    def _scopes_of_all(self):
+        return {GLOBAL} | {info['area'] for info in self.restaurants.values()}
+
+    def _members(self, scope):
+        return [rid for rid, info in self.restaurants.items() if scope is GLOBAL or info['area'] == scope]
+
+    def _rerank(self, metric, scope):
+        scores = self.scores[metric]
+        self.boards[(metric, scope)] = heapq.nlargest(
+            TOP_K, ((scores[rid], rid) for rid in self._members(scope) if scores.get(rid, 0) > 0)
+        )
+
+    def set_score(self, metric, restaurant_id, score):
+        info = self.restaurants.get(restaurant_id)
+        if info is None:
+            return  # restaurant added since the last rebuild
+        self.scores[metric][restaurant_id] = score
+        for scope in (GLOBAL, info['area']):
+            board = self.boards.get((metric, scope), [])
+            position = next((i for i, (_, rid) in enumerate(board) if rid == restaurant_id), None)
+            if position is not None:
+                if score <= 0 or (len(board) == TOP_K and score < board[-1][0]):
+                    self._rerank(metric, scope)  # may have dropped below an outsider
+                    continue
+                board[position] = (score, restaurant_id)
+            elif score > 0 and (len(board) < TOP_K or (score, restaurant_id) > board[-1]):
+                board.append((score, restaurant_id))
+            else:
+                continue
+            board.sort(reverse=True)
+            del board[TOP_K:]
+
+    def add(self, metric, restaurant_id, amount):
+        self.set_score(metric, restaurant_id, self.scores[metric].get(restaurant_id, 0) + amount)
+
+    def top(self, metric, area=GLOBAL, limit=TOP_K):
+        return [
+            {**self.restaurants[rid], 'rank': rank, 'score': score}
+            for rank, (score, rid) in enumerate(self.boards.get((metric, area), [])[:limit], start=1)
+        ]
+
+    def to_snapshot(self):
+        return {'restaurants': self.restaurants, 'scores': self.scores, 'generated_at': self.generated_at}
+
+
+# -------------------- Build & Persist --------------------
+def build():
+    restaurants = {
+        row['id']: row for row in Restaurant.objects.filter(is_open=True).values(
+            'id', 'name', 'area', 'logo', 'logo_asset', 'color_theme', 'average_rating', 'total_reviews'
+        )
+    }
+    scores = {metric: {} for metric in METRICS}
+    for row in DailyOrderRollup.objects.values('restaurant_id').annotate(
+        revenue=Sum('revenue'), orders=Sum('order_count')
+    ):
+        scores['revenue'][row['restaurant_id']] = float(row['revenue'] or 0)
+        scores['orders'][row['restaurant_id']] = row['orders'] or 0
+    for row in DailyOrderRollup.objects.filter(day__gt=rollups.recent_day(TREND_DAYS)).values(
+        'restaurant_id'
+    ).annotate(orders=Sum('order_count')):
+        scores['trending'][row['restaurant_id']] = row['orders'] or 0
+    for rid, info in restaurants.items():
+        scores['rating'][rid] = float(info['average_rating'])
+        info['average_rating'] = str(info['average_rating'])
+    return Leaderboards(restaurants, scores, timezone.now())
+
+
+def rebuild():
+    """Rebuild from the rollups and persist; run by the refresh_leaderboards job"""
+    boards = build()
+    caches['durable'].set(SNAPSHOT_CACHE_KEY, boards.to_snapshot(), None)
+    _install(boards)
+    return boards
+
+
+# -------------------- Process State --------------------
+_boards = None
+_lock = threading.Lock()
+_state = {'checked_at': 0}
+
+
+def _install(boards):
+    global _boards
+    with _lock:
+        _boards = boards
+
+
+def request_rebuild():
+    jobs.enqueue('refresh_leaderboards', priority=-10, dedup_key='refresh-leaderboards')
+
+
+def get_leaderboards():
+    """Current boards, reloading a newer persisted snapshot every SYNC_SECONDS"""
+    now = time.monotonic()
+    if _boards is not None and now - _state['checked_at'] < SYNC_SECONDS:
+        return _boards
+    _state['checked_at'] = now
+
+    snapshot = caches['durable'].get(SNAPSHOT_CACHE_KEY)
+    if snapshot is None:
+        return rebuild()  # cold cache: build once in-process
+    if _boards is None or snapshot['generated_at'] > _boards.generated_at:
+        _install(Leaderboards(snapshot['restaurants'], snapshot['scores'], snapshot['generated_at']))
+    if (timezone.now() - snapshot['generated_at']).total_seconds() > REBUILD_SECONDS:
+        request_rebuild()
+    return _boards
+
+
+def top(metric, area=GLOBAL, limit=TOP_K):
+    return get_leaderboards().top(metric, area or GLOBAL, limit)
+
+
+# -------------------- Write Hooks --------------------
+def order_changed(order, sign):
+    """Count a created (+1) or deleted (-1) order; edits wait for the next rebuild"""
+    if _boards is None:
+        return  # nothing loaded in this process yet
+    with _lock:
+        _boards.add('revenue', order.restaurant_id, sign * float(order.total_amount))
+        _boards.add('orders', order.restaurant_id, sign)
+        if rollups.local_day(order.created_at) > rollups.recent_day(TREND_DAYS):
+            _boards.add('trending', order.restaurant_id, sign)
+
@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import Resolver404, resolve
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from foodapp import compression
+from foodapp.models import Restaurant
+from foodapp.renderers import FastJSONRenderer
+
+
+def _cpu_ms(func, iterations):
+    """Mean CPU milliseconds per call, and the last result"""
+    started = time.process_time()
+    for _ in range(iterations):
+        result = func()
+    return (time.process_time() - started) * 1000 / iterations, result
+
+
+class Command(BaseCommand):
+    help = 'Report response bytes and rendering/compression CPU per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', metavar='PATH',
+                            help='API paths with query string (default: the main public endpoints)')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--admin', default=settings.ADMIN_USERS[0], help='admin_name for admin endpoints')
+
+    def default_paths(self, admin):
+        restaurant = Restaurant.objects.order_by('id').first()
+        paths = ['/api/restaurants/', '/api/feed/', f'/api/admin/dashboard/?admin_name={admin}']
+        if restaurant:
+            paths[1:1] = [f'/api/restaurants/{restaurant.id}/', f'/api/restaurants/{restaurant.id}/menu/']
+        return paths
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        factory = APIRequestFactory()
+        renderers = [('drf', JSONRenderer()), ('orjson', FastJSONRenderer())]
+        encodings = compression.supported_encodings()
+
+        header = f"{'endpoint':<44}{'json B':>10}{'drf ms':>9}{'orjson ms':>11}"
+        for encoding in encodings:
+            header += f"{encoding + ' B':>10}{encoding + ' ms':>9}"
+        self.stdout.write(header)
+
+        for path in options['paths'] or self.default_paths(options['admin']):
+            url = path.partition('?')[0]
+            try:
+                match = resolve(url)
+            except Resolver404:
+                raise CommandError(f'No view for {url}')
+            response = match.func(factory.get(path), *match.args, **match.kwargs)
+            if response.status_code != 200:
+                self.stdout.write(f'{path:<44}  skipped (HTTP {response.status_code})')
+                continue
+
+            row = f'{path[:43]:<44}'
+            body = None
+            for name, renderer in renderers:
+                cpu, body = _cpu_ms(lambda: renderer.render(response.data), iterations)
+                if name == 'drf':
+                    row += f'{len(body):>10}'
+                row += f'{cpu:>{9 if name == "drf" else 11}.2f}'
+            for encoding in encodings:
+                cpu, compressed = _cpu_ms(lambda: compression.compress(body, encoding), iterations)
+                row += f'{len(compressed):>10}{cpu:>9.2f}'
+            self.stdout.write(row)
+
+        if 'br' not in encodings:
+            self.stdout.write(self.style.WARNING('brotli is not installed; only gzip was measured'))
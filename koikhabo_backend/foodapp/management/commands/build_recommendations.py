@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from foodapp import jobs, recommendations
+
+
+class Command(BaseCommand):
+    help = 'Update the "ordered together" item matrix with orders placed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Discard the stored matrix and rebuild from every order')
+        parser.add_argument('--schedule', type=int, metavar='SECONDS',
+                            help='Instead of building now, queue a recurring incremental build for run_jobs')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            job = jobs.enqueue('build_recommendations', {
+                'interval': options['schedule']
+            }, priority=-5, dedup_key='build-recommendations')
+            self.stdout.write(f"Recommendations scheduled every {options['schedule']}s (job {job.id})")
+            return
+
+        report = recommendations.build(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Folded in {report['orders']} orders, refreshed {report['items_refreshed']} of "
+            f"{report['items']} items in {report['seconds']}s"
+        ))
@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foodapp import menu_io
+from foodapp.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = 'Stream a restaurant menu as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('restaurant_id', type=int)
+        parser.add_argument('--format', choices=menu_io.FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            restaurant = Restaurant.objects.get(id=options['restaurant_id'])
+        except Restaurant.DoesNotExist:
+            raise CommandError('Restaurant not found')
+
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for chunk in menu_io.export_menu(restaurant, options['format']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foodapp import menu_io
+from foodapp.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = 'Bulk upsert a restaurant menu from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('restaurant_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=menu_io.FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--dry-run', action='store_true', help='Validate without writing')
+        parser.add_argument('--batch-size', type=int, default=menu_io.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            restaurant = Restaurant.objects.get(id=options['restaurant_id'])
+        except Restaurant.DoesNotExist:
+            raise CommandError('Restaurant not found')
+
+        path = Path(options['path'])
+        fmt = options['format'] or ('ndjson' if path.suffix.lower() in ('.ndjson', '.jsonl') else 'csv')
+
+        with path.open('rb') as stream:
+            report = menu_io.import_menu(
+                restaurant, stream, fmt,
+                dry_run=options['dry_run'], batch_size=options['batch_size']
+            )
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        if report['errors']:
+            raise CommandError(f"{report['invalid_rows']} invalid rows, nothing imported")
+
+        verb = ('Would create', 'update') if report['dry_run'] else ('Created', 'updated')
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb[0]} {report['created']} and {verb[1]} {report['updated']} menu items"
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from foodapp import bestsellers, jobs
+
+
+class Command(BaseCommand):
+    help = 'Recount the best-seller days from OrderItem, repairing drift in the incremental counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', type=int, metavar='SECONDS',
+                            help='Instead of rebuilding now, queue a recurring rebuild job for run_jobs')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            job = jobs.enqueue('rebuild_bestsellers', {
+                'interval': options['schedule']
+            }, priority=-5, dedup_key='rebuild-bestsellers')
+            self.stdout.write(f"Best-seller rebuild scheduled every {options['schedule']}s (job {job.id})")
+            return
+
+        rows = bestsellers.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily item sales rows"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from foodapp import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily order rollups for a date range (default: everything)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First local day (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='end', help='Last local day (YYYY-MM-DD), inclusive')
+
+    def handle(self, *args, **options):
+        start = parse_date(options['start']) if options['start'] else None
+        end = parse_date(options['end']) if options['end'] else None
+        if (options['start'] and start is None) or (options['end'] and end is None):
+            raise CommandError('Dates must be YYYY-MM-DD')
+
+        buckets = rollups.rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {buckets} rollup buckets"))
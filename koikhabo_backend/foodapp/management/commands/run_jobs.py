@@ -0,0 +1,52 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from foodapp import jobs
+
+
+def _worker_loop(worker_id, sleep, burst):
+    connections.close_all()  # never share a connection inherited from the parent
+    while True:
+        processed = jobs.work(worker_id=worker_id)
+        if burst and not processed:
+            return
+        if not processed:
+            time.sleep(sleep)
+
+
+class Command(BaseCommand):
+    help = 'Run background job queue workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Number of worker processes')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        processes = max(options['processes'], 1)
+        base_id = jobs.default_worker_id()
+        self.stdout.write(f"Starting {processes} job worker(s)...")
+
+        if processes == 1:
+            _worker_loop(base_id, options['sleep'], options['burst'])
+            return
+
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=_worker_loop,
+                args=(f"{base_id}/{n}", options['sleep'], options['burst'])
+            )
+            for n in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from foodapp.mock_gateway import FAULTS, make_server
+
+
+class Command(BaseCommand):
+    help = 'Serve a local mock of the bKash/Nagad/card payment gateways with optional fault injection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--seed', type=int, help='Seed for reproducible fault injection')
+        for fault, default in FAULTS.items():
+            parser.add_argument(f"--{fault.replace('_', '-')}", type=float, default=default, dest=fault)
+
+    def handle(self, *args, **options):
+        server = make_server(options['host'], options['port'],
+                             {fault: options[fault] for fault in FAULTS}, options['seed'])
+        host, port = server.server_address
+        self.stdout.write(self.style.SUCCESS(
+            f'Mock payment gateway on http://{host}:{port}/<bkash|nagad|card>/charges '
+            '(POST /_control to change faults, GET /_stats for counters)'
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
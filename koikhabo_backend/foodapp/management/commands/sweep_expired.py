@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from foodapp import jobs, sweeper
+
+
+class Command(BaseCommand):
+    help = 'Delete expired seat occupancies, stale guest sessions and old item sales in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=sweeper.BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument('--archive', action='store_true', help='Write removed rows to gzipped NDJSON first')
+        parser.add_argument('--schedule', type=int, metavar='SECONDS',
+                            help='Instead of sweeping now, queue a recurring sweep job for run_jobs')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            job = jobs.enqueue('sweep_expired', {
+                'interval': options['schedule'],
+                'archive': options['archive']
+            }, priority=-5, dedup_key='sweep-expired')
+            self.stdout.write(f"Sweep scheduled every {options['schedule']}s (job {job.id})")
+            return
+
+        report = sweeper.sweep(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            archive=options['archive'],
+            pause=options['pause']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Reclaimed {report['occupied_seats']} occupied seats, {report['guest_sessions']} guest sessions "
+            f"and {report['item_sales']} item sales rows in {report['seconds']}s"
+        ))
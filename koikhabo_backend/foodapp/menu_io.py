@@ -0,0 +1,253 @@
+# Streaming bulk import and export of MenuItem rows as CSV or NDJSON
+
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import MenuItem, FoodCategory
+from . import pricing, singleflight
+
+FORMATS = ('csv', 'ndjson')
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+EXPORT_FIELDS = [
+    'id', 'name', 'description', 'price', 'cuisine_type', 'category',
+    'is_vegetarian', 'spice_level', 'is_available', 'image_url',
+    'is_student_set', 'set_items', 'requires_student_id',
+]
+UPDATE_FIELDS = [field for field in EXPORT_FIELDS if field not in ('id', 'category')] + ['category']
+
+CUISINES = {code for code, _ in MenuItem.CUISINE_CHOICES}
+SPICE_LEVELS = {1, 2, 3}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+
+
+class MenuImportError(Exception):
+    pass
+
+
+# -------------------- Parsing --------------------
+def _iter_text_lines(stream):
+    """Decode a binary stream (request body or uploaded file) line by line"""
+    first = True
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8-sig' if first else 'utf-8')
+        first = False
+        yield line
+
+
+def iter_rows(stream, fmt):
+    """Yield (line_number, raw dict) without reading the whole payload into memory"""
+    lines = _iter_text_lines(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, None
+                continue
+            yield line_number, row
+    else:
+        raise MenuImportError(f"Unsupported format '{fmt}'")
+
+
+def _to_bool(value, field, default=False):
+    """A blank or missing value is the field's model default"""
+    if isinstance(value, bool):
+        return value
+    text = str(value if value is not None else '').strip().lower()
+    if not text:
+        return default
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"{field} must be true or false")
+
+
+def clean_row(row, categories):
+    """Validate one raw row; returns a dict of MenuItem field values"""
+    if not isinstance(row, dict):
+        raise ValueError('Malformed row')
+
+    name = (row.get('name') or '').strip()
+    if not name:
+        raise ValueError('name is required')
+    if len(name) > 100:
+        raise ValueError('name is longer than 100 characters')
+
+    try:
+        price = Decimal(str(row.get('price', '')).strip())
+    except InvalidOperation:
+        raise ValueError('price must be a number')
+    if price < 0 or price >= Decimal('10000'):
+        raise ValueError('price must be between 0 and 9999.99')
+
+    cuisine_type = (row.get('cuisine_type') or '').strip()
+    if cuisine_type not in CUISINES:
+        raise ValueError(f"cuisine_type must be one of {', '.join(sorted(CUISINES))}")
+
+    category = categories.get((row.get('category') or '').strip().lower())
+    if category is None:
+        raise ValueError(f"Unknown category '{row.get('category')}'")
+
+    try:
+        spice_level = int(row.get('spice_level') or 1)
+    except (TypeError, ValueError):
+        raise ValueError('spice_level must be 1, 2 or 3')
+    if spice_level not in SPICE_LEVELS:
+        raise ValueError('spice_level must be 1, 2 or 3')
+
+    set_items = row.get('set_items') or []
+    if isinstance(set_items, str):
+        set_items = [item.strip() for item in set_items.split('|') if item.strip()]
+
+    item_id = row.get('id')
+    try:
+        item_id = int(item_id) if item_id not in (None, '') else None
+    except (TypeError, ValueError):
+        raise ValueError('id must be an integer')
+
+    return {
+        'id': item_id,
+        'name': name,
+        'description': row.get('description') or '',
+        'price': price.quantize(Decimal('0.01')),
+        'cuisine_type': cuisine_type,
+        'category': category,
+        'is_vegetarian': _to_bool(row.get('is_vegetarian'), 'is_vegetarian'),
+        'spice_level': spice_level,
+        'is_available': _to_bool(row.get('is_available'), 'is_available', default=True),
+        'image_url': row.get('image_url') or '',
+        'is_student_set': _to_bool(row.get('is_student_set'), 'is_student_set'),
+        'set_items': list(set_items),
+        'requires_student_id': _to_bool(row.get('requires_student_id'), 'requires_student_id'),
+    }
+
+
+# -------------------- Import --------------------
+def import_menu(restaurant, stream, fmt, dry_run=False, batch_size=BATCH_SIZE):
+    """Upsert rows for `restaurant` in batches inside one transaction.
+
+    Rows match existing items by id, then by name. Any invalid row rolls the
+    whole import back; dry_run validates and counts without writing.
+    """
+    categories = {c.name.lower(): c for c in FoodCategory.objects.all()}
+    existing_ids = set()
+    existing_by_name = {}
+    for item_id, name in MenuItem.objects.filter(restaurant=restaurant).values_list('id', 'name'):
+        existing_ids.add(item_id)
+        existing_by_name.setdefault(name, item_id)
+
+    report = {'created': 0, 'updated': 0, 'rows': 0, 'invalid_rows': 0, 'errors': [], 'dry_run': dry_run}
+    to_create, to_update = [], []
+    seen = set()  # item ids being updated and names being created
+
+    def add_error(line_number, message):
+        report['invalid_rows'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line_number, 'error': message})
+
+    def flush():
+        if not dry_run and not report['errors']:
+            if to_create:
+                MenuItem.objects.bulk_create(to_create, batch_size=batch_size)
+            if to_update:
+                MenuItem.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=batch_size)
+        to_create.clear()
+        to_update.clear()
+
+    with transaction.atomic():
+        for line_number, raw in iter_rows(stream, fmt):
+            report['rows'] += 1
+            try:
+                values = clean_row(raw, categories)
+            except ValueError as e:
+                add_error(line_number, str(e))
+                continue
+
+            item_id = values.pop('id')
+            if item_id is not None and item_id not in existing_ids:
+                add_error(line_number, f'Menu item {item_id} does not belong to this restaurant')
+                continue
+            item_id = item_id or existing_by_name.get(values['name'])
+
+            key = item_id or values['name']
+            if key in seen:
+                add_error(line_number, f"Duplicate row for '{values['name']}'")
+                continue
+            seen.add(key)
+
+            if item_id is None:
+                to_create.append(MenuItem(restaurant=restaurant, **values))
+                report['created'] += 1
+            else:
+                to_update.append(MenuItem(id=item_id, restaurant=restaurant, **values))
+                report['updated'] += 1
+
+            if len(to_create) + len(to_update) >= batch_size:
+                flush()
+
+        flush()
+        if dry_run or report['errors']:
+            transaction.set_rollback(True)
+
+    if not dry_run and not report['errors']:
+        # Bulk writes skip the MenuItem signals
+        pricing.invalidate(restaurant.id)
+        singleflight.expire(f'restaurant:{restaurant.id}')
+    return report
+
+
+# -------------------- Export --------------------
+def _export_values(item):
+    return {
+        'id': item.id,
+        'name': item.name,
+        'description': item.description,
+        'price': str(item.price),
+        'cuisine_type': item.cuisine_type,
+        'category': item.category.name,
+        'is_vegetarian': item.is_vegetarian,
+        'spice_level': item.spice_level,
+        'is_available': item.is_available,
+        'image_url': item.image_url,
+        'is_student_set': item.is_student_set,
+        'set_items': item.set_items,
+        'requires_student_id': item.requires_student_id,
+    }
+
+
+def export_menu(restaurant, fmt, chunk_size=BATCH_SIZE):
+    """Generator of encoded lines; rows are fetched with a server-side iterator"""
+    items = MenuItem.objects.filter(restaurant=restaurant).select_related('category').order_by('id')
+
+    if fmt == 'ndjson':
+        for item in items.iterator(chunk_size=chunk_size):
+            yield json.dumps(_export_values(item)) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for item in items.iterator(chunk_size=chunk_size):
+        values = _export_values(item)
+        values['set_items'] = '|'.join(values['set_items'])
+        writer.writerow(values)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.getvalue():
+        yield buffer.getvalue()
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0003_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='guestsession',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='occupiedseat',
+            name='occupied_until',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
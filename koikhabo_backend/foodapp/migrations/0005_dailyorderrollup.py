@@ -0,0 +1,62 @@
+# Generated by Django 5.2.4 on 2026-10-19 14:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    """Rollups for the existing orders; a frozen copy of rollups.rebuild() so later
+    changes to that module cannot break replaying this migration"""
+    Order = apps.get_model('foodapp', 'Order')
+    OrderItem = apps.get_model('foodapp', 'OrderItem')
+    DailyOrderRollup = apps.get_model('foodapp', 'DailyOrderRollup')
+    tz = timezone.get_current_timezone()
+
+    buckets = {}
+    for row in Order.objects.annotate(local_day=TruncDate('created_at', tzinfo=tz)).values(
+        'restaurant_id', 'local_day', 'status'
+    ).annotate(order_count=Count('id'), revenue=Sum('total_amount')):
+        key = (row['restaurant_id'], row['local_day'], row['status'])
+        buckets[key] = DailyOrderRollup(
+            restaurant_id=key[0], day=key[1], status=key[2],
+            order_count=row['order_count'], revenue=row['revenue'] or 0, item_count=0
+        )
+
+    for row in OrderItem.objects.annotate(local_day=TruncDate('order__created_at', tzinfo=tz)).values(
+        'order__restaurant_id', 'local_day', 'order__status'
+    ).annotate(quantity=Sum('quantity')):
+        key = (row['order__restaurant_id'], row['local_day'], row['order__status'])
+        if key in buckets:
+            buckets[key].item_count = row['quantity'] or 0
+
+    DailyOrderRollup.objects.bulk_create(buckets.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0004_ttl_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrderRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('preparing', 'Preparing'), ('ready', 'Ready for Pickup'), ('out_for_delivery', 'Out for Delivery'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('item_count', models.IntegerField(default=0)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='foodapp.restaurant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'status'], name='rollup_day_status_idx')],
+                'unique_together': {('restaurant', 'day', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
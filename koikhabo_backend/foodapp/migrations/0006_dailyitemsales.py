@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-19 15:03
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+BACKFILL_DAYS = 30  # the longest best-seller window when this migration was written
+
+
+def backfill_item_sales(apps, schema_editor):
+    """Daily item sales for the last BACKFILL_DAYS; a frozen copy of bestsellers.rebuild()
+    so later changes to that module cannot break replaying this migration"""
+    OrderItem = apps.get_model('foodapp', 'OrderItem')
+    DailyItemSales = apps.get_model('foodapp', 'DailyItemSales')
+    since = timezone.localdate() - timedelta(days=BACKFILL_DAYS)
+
+    rows = OrderItem.objects.filter(order__created_at__date__gt=since).annotate(
+        local_day=TruncDate('order__created_at', tzinfo=timezone.get_current_timezone())
+    ).values('order__restaurant_id', 'menu_item_id', 'local_day').annotate(quantity=Sum('quantity'))
+    DailyItemSales.objects.bulk_create([
+        DailyItemSales(restaurant_id=row['order__restaurant_id'], menu_item_id=row['menu_item_id'],
+                       day=row['local_day'], quantity=row['quantity'])
+        for row in rows if row['local_day'] > since and row['quantity']
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0005_dailyorderrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='foodapp.menuitem')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_item_sales', to='foodapp.restaurant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['restaurant', 'day'], name='item_sales_restaurant_day_idx')],
+                'unique_together': {('menu_item', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_item_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0006_dailyitemsales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='payment_reference',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:24
+
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copies of the foodapp.assets store layout and SVG check as of this
+# migration, so later changes to that module cannot break replaying it
+ASSET_ROOT = getattr(settings, 'ASSET_ROOT', os.path.join(settings.BASE_DIR, 'media', 'assets'))
+
+
+def _asset_path(digest):
+    return os.path.join(ASSET_ROOT, digest[:2], digest)
+
+
+def _is_svg(data):
+    head = data[:1024].lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    return head.startswith(b'<svg') or (head.startswith((b'<?xml', b'<!--', b'<!doctype')) and b'<svg' in head)
+
+
+def _put(data):
+    digest = hashlib.sha256(data).hexdigest()
+    target = _asset_path(digest)
+    if os.path.exists(target):
+        return digest
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(target))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp, target)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    return digest
+
+
+def move_inline_logos(apps, schema_editor):
+    Restaurant = apps.get_model('foodapp', 'Restaurant')
+    default_logo = Restaurant._meta.get_field('logo').default
+    for restaurant in Restaurant.objects.only('id', 'logo').iterator():
+        if restaurant.logo and _is_svg(restaurant.logo.encode()):
+            restaurant.logo_asset = _put(restaurant.logo.encode())
+            restaurant.logo = default_logo
+            restaurant.save(update_fields=['logo', 'logo_asset'])
+
+
+def restore_inline_logos(apps, schema_editor):
+    Restaurant = apps.get_model('foodapp', 'Restaurant')
+    for restaurant in Restaurant.objects.exclude(logo_asset='').only('id', 'logo', 'logo_asset').iterator():
+        with open(_asset_path(restaurant.logo_asset), 'rb') as f:
+            data = f.read()
+        if _is_svg(data):
+            restaurant.logo = data.decode()
+            restaurant.save(update_fields=['logo'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0007_order_payment_reference'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='logo_asset',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='wallpaper_asset',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.RunPython(move_inline_logos, restore_inline_logos),
+    ]
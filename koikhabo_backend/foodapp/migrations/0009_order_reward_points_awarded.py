@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0008_restaurant_assets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='reward_points_awarded',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,158 @@
+# Local stand-in for the bKash, Nagad and card gateways, for development and
+# tests (python manage.py run_mock_gateway). It speaks the protocol used by
+# foodapp.payments and can inject latency, errors, hangs and declines, globally
+# or per provider, at startup or at runtime through POST /_control.
+
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from .payments import PROVIDERS
+
+FAULTS = {
+    'latency': 0.05,  # Seconds added to every call
+    'jitter': 0.0,  # Extra random latency, up to this many seconds
+    'failure_rate': 0.0,  # Share of calls answered with 503
+    'hang_rate': 0.0,  # Share of calls that stall for `hang_seconds` before answering
+    'hang_seconds': 30.0,
+    'decline_rate': 0.0,  # Share of charges declined (a PIN of 0000 is always declined)
+}
+
+
+class MockGateway:
+    def __init__(self, faults=None, seed=None):
+        self.faults = {'*': {**FAULTS, **(faults or {})}}
+        self.charges = {}  # (provider, reference) -> charge record
+        self.calls = {provider: 0 for provider in PROVIDERS}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def faults_for(self, provider):
+        return {**self.faults['*'], **self.faults.get(provider, {})}
+
+    def configure(self, changes):
+        """{'*' or provider: {fault: value}}; unknown faults are ignored"""
+        with self.lock:
+            for scope, values in changes.items():
+                if scope == '*' or scope in PROVIDERS:
+                    known = {k: float(v) for k, v in values.items() if k in FAULTS}
+                    self.faults.setdefault(scope, {}).update(known)
+
+    def stats(self):
+        with self.lock:
+            return {'calls': dict(self.calls), 'charges': len(self.charges), 'faults': self.faults}
+
+    def delay(self, provider):
+        """Apply the injected latency; returns False if this call should fail with 503"""
+        with self.lock:
+            faults = self.faults_for(provider)
+            roll_hang, roll_fail, jitter = self.random.random(), self.random.random(), self.random.random()
+            self.calls[provider] += 1
+        pause = faults['latency'] + jitter * faults['jitter']
+        if roll_hang < faults['hang_rate']:
+            pause += faults['hang_seconds']
+        time.sleep(pause)
+        return roll_fail >= faults['failure_rate']
+
+    def charge(self, provider, body):
+        """The charge for this reference, created on first sight (so retries are idempotent)"""
+        key = (provider, str(body.get('reference', '')))
+        with self.lock:
+            if key not in self.charges:
+                account = body.get('account') or {}
+                declined = (
+                    str(account.get('pin', '')) == '0000'
+                    or self.random.random() < self.faults_for(provider)['decline_rate']
+                )
+                self.charges[key] = {
+                    'reference': key[1],
+                    'amount': str(body.get('amount', '0')),
+                    'status': 'failed' if declined else 'paid',
+                    'transaction_id': f'{provider.upper()}{uuid.uuid4().hex[:10].upper()}',
+                    'message': 'Payment was declined' if declined else 'Payment successful',
+                }
+            return self.charges[key]
+
+    def lookup(self, provider, reference):
+        with self.lock:
+            return self.charges.get((provider, reference))
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real gateways
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status_code, data):
+        body = json.dumps(data).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+    def _route(self):
+        """(provider, rest of the path) for /<provider>/..., else (None, path)"""
+        parts = self.path.strip('/').split('/', 1)
+        if parts[0] in PROVIDERS:
+            return parts[0], parts[1] if len(parts) > 1 else ''
+        return None, self.path.strip('/')
+
+    def do_POST(self):
+        gateway = self.server.gateway
+        try:
+            body = self._body()
+        except ValueError:
+            return self._send(400, {'message': 'Invalid JSON'})
+        provider, rest = self._route()
+        if provider is None and rest == '_control':
+            gateway.configure(body)
+            return self._send(200, gateway.stats())
+        if provider is None or rest != 'charges':
+            return self._send(404, {'message': 'Not found'})
+        if not gateway.delay(provider):
+            return self._send(503, {'message': 'Service unavailable'})
+        if not body.get('reference'):
+            return self._send(400, {'message': 'reference is required'})
+        charge = gateway.charge(provider, body)
+        self._send(402 if charge['status'] == 'failed' else 200, charge)
+
+    def do_GET(self):
+        gateway = self.server.gateway
+        provider, rest = self._route()
+        if provider is None and rest == '_stats':
+            return self._send(200, gateway.stats())
+        if provider is None or not rest.startswith('charges/'):
+            return self._send(404, {'message': 'Not found'})
+        if not gateway.delay(provider):
+            return self._send(503, {'message': 'Service unavailable'})
+        charge = gateway.lookup(provider, unquote(rest[len('charges/'):]))
+        if charge is None:
+            return self._send(404, {'message': 'Unknown reference'})
+        self._send(200, charge)
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on slow calls (timeouts, hedged attempts that lost)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def make_server(host='127.0.0.1', port=8765, faults=None, seed=None):
+    """A ready-to-run server; call serve_forever(), or use port=0 and read server_address"""
+    server = Server((host, port), Handler)
+    server.gateway = MockGateway(faults, seed)
+    return server
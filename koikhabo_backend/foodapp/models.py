@@ -5,6 +5,7 @@ import math
 import json
 from django.utils import timezone
 from datetime import date, datetime, timedelta
+from . import assets
 
 # -------------------- Institution --------------------
 class Institution(models.Model):
@@ -41,7 +42,7 @@ class GuestSession(models.Model):
     session_id = models.CharField(max_length=100, unique=True)
     phone = models.CharField(max_length=15, blank=True)
     email = models.EmailField(blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         return f"Guest {self.session_id}"
@@ -80,14 +81,25 @@ class Restaurant(models.Model):
     capacity = models.IntegerField()  # Total seating capacity
 
     # Theme and branding
-    logo = models.TextField(default='🍽️')  # Emoji or simple SVG
+    logo = models.TextField(default='🍽️')  # Emoji; SVG logos are moved to logo_asset on save
     color_theme = models.CharField(max_length=7, default='#FF6B6B')  # Hex color
     font_family = models.CharField(max_length=100, default='Inter')
     wallpaper_url = models.URLField(blank=True)
+    # SHA-256 of assets in the branding store (foodapp.assets), served at /api/assets/<hash>/
+    logo_asset = models.CharField(max_length=64, blank=True)
+    wallpaper_asset = models.CharField(max_length=64, blank=True)
 
     # Cuisines offered (JSON array)
     cuisines = models.JSONField(default=list)  # ['Bengali', 'Chinese', etc.]
 
+    def save(self, *args, **kwargs):
+        # Keep SVG markup out of the row; responses reference the stored asset instead
+        update_fields = kwargs.get('update_fields')
+        if 'logo' not in self.get_deferred_fields() and (update_fields is None or 'logo' in update_fields):
+            if assets.move_inline_logo(self, self._meta.get_field('logo').default) and update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'logo_asset'}
+        super().save(*args, **kwargs)
+
     def calculate_distance(self, user_lat, user_lon):
         if not self.latitude or not self.longitude:
             return float('inf')
@@ -286,6 +298,7 @@ class Order(models.Model):
 
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS, default='pending')
+    payment_reference = models.CharField(max_length=64, blank=True)  # Gateway reference of the last charge attempt
     status = models.CharField(max_length=20, choices=ORDER_STATUS, default='pending')
 
     # Delivery details
@@ -297,22 +310,14 @@ class Order(models.Model):
     booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Reward points are awarded once, by the award_reward_points job queued in create_order;
+    # the job sets this in the same transaction so a redelivered job awards nothing
+    reward_points_awarded = models.BooleanField(default=False)
+
     def __str__(self):
         user_info = self.user.email if self.user else f"Guest {self.guest_session.session_id}"
         return f"Order #{self.id} - {user_info}"
 
-    # -------------------- Reward Points --------------------
-    def save(self, *args, **kwargs):
-        # Call parent save first
-        super().save(*args, **kwargs)
-
-        # Only assign points if the order is paid and belongs to a registered user
-        if self.payment_status == 'paid' and self.user:
-            points_earned = int(self.total_amount // 100)  # 1 point per 100 Taka
-            if points_earned > 0:
-                self.user.points += points_earned
-                self.user.save()
-
 # -------------------- Order Item --------------------
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -341,7 +346,7 @@ class Review(models.Model):
 # -------------------- Occupied Seat (for random occupancy) --------------------
 class OccupiedSeat(models.Model):
     seat = models.ForeignKey(Seat, on_delete=models.CASCADE)
-    occupied_until = models.DateTimeField()
+    occupied_until = models.DateTimeField(db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def is_occupied(self):
@@ -360,3 +365,82 @@ class RewardRedemption(models.Model):
 
     def __str__(self):
         return f"{self.user.email} - {self.points_used} points for {self.discount_amount} tk"
+
+# -------------------- Daily Order Rollup --------------------
+class DailyOrderRollup(models.Model):
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()  # Local (Asia/Dhaka) date of Order.created_at
+    status = models.CharField(max_length=20, choices=Order.ORDER_STATUS)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.IntegerField(default=0)  # Sum of OrderItem quantities
+
+    class Meta:
+        unique_together = ['restaurant', 'day', 'status']
+        indexes = [
+            models.Index(fields=['day', 'status'], name='rollup_day_status_idx'),
+        ]
+
+    @property
+    def avg_order_value(self):
+        return self.revenue / self.order_count if self.order_count else 0
+
+    def __str__(self):
+        return f"{self.restaurant.name} {self.day} {self.status}: {self.order_count} orders"
+
+# -------------------- Daily Item Sales --------------------
+class DailyItemSales(models.Model):
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='daily_item_sales')
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()  # Local (Asia/Dhaka) date of Order.created_at
+    quantity = models.IntegerField(default=0)  # Sum of OrderItem quantities
+
+    class Meta:
+        unique_together = ['menu_item', 'day']
+        indexes = [
+            models.Index(fields=['restaurant', 'day'], name='item_sales_restaurant_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.menu_item.name} {self.day}: {self.quantity}"
+
+# -------------------- Background Job --------------------
+class Job(models.Model):
+    JOB_STATUS = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=JOB_STATUS, default='queued')
+    priority = models.IntegerField(default=0)  # Higher runs first
+    dedup_key = models.CharField(max_length=200, null=True, blank=True)
+
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    last_error = models.TextField(blank=True)
+
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at', 'priority'], name='job_ready_idx'),
+        ]
+        constraints = [
+            # Only one queued job per dedup key; a running job may queue its successor
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status='queued'),
+                name='unique_queued_job_dedup_key'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} {self.task} ({self.status})"
@@ -0,0 +1,373 @@
+# Payment gateway client for the bKash, Nagad and card providers.
+#
+# Gateway calls run on one asyncio loop per process (a daemon thread), so
+# keep-alive connections are pooled across requests. Every provider has its own
+# pool, timeout, concurrency limit and circuit breaker: a slow or failing
+# provider is cut off quickly instead of holding request workers, and it never
+# delays payments through the others.
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import ssl
+import threading
+import time
+import uuid
+from decimal import Decimal
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+
+from .models import Order
+from . import jobs
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BASE_URL': 'http://127.0.0.1:8765',
+    'TIMEOUT': 5.0,  # Seconds for the whole call, hedged attempts included
+    'CONNECT_TIMEOUT': 1.0,
+    'POOL_SIZE': 10,  # Idle keep-alive connections kept open
+    'MAX_CONCURRENCY': 20,  # Calls in flight at once; further calls are rejected
+    'HEDGE_AFTER': 1.0,  # Seconds without an answer before a second attempt is raced
+    'MAX_ATTEMPTS': 2,
+    'FAILURE_THRESHOLD': 5,  # Consecutive failures that open the circuit
+    'RESET_SECONDS': 30,  # How long the circuit stays open before a trial call
+}
+PROVIDERS = ('bkash', 'nagad', 'card')
+# Delay before a charge with an unknown outcome is looked up again
+RECONCILE_DELAY_SECONDS = getattr(settings, 'PAYMENT_RECONCILE_DELAY_SECONDS', 30)
+
+
+class PaymentError(Exception):
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class GatewayUnavailable(PaymentError):
+    """The provider could not be reached in time; a charge may or may not have happened"""
+
+    def __init__(self, message):
+        super().__init__(message, status_code=503)
+
+
+class ServerError(Exception):
+    """A 5xx answer, retried like a network failure"""
+
+
+def get_config(provider):
+    configured = getattr(settings, 'PAYMENT_GATEWAYS', {})
+    return {**DEFAULTS, **configured.get(provider, {})}
+
+
+class CircuitBreaker:
+    """Closed until FAILURE_THRESHOLD failures in a row, then open for RESET_SECONDS.
+
+    After that one trial call is let through (half-open): success closes the
+    circuit again, failure reopens it. Only used from the gateway loop thread.
+    """
+
+    def __init__(self, threshold, reset_seconds):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.trial or time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        if self.trial or time.monotonic() - self.opened_at < self.reset_seconds:
+            return False
+        self.trial = True
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def failure(self):
+        self.failures += 1
+        if self.trial or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            self.trial = False
+
+
+class ConnectionPool:
+    """Minimal HTTP/1.1 JSON client keeping up to `size` idle keep-alive connections"""
+
+    def __init__(self, base_url, size, connect_timeout):
+        parts = urlsplit(base_url)
+        self.tls = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.tls else 80)
+        self.prefix = parts.path.rstrip('/')
+        self.size = size
+        self.connect_timeout = connect_timeout
+        self.idle = []
+
+    async def _open(self):
+        return await asyncio.wait_for(asyncio.open_connection(
+            self.host, self.port, ssl=ssl.create_default_context() if self.tls else None
+        ), self.connect_timeout)
+
+    async def request(self, method, path, body=None):
+        """(status code, decoded JSON body); a dead idle connection is replaced once"""
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if writer.is_closing() or reader.at_eof():
+                writer.close()
+                continue
+            try:
+                return await self._exchange(reader, writer, method, path, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                break  # the server dropped it while idle; fall through to a fresh one
+        return await self._exchange(*await self._open(), method, path, body)
+
+    async def _exchange(self, reader, writer, method, path, body):
+        keep = False
+        try:
+            payload = json.dumps(body).encode() if body is not None else b''
+            head = (
+                f'{method} {self.prefix}{path} HTTP/1.1\r\n'
+                f'Host: {self.host}\r\n'
+                'Accept: application/json\r\n'
+                'Content-Type: application/json\r\n'
+                f'Content-Length: {len(payload)}\r\n'
+                '\r\n'
+            )
+            writer.write(head.encode() + payload)
+            await writer.drain()
+
+            lines = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+            status_code = int(lines[0].split()[1])
+            headers = {}
+            for line in lines[1:]:
+                if ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+            if 'content-length' in headers:
+                data = await reader.readexactly(int(headers['content-length']))
+                keep = headers.get('connection', '').lower() != 'close'
+            else:
+                data = await reader.read()
+            return status_code, json.loads(data) if data else {}
+        finally:
+            # Cancelled or failed exchanges leave the stream in an unknown state
+            if keep and len(self.idle) < self.size:
+                self.idle.append((reader, writer))
+            else:
+                writer.close()
+
+
+class Gateway:
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.pool = ConnectionPool(config['BASE_URL'], config['POOL_SIZE'], config['CONNECT_TIMEOUT'])
+        self.breaker = CircuitBreaker(config['FAILURE_THRESHOLD'], config['RESET_SECONDS'])
+        self.in_flight = 0
+
+    async def call(self, method, path, body=None):
+        if self.in_flight >= self.config['MAX_CONCURRENCY']:
+            raise GatewayUnavailable(f'{self.name} is busy, please try again shortly')
+        if not self.breaker.allow():
+            raise GatewayUnavailable(f'{self.name} is currently unavailable, please try again shortly')
+        self.in_flight += 1
+        try:
+            result = await asyncio.wait_for(self._hedged(method, path, body), self.config['TIMEOUT'])
+        except (asyncio.TimeoutError, OSError, ServerError, asyncio.IncompleteReadError, ValueError) as e:
+            self.breaker.failure()
+            logger.warning('%s gateway call %s %s failed: %r', self.name, method, path, e)
+            raise GatewayUnavailable(f'{self.name} did not respond, please try again shortly') from e
+        finally:
+            self.in_flight -= 1
+        self.breaker.success()
+        return result
+
+    async def _attempt(self, method, path, body):
+        status_code, data = await self.pool.request(method, path, body)
+        if status_code >= 500:
+            raise ServerError(f'HTTP {status_code}')
+        return status_code, data
+
+    async def _hedged(self, method, path, body):
+        """Start another attempt when one fails or is slower than HEDGE_AFTER; first answer wins.
+
+        Only safe for idempotent calls: charges carry a reference the gateway
+        deduplicates on, so a hedged charge can never be taken twice.
+        """
+        attempts = set()
+        error = None
+        try:
+            for n in range(self.config['MAX_ATTEMPTS']):
+                attempts.add(asyncio.ensure_future(self._attempt(method, path, body)))
+                last = n == self.config['MAX_ATTEMPTS'] - 1
+                done, attempts = await asyncio.wait(
+                    attempts, timeout=None if last else self.config['HEDGE_AFTER'],
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+
+# -------------------- Gateway Loop --------------------
+_loop = None
+_gateways = {}
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # The loop thread does not survive fork(); children start their own
+    global _loop, _gateways, _lock
+    _loop, _gateways, _lock = None, {}, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _get_gateway(provider):
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='payment-gateways', daemon=True).start()
+            _loop = loop
+        if provider not in _gateways:
+            _gateways[provider] = Gateway(provider, get_config(provider))
+        return _loop, _gateways[provider]
+
+
+def _call(provider, method, path, body=None):
+    if provider not in PROVIDERS:
+        raise PaymentError(f'Unsupported payment method: {provider}', status_code=400)
+    loop, gateway = _get_gateway(provider)
+    future = asyncio.run_coroutine_threadsafe(gateway.call(method, path, body), loop)
+    try:
+        # The call enforces its own timeout; this only guards against a stuck loop
+        return future.result(gateway.config['TIMEOUT'] + 1)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise GatewayUnavailable(f'{provider} did not respond, please try again shortly')
+
+
+def breaker_states():
+    """Circuit state of every provider used by this process"""
+    return {name: gateway.breaker.state for name, gateway in _gateways.items()}
+
+
+def charge(provider, reference, amount, account):
+    """Charge `amount` to the customer's account; `reference` makes retries idempotent.
+
+    Returns the gateway's {'status': 'paid'|'failed', 'transaction_id', 'message'}.
+    Raises GatewayUnavailable when the outcome is unknown.
+    """
+    status_code, data = _call(provider, 'POST', '/charges', {
+        'reference': reference,
+        'amount': str(amount),
+        'account': account,
+    })
+    if status_code == 402:  # declined
+        return {'status': 'failed', 'transaction_id': data.get('transaction_id'),
+                'message': data.get('message', 'Payment was declined')}
+    if status_code >= 400:
+        raise PaymentError(data.get('message', f'{provider} rejected the payment request'))
+    return data
+
+
+def charge_status(provider, reference):
+    """The gateway's record of a charge, or None if it never received it"""
+    status_code, data = _call(provider, 'GET', f'/charges/{quote(reference)}')
+    if status_code == 404:
+        return None
+    if status_code >= 400:
+        raise PaymentError(data.get('message', f'{provider} rejected the status request'))
+    return data
+
+
+# -------------------- Orders --------------------
+def _reload(order):
+    order.payment_status, order.payment_reference = Order.objects.filter(id=order.id).values_list(
+        'payment_status', 'payment_reference'
+    ).get()
+    return order.payment_status
+
+
+def _settle(order, reference, outcome):
+    """Apply a gateway outcome to the order if `reference` is still its current attempt"""
+    if outcome in ('paid', 'failed'):
+        # .update() keeps a concurrent attempt from being overwritten and skips Order.save()
+        Order.objects.filter(id=order.id, payment_reference=reference, payment_status='pending').update(
+            payment_status=outcome
+        )
+    return _reload(order)
+
+
+def reconcile(order):
+    """Look up the last charge of an order whose outcome is unknown; returns its payment_status"""
+    if order.payment_status != 'pending' or not order.payment_reference:
+        return order.payment_status
+    reference = order.payment_reference
+    result = charge_status(order.payment_method, reference)
+    return _settle(order, reference, 'failed' if result is None else result.get('status'))
+
+
+def pay_order(order, account):
+    """Charge an order through its provider and record the result on payment_status.
+
+    A previous attempt with an unknown outcome is looked up first, so a retry
+    never charges twice. If the gateway cannot be reached the order stays
+    pending and a reconcile job is queued.
+    """
+    if order.payment_status == 'pending' and order.payment_reference:
+        if reconcile(order) == 'pending':
+            raise PaymentError('A payment for this order is still being processed', status_code=409)
+    if order.payment_status == 'paid':
+        return {'status': 'paid', 'transaction_id': None, 'message': 'Order is already paid'}
+    if order.payment_status not in ('pending', 'failed'):
+        raise PaymentError(f'Order payment is {order.payment_status}', status_code=400)
+
+    # Claim a fresh reference; the previous one in the filter makes this a compare-and-swap
+    reference = f'order-{order.id}-{uuid.uuid4().hex[:12]}'
+    claimed = Order.objects.filter(
+        id=order.id, payment_status=order.payment_status, payment_reference=order.payment_reference
+    ).update(payment_status='pending', payment_reference=reference)
+    if not claimed:
+        raise PaymentError('A payment for this order is already in progress', status_code=409)
+
+    try:
+        result = charge(order.payment_method, reference, Decimal(order.total_amount), account)
+    except GatewayUnavailable:
+        jobs.enqueue('reconcile_payment', {'order_id': order.id}, delay=RECONCILE_DELAY_SECONDS,
+                     dedup_key=f'reconcile-payment:order:{order.id}')
+        _reload(order)
+        raise
+    except PaymentError:
+        _settle(order, reference, 'failed')
+        raise
+    _settle(order, reference, result.get('status'))
+    return result
@@ -0,0 +1,144 @@
+# Cart pricing against cached, versioned per-restaurant price snapshots
+
+import hashlib
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Restaurant, MenuItem
+from . import discounts
+
+# Snapshots are dropped on MenuItem writes; the TTL only bounds staleness from bulk updates
+SNAPSHOT_TTL = getattr(settings, 'PRICE_SNAPSHOT_TTL', 300)
+
+
+class PricingError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _cache_key(restaurant_id):
+    return f'prices:{restaurant_id}'
+
+
+def calculate_delivery_fee(payment_method):
+    return Decimal(50) if payment_method != 'cash' else Decimal(0)  # Free delivery for cash
+
+
+def build_snapshot(restaurant_id):
+    if not Restaurant.objects.filter(id=restaurant_id).exists():
+        raise PricingError('Invalid restaurant or menu item', status_code=404)
+
+    items = {
+        item_id: {'name': name, 'price': price, 'is_available': is_available}
+        for item_id, name, price, is_available in MenuItem.objects.filter(
+            restaurant_id=restaurant_id
+        ).order_by('id').values_list('id', 'name', 'price', 'is_available')
+    }
+    # Content hash, so every process derives the same version for the same prices
+    digest = hashlib.sha1(
+        repr([(i, str(v['price']), v['is_available']) for i, v in items.items()]).encode()
+    ).hexdigest()[:16]
+    return {'restaurant_id': restaurant_id, 'version': digest, 'items': items}
+
+
+def get_snapshot(restaurant_id):
+    key = _cache_key(restaurant_id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_snapshot(restaurant_id)
+        cache.set(key, snapshot, SNAPSHOT_TTL)
+    return snapshot
+
+
+def invalidate(restaurant_id):
+    cache.delete(_cache_key(restaurant_id))
+
+
+def _parse_quantity(value):
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise PricingError('Invalid quantity')
+    if quantity < 1:
+        raise PricingError('Invalid quantity')
+    return quantity
+
+
+def quote_cart(cart):
+    """Price one cart ({restaurant_id, items, payment_method}) from the snapshot"""
+    if not isinstance(cart, dict) or not isinstance(cart.get('items', []), list):
+        raise PricingError('A cart must be an object with a list of items')
+    try:
+        restaurant_id = int(cart.get('restaurant_id'))
+    except (TypeError, ValueError):
+        raise PricingError('Invalid restaurant or menu item', status_code=404)
+
+    snapshot = get_snapshot(restaurant_id)
+    lines = []
+    unavailable = []
+    subtotal = Decimal(0)
+
+    for item in cart.get('items', []):
+        try:
+            menu_item_id = int(item['menu_item_id'])
+        except (KeyError, TypeError, ValueError):
+            raise PricingError('Invalid restaurant or menu item', status_code=404)
+        entry = snapshot['items'].get(menu_item_id)
+        if entry is None:
+            raise PricingError('Invalid restaurant or menu item', status_code=404)
+
+        quantity = _parse_quantity(item.get('quantity', 1))
+        line_total = entry['price'] * quantity
+        lines.append({
+            'menu_item_id': menu_item_id,
+            'name': entry['name'],
+            'unit_price': entry['price'],
+            'quantity': quantity,
+            'line_total': line_total,
+            'is_available': entry['is_available'],
+        })
+        if entry['is_available']:
+            subtotal += line_total
+        else:
+            unavailable.append(menu_item_id)
+
+    discount, discount_amount = discounts.best_discount(restaurant_id, subtotal)
+    delivery_fee = calculate_delivery_fee(cart.get('payment_method'))
+
+    return {
+        'restaurant_id': restaurant_id,
+        'price_version': snapshot['version'],
+        'items': lines,
+        'unavailable_items': unavailable,
+        'subtotal': subtotal,
+        'discount': {
+            'id': discount['id'],
+            'name': discount['name'],
+            'discount_percentage': discount['discount_percentage'],
+            'minimum_order': discount['minimum_order'],
+        } if discount else None,
+        'discount_amount': discount_amount,
+        'delivery_fee': delivery_fee,
+        'total_amount': subtotal - discount_amount + delivery_fee,
+    }
+
+
+def format_quote(quote):
+    """Money as strings, matching the rest of the order API"""
+    formatted = dict(quote)
+    formatted['items'] = [
+        {**line, 'unit_price': str(line['unit_price']), 'line_total': str(line['line_total'])}
+        for line in quote['items']
+    ]
+    if quote['discount']:
+        formatted['discount'] = {
+            **quote['discount'],
+            'discount_percentage': str(quote['discount']['discount_percentage']),
+            'minimum_order': str(quote['discount']['minimum_order']),
+        }
+    for field in ('subtotal', 'discount_amount', 'delivery_fee', 'total_amount'):
+        formatted[field] = str(quote[field])
+    return formatted
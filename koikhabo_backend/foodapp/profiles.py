@@ -0,0 +1,50 @@
+# In-process LRU cache of UserProfile rows keyed by user id
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import UserProfile
+
+MAX_ENTRIES = getattr(settings, 'PROFILE_CACHE_SIZE', 2048)
+# Saves in this process drop entries at once; the TTL bounds how long a write made
+# by another process (e.g. reward points from the job worker) can go unseen
+TTL = getattr(settings, 'PROFILE_CACHE_TTL', 60)
+
+_entries = OrderedDict()  # user id -> (loaded at, profile)
+_lock = threading.Lock()
+
+
+def get_profile(user_id):
+    """A copy of the profile (with its institution); raises UserProfile.DoesNotExist"""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        raise UserProfile.DoesNotExist(f'Invalid user id {user_id!r}')
+
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry and now - entry[0] < TTL:
+            _entries.move_to_end(user_id)
+            return copy.copy(entry[1])
+
+    profile = UserProfile.objects.select_related('institution').get(id=user_id)
+    remember(profile)
+    return copy.copy(profile)
+
+
+def remember(profile):
+    with _lock:
+        _entries[profile.id] = (time.monotonic(), copy.copy(profile))
+        _entries.move_to_end(profile.id)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def invalidate(user_id):
+    with _lock:
+        _entries.pop(user_id, None)
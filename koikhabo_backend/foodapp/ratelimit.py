@@ -0,0 +1,199 @@
+# Admission control: token buckets per client, per endpoint and globally, plus a
+# cap on concurrent write requests. Excess load is shed with 429 + Retry-After
+# before it reaches the views (and the SQLite writer).
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from django.utils.module_loading import import_string
+
+from . import locks
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BACKEND': 'foodapp.ratelimit.CacheBackend',
+    'CACHE_ALIAS': 'default',
+    'CLIENT': (10, 40),  # (tokens per second, burst) for each client IP
+    'GLOBAL': (200, 400),
+    'ENDPOINTS': {},  # URL name -> (tokens per second, burst), shared by all clients
+    'WRITE_CONCURRENCY': 8,  # POST/PUT/PATCH/DELETE requests in flight at once
+    'EXEMPT': ('health-check',),
+}
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+SLOT_TIMEOUT = 300  # Seconds before a leaked write slot (crashed worker) frees itself
+LOCK_TIMEOUT = 5  # Seconds before a lock left by a crashed worker is taken over
+LOCK_WAIT_SECONDS = 0.05
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'RATE_LIMIT', {})}
+
+
+def _refill(state, rate, burst, now):
+    tokens, stamp = state if state else (burst, now)
+    return min(burst, tokens + (now - stamp) * rate)
+
+
+def _wait(levels, limits):
+    """Seconds until every bucket holds a token again (0 if they all do now)"""
+    return max(((1 - level) / rate for level, (_, rate, _) in zip(levels, limits) if level < 1), default=0)
+
+
+class LocalBackend:
+    """Exact buckets in this process only; limits are per worker, so only for a single worker"""
+
+    def __init__(self, config):
+        self.buckets = {}
+        self.slots = {}
+        self.lock = threading.Lock()
+
+    def take(self, limits):
+        """Take one token from every (key, rate, burst) bucket, or from none of them.
+
+        Returns seconds to wait (0 when admitted).
+        """
+        now = time.monotonic()
+        with self.lock:
+            levels = [_refill(self.buckets.get(key), rate, burst, now) for key, rate, burst in limits]
+            wait = _wait(levels, limits)
+            if wait:
+                return wait
+            for level, (key, _, _) in zip(levels, limits):
+                self.buckets[key] = (level - 1, now)
+        return 0
+
+    def acquire(self, key, limit):
+        with self.lock:
+            if self.slots.get(key, 0) >= limit:
+                return False
+            self.slots[key] = self.slots.get(key, 0) + 1
+            return True
+
+    def release(self, key):
+        with self.lock:
+            self.slots[key] = max(self.slots.get(key, 1) - 1, 0)
+
+
+class CacheBackend:
+    """Buckets in a Django cache, shared by every worker using it (the default).
+
+    Redis and Memcached update atomically. On the file and database caches,
+    add/incr/decr are a read followed by a write, so every bucket and slot
+    update runs under a cross-process lock (locks.py) instead; otherwise lost
+    decrements would leak write slots.
+    """
+
+    def __init__(self, config):
+        self.cache = caches[config['CACHE_ALIAS']]
+        self.atomic = isinstance(self.cache, (RedisCache, BaseMemcachedCache))
+
+    @contextmanager
+    def _exclusive(self):
+        if self.atomic:
+            yield
+            return
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        # Past the deadline the update goes ahead unlocked; a few extra requests
+        # getting through is acceptable for load shedding
+        locked = locks.try_lock('ratelimit', LOCK_TIMEOUT)
+        while not locked and time.monotonic() < deadline:
+            time.sleep(0.001)
+            locked = locks.try_lock('ratelimit', LOCK_TIMEOUT)
+        try:
+            yield
+        finally:
+            if locked:
+                locks.unlock('ratelimit')
+
+    def take(self, limits):
+        now = time.time()
+        keys = [f'ratelimit:{key}' for key, _, _ in limits]
+        with self._exclusive():
+            states = self.cache.get_many(keys)
+            levels = [_refill(states.get(k), rate, burst, now) for k, (_, rate, burst) in zip(keys, limits)]
+            wait = _wait(levels, limits)
+            if wait:
+                return wait
+            for k, level, (_, rate, burst) in zip(keys, levels, limits):
+                # Expire once the bucket would be full again anyway
+                self.cache.set(k, (level - 1, now), math.ceil(burst / rate) + 1)
+        return 0
+
+    def acquire(self, key, limit):
+        key = f'ratelimit:slots:{key}'
+        with self._exclusive():
+            self.cache.add(key, 0, SLOT_TIMEOUT)
+            try:
+                in_flight = self.cache.incr(key)
+            except ValueError:  # expired between add and incr
+                self.cache.set(key, 1, SLOT_TIMEOUT)
+                in_flight = 1
+            if in_flight > limit:
+                self._decr(key)
+                return False
+        return True
+
+    def release(self, key):
+        with self._exclusive():
+            self._decr(f'ratelimit:slots:{key}')
+
+    def _decr(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            pass
+
+
+def _too_many(retry_after, message):
+    response = JsonResponse({'error': message}, status=429)
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+class RateLimitMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+        self.backend = import_string(self.config['BACKEND'])(self.config)
+
+    def __call__(self, request):
+        config = self.config
+        if not config['ENABLED']:
+            return self.get_response(request)
+        try:
+            endpoint = resolve(request.path_info).url_name
+        except Resolver404:
+            endpoint = None
+        if endpoint in config['EXEMPT']:
+            return self.get_response(request)
+
+        limits = [
+            (f'client:{client_ip(request)}', *config['CLIENT']),
+            ('global', *config['GLOBAL']),
+        ]
+        if endpoint in config['ENDPOINTS']:
+            limits.insert(1, (f'endpoint:{endpoint}', *config['ENDPOINTS'][endpoint]))
+        wait = self.backend.take(limits)
+        if wait:
+            return _too_many(wait, 'Too many requests, please retry shortly')
+
+        if request.method not in WRITE_METHODS:
+            return self.get_response(request)
+        if not self.backend.acquire('writes', config['WRITE_CONCURRENCY']):
+            return _too_many(1, 'Server busy, please retry shortly')
+        try:
+            return self.get_response(request)
+        finally:
+            self.backend.release('writes')
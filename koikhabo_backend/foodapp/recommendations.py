@@ -0,0 +1,154 @@
+# "Frequently ordered together": a sparse item-item co-occurrence matrix built
+# offline from OrderItem, with each item's nearest neighbours precomputed so a
+# recommendation lookup only touches a few short lists.
+
+import heapq
+import math
+import threading
+import time
+from datetime import timedelta
+from itertools import combinations, groupby
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import OrderItem
+from . import pricing
+
+# Kept in the 'durable' cache: stored without a timeout, they must survive culling
+MATRIX_CACHE_KEY = 'recommendations:matrix'
+VERSION_CACHE_KEY = 'recommendations:version'
+
+NEIGHBOURS = getattr(settings, 'RECOMMENDATION_NEIGHBOURS', 10)
+MIN_PAIR_COUNT = getattr(settings, 'RECOMMENDATION_MIN_PAIR_COUNT', 1)
+VERSION_CHECK_SECONDS = getattr(settings, 'RECOMMENDATION_VERSION_CHECK_SECONDS', 30)
+# Orders younger than this are left for the next run, so one whose items are
+# still being written is never consumed half-way
+SETTLE_SECONDS = 60
+
+
+class CooccurrenceMatrix:
+    """Symmetric sparse counts stored row-wise, like a dict-of-keys matrix.
+
+    `orders[i]` is the number of orders containing item i and `pairs[i][j]` the
+    number containing both. Similarity is cosine, c_ij / sqrt(n_i * n_j).
+    """
+
+    def __init__(self):
+        self.orders = {}
+        self.pairs = {}
+        self.neighbours = {}  # item -> [(score, other item)] best first
+        self.last_order_id = 0
+
+    def add_order(self, item_ids):
+        """Count one order's distinct items; returns the items whose row changed"""
+        items = sorted(set(item_ids))
+        for item in items:
+            self.orders[item] = self.orders.get(item, 0) + 1
+        for a, b in combinations(items, 2):
+            row_a = self.pairs.setdefault(a, {})
+            row_b = self.pairs.setdefault(b, {})
+            row_a[b] = row_a.get(b, 0) + 1
+            row_b[a] = row_a[b]
+        return items
+
+    def similarity(self, a, b):
+        count = self.pairs.get(a, {}).get(b, 0)
+        if count < MIN_PAIR_COUNT:
+            return 0.0
+        return count / math.sqrt(self.orders[a] * self.orders[b])
+
+    def refresh(self, touched):
+        """Recompute neighbour lists for touched items and every item sharing a row with them"""
+        affected = set(touched)
+        for item in touched:
+            affected.update(self.pairs.get(item, ()))
+        for item in affected:
+            scored = ((self.similarity(item, other), other) for other in self.pairs.get(item, ()))
+            self.neighbours[item] = heapq.nlargest(NEIGHBOURS, (s for s in scored if s[0] > 0))
+        return len(affected)
+
+
+# -------------------- Offline Build --------------------
+def _iter_orders(after_id, before):
+    rows = OrderItem.objects.filter(
+        order_id__gt=after_id, order__created_at__lt=before
+    ).order_by('order_id').values_list('order_id', 'menu_item_id').iterator(chunk_size=5000)
+    for order_id, group in groupby(rows, key=lambda row: row[0]):
+        yield order_id, [menu_item_id for _, menu_item_id in group]
+
+
+def build(full=False):
+    """Fold orders placed since the last run into the stored matrix (or start over)"""
+    started = time.monotonic()
+    matrix = None if full else caches['durable'].get(MATRIX_CACHE_KEY)
+    if matrix is None:
+        matrix = CooccurrenceMatrix()
+
+    touched = set()
+    order_count = 0
+    settled_before = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    for order_id, item_ids in _iter_orders(matrix.last_order_id, settled_before):
+        touched.update(matrix.add_order(item_ids))
+        matrix.last_order_id = order_id
+        order_count += 1
+    refreshed = matrix.refresh(touched)
+
+    if order_count or full:
+        caches['durable'].set(MATRIX_CACHE_KEY, matrix, None)
+        caches['durable'].set(VERSION_CACHE_KEY, time.time(), None)
+    return {
+        'orders': order_count,
+        'items_refreshed': refreshed,
+        'items': len(matrix.orders),
+        'seconds': round(time.monotonic() - started, 3),
+    }
+
+
+# -------------------- Lookups --------------------
+_matrix = None
+_lock = threading.Lock()
+_state = {'version': None, 'checked_at': 0}
+
+
+def get_matrix():
+    """The stored matrix, reloaded in this process when a build has published a new one"""
+    global _matrix
+    now = time.monotonic()
+    if _matrix is not None and now - _state['checked_at'] < VERSION_CHECK_SECONDS:
+        return _matrix
+    version = caches['durable'].get(VERSION_CACHE_KEY)
+    with _lock:
+        if _matrix is None or version != _state['version']:
+            _matrix = caches['durable'].get(MATRIX_CACHE_KEY) or CooccurrenceMatrix()
+            _state['version'] = version
+        _state['checked_at'] = now
+    return _matrix
+
+
+def recommend(restaurant_id, item_ids, limit=5):
+    """Items of this restaurant most often ordered with `item_ids`, best first"""
+    matrix = get_matrix()
+    menu = pricing.get_snapshot(restaurant_id)['items']
+    in_cart = set(item_ids)
+
+    scores = {}
+    for item in in_cart:
+        for score, other in matrix.neighbours.get(item, ()):
+            if other not in in_cart:
+                scores[other] = scores.get(other, 0) + score
+
+    ranked = heapq.nlargest(limit, (
+        (score, other) for other, score in scores.items()
+        if other in menu and menu[other]['is_available']
+    ))
+    return [
+        {
+            'menu_item_id': other,
+            'name': menu[other]['name'],
+            'price': str(menu[other]['price']),
+            'score': round(score, 4),
+        }
+        for score, other in ranked
+    ]
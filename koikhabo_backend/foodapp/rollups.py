@@ -0,0 +1,177 @@
+# Daily restaurant × status rollups of orders, maintained incrementally on writes
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyOrderRollup, Order, OrderItem
+
+
+def local_day(moment):
+    return timezone.localtime(moment).date()
+
+
+def apply(restaurant_id, day, status, orders=0, revenue=0, items=0):
+    """Add (or with negative values, remove) counts to one rollup bucket"""
+    if not (orders or revenue or items):
+        return
+    bucket = DailyOrderRollup.objects.filter(restaurant_id=restaurant_id, day=day, status=status)
+    changes = {
+        'order_count': F('order_count') + orders,
+        'revenue': F('revenue') + Decimal(str(revenue)),
+        'item_count': F('item_count') + items,
+    }
+    if bucket.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailyOrderRollup.objects.create(
+                restaurant_id=restaurant_id, day=day, status=status,
+                order_count=orders, revenue=Decimal(str(revenue)), item_count=items
+            )
+    except IntegrityError:
+        bucket.update(**changes)  # another writer created the bucket first
+
+
+def _order_items(order_id):
+    return OrderItem.objects.filter(order_id=order_id).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+# -------------------- Signal hooks --------------------
+ROLLUP_FIELDS = ('restaurant_id', 'created_at', 'status', 'total_amount')
+_UNLOADED = object()
+
+
+def remember(order):
+    """Keep the rollup-relevant fields as loaded, so saves can move counts between buckets"""
+    if not order.pk:
+        order._rollup_state = None
+        return
+    # Fields deferred by .only()/.defer() are not read here: that would cost a query per row
+    deferred = order.get_deferred_fields()
+    order._rollup_state = tuple(
+        _UNLOADED if name in deferred else getattr(order, name) for name in ROLLUP_FIELDS
+    )
+
+
+def before_save(order):
+    """Read the stored values of fields that were deferred at load time, before they change"""
+    state = getattr(order, '_rollup_state', None)
+    if state is None or _UNLOADED not in state:
+        return
+    missing = [name for name, value in zip(ROLLUP_FIELDS, state) if value is _UNLOADED]
+    row = type(order)._base_manager.filter(pk=order.pk).values_list(*missing).first()
+    if row is None:
+        order._rollup_state = None
+        return
+    stored = dict(zip(missing, row))
+    order._rollup_state = tuple(
+        stored[name] if value is _UNLOADED else value for name, value in zip(ROLLUP_FIELDS, state)
+    )
+
+
+def order_saved(order, created):
+    previous = getattr(order, '_rollup_state', None)
+    current = tuple(getattr(order, name) for name in ROLLUP_FIELDS)
+
+    if created or previous is None:
+        # Items are written after the order and counted by items_changed()
+        apply(order.restaurant_id, local_day(order.created_at), order.status,
+              orders=1, revenue=order.total_amount)
+    elif previous != current:
+        items = _order_items(order.id)
+        restaurant_id, created_at, status, total_amount = previous
+        apply(restaurant_id, local_day(created_at), status,
+              orders=-1, revenue=-Decimal(str(total_amount)), items=-items)
+        apply(order.restaurant_id, local_day(order.created_at), order.status,
+              orders=1, revenue=order.total_amount, items=items)
+    remember(order)
+
+
+def order_deleted(order):
+    # OrderItems are cascade-deleted first, so their quantities were already removed
+    apply(order.restaurant_id, local_day(order.created_at), order.status,
+          orders=-1, revenue=-Decimal(str(order.total_amount)))
+
+
+def items_changed(order, quantity):
+    """Called for OrderItem writes; bulk_create callers must call this themselves"""
+    apply(order.restaurant_id, local_day(order.created_at), order.status, items=quantity)
+
+
+# -------------------- Rebuild --------------------
+def rebuild(start=None, end=None):
+    """Recompute rollups for local days start..end (inclusive) from Order/OrderItem"""
+    tz = timezone.get_current_timezone()
+
+    orders = Order.objects.all()
+    items = OrderItem.objects.all()
+    rollups = DailyOrderRollup.objects.all()
+    if start:
+        orders = orders.filter(created_at__date__gte=start)
+        items = items.filter(order__created_at__date__gte=start)
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        orders = orders.filter(created_at__date__lte=end)
+        items = items.filter(order__created_at__date__lte=end)
+        rollups = rollups.filter(day__lte=end)
+
+    buckets = {}
+    for row in orders.annotate(local_day=TruncDate('created_at', tzinfo=tz)).values(
+        'restaurant_id', 'local_day', 'status'
+    ).annotate(order_count=Count('id'), revenue=Sum('total_amount')):
+        key = (row['restaurant_id'], row['local_day'], row['status'])
+        buckets[key] = DailyOrderRollup(
+            restaurant_id=key[0], day=key[1], status=key[2],
+            order_count=row['order_count'], revenue=row['revenue'] or 0, item_count=0
+        )
+
+    for row in items.annotate(local_day=TruncDate('order__created_at', tzinfo=tz)).values(
+        'order__restaurant_id', 'local_day', 'order__status'
+    ).annotate(quantity=Sum('quantity')):
+        key = (row['order__restaurant_id'], row['local_day'], row['order__status'])
+        if key in buckets:
+            buckets[key].item_count = row['quantity'] or 0
+
+    with transaction.atomic():
+        rollups.delete()
+        DailyOrderRollup.objects.bulk_create(buckets.values(), batch_size=500)
+    return len(buckets)
+
+
+# -------------------- Reads --------------------
+def summary(since=None):
+    """Totals per status (optionally from a local day on) straight from the rollups"""
+    rollups = DailyOrderRollup.objects.all()
+    if since:
+        rollups = rollups.filter(day__gte=since)
+    by_status = {
+        row['status']: row
+        for row in rollups.values('status').annotate(
+            orders=Sum('order_count'), revenue=Sum('revenue'), items=Sum('item_count')
+        )
+    }
+    return by_status
+
+
+def restaurant_stats():
+    stats = DailyOrderRollup.objects.values(
+        'restaurant__name',
+        'restaurant__id',
+        'restaurant__area'
+    ).annotate(
+        total_orders=Sum('order_count'),
+        total_revenue=Sum('revenue')
+    ).filter(total_orders__gt=0).order_by('-total_revenue')
+    return [
+        {**row, 'avg_order_value': row['total_revenue'] / row['total_orders']}
+        for row in stats
+    ]
+
+
+def recent_day(days):
+    return timezone.localdate() - timedelta(days=days)
@@ -0,0 +1,369 @@
+# Live seat map state shared by every viewer of a restaurant's seat picker
+
+import array
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Seat, OccupiedSeat, Booking
+
+# How many deltas each restaurant keeps so reconnecting viewers can catch up
+DELTA_BUFFER_SIZE = 256
+# Re-read state and layout even without local events, to pick up writes made by other workers
+RESYNC_SECONDS = getattr(settings, 'SEATMAP_RESYNC_SECONDS', 30)
+# Maps nobody has streamed or read for this long are dropped from the registry
+IDLE_SECONDS = getattr(settings, 'SEATMAP_IDLE_SECONDS', 600)
+# Keep-alive comment interval and maximum lifetime of one event stream. A stream
+# ties up a sync worker, so it is kept short: clients reconnect with the last
+# version they saw and get only the deltas they missed.
+HEARTBEAT_SECONDS = getattr(settings, 'SEATMAP_HEARTBEAT_SECONDS', 10)
+STREAM_SECONDS = getattr(settings, 'SEATMAP_STREAM_SECONDS', 25)
+# Browser cache lifetime of the packed layout fetched without its current hash
+LAYOUT_MAX_AGE = getattr(settings, 'SEATMAP_LAYOUT_MAX_AGE', 300)
+
+
+def _bitmap(flags):
+    """Bit i (least significant bit first within each byte) is flags[i], base64-encoded"""
+    flags = list(flags)
+    bits = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            bits[i >> 3] |= 1 << (i & 7)
+    return base64.b64encode(bytes(bits)).decode()
+
+
+class CompiledLayout:
+    """A restaurant's static seat layout packed into parallel arrays, built once per layout change.
+
+    Seat i of every array (and bit i of every bitmap) is the same seat, in id order.
+    """
+
+    def __init__(self, rows):
+        rows = list(rows)
+        self.ids = array.array('q', (row['id'] for row in rows))
+        self.codes = [row['code'] for row in rows]
+        self.x = array.array('q', (row['x_position'] for row in rows))
+        self.y = array.array('q', (row['y_position'] for row in rows))
+        self.private = _bitmap(row['is_private_room'] for row in rows)
+        digest = hashlib.sha1()
+        for part in (self.ids.tobytes(), self.x.tobytes(), self.y.tobytes(), self.private.encode(),
+                     '\0'.join(self.codes).encode()):
+            digest.update(part)
+            digest.update(b'|')
+        self.hash = digest.hexdigest()[:16]
+        # The response body, ready to render
+        self.data = {
+            'hash': self.hash, 'count': len(self.ids), 'ids': self.ids.tolist(), 'codes': self.codes,
+            'x': self.x.tolist(), 'y': self.y.tolist(), 'private': self.private,
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self):
+        """The layout as seat dicts, the shape of the original seats response"""
+        private = base64.b64decode(self.private)
+        return [
+            {'id': seat_id, 'code': code, 'is_private_room': bool(private[i >> 3] & (1 << (i & 7))),
+             'x_position': x, 'y_position': y}
+            for i, (seat_id, code, x, y) in enumerate(zip(self.ids, self.codes, self.x, self.y))
+        ]
+
+
+class SeatMap:
+    """Occupancy of one restaurant's seats, computed once and kept current with deltas"""
+
+    def __init__(self, restaurant_id):
+        self.restaurant_id = restaurant_id
+        self.version = 0
+        self.layout = None        # CompiledLayout
+        self.states = {}          # seat_id -> (is_occupied, is_booked)
+        self._views = {}          # name -> (version, data) built from the current state
+        self.deltas = deque(maxlen=DELTA_BUFFER_SIZE)  # (version, changed, removed, layout_changed)
+        self.next_transition = None  # when an occupancy expires or a booking starts/ends
+        self.synced_at = 0
+        self.layout_synced_at = 0
+        self.used_at = time.monotonic()
+        self.watchers = 0         # open event streams
+        self.condition = threading.Condition()
+
+    # ---- state computation ----
+    def _layout_due(self):
+        return self.layout is None or time.monotonic() - self.layout_synced_at >= RESYNC_SECONDS
+
+    def _compute_states(self, rows=None):
+        """`rows` is (now, occupied rows, booking rows) already fetched by get_seat_maps()"""
+        if rows is None:
+            now = timezone.now()
+            rows = (now, _occupied_rows([self.restaurant_id], now), _booking_rows([self.restaurant_id], now))
+        now, occupied_rows, booking_rows = rows
+        next_transition = None
+
+        occupied = set()
+        for seat_id, occupied_until, *_ in occupied_rows:
+            occupied.add(seat_id)
+            if next_transition is None or occupied_until < next_transition:
+                next_transition = occupied_until
+
+        booked = set()
+        for seat_id, start_time, end_time, *_ in booking_rows:
+            if start_time <= now:
+                if seat_id is not None:
+                    booked.add(seat_id)
+                changes_at = end_time
+            else:
+                changes_at = start_time
+            if next_transition is None or changes_at < next_transition:
+                next_transition = changes_at
+
+        states = {
+            seat_id: (seat_id in occupied, seat_id in booked)
+            for seat_id in self.layout.ids
+        }
+        return states, next_transition
+
+    def refresh(self, reload_layout=False, layout=None, rows=None):
+        """Recompute occupancy and publish the changed seats as one delta"""
+        with self.condition:
+            layout_changed = False
+            if layout is None and (reload_layout or self.layout is None):
+                layout = _layout_rows([self.restaurant_id])
+            if layout is not None:
+                compiled = CompiledLayout(layout)
+                layout_changed = self.layout is None or compiled.hash != self.layout.hash
+                if layout_changed:
+                    self.layout = compiled
+                self.layout_synced_at = time.monotonic()
+            states, next_transition = self._compute_states(rows)
+
+            changed = [
+                {'id': seat_id, 'is_occupied': state[0], 'is_booked': state[1]}
+                for seat_id, state in states.items()
+                if self.states.get(seat_id) != state
+            ]
+            removed = [seat_id for seat_id in self.states if seat_id not in states]
+
+            self.states = states
+            self.next_transition = next_transition
+            self.synced_at = time.monotonic()
+
+            if self.version == 0 or changed or removed or layout_changed:
+                self.version += 1
+                self.deltas.append((self.version, changed, removed, layout_changed))
+                self.condition.notify_all()
+
+    def is_due(self):
+        """True when a timed transition has passed or the resync interval elapsed"""
+        return (
+            self._layout_due()
+            or (self.next_transition is not None and timezone.now() >= self.next_transition)
+            or time.monotonic() - self.synced_at >= RESYNC_SECONDS
+        )
+
+    def refresh_if_due(self):
+        with self.condition:
+            if self.is_due():
+                self.refresh(reload_layout=self._layout_due())
+
+    # ---- views of the state ----
+    def _view(self, name, build):
+        """build() for the current version, computed once per version and shared (do not mutate)"""
+        self.refresh_if_due()
+        with self.condition:
+            cached = self._views.get(name)
+            if cached is None or cached[0] != self.version:
+                cached = self._views[name] = (self.version, build())
+            return cached
+
+    def snapshot(self):
+        """(version, seat dicts with their states)"""
+        def build():
+            seats = self.layout.rows()
+            for seat in seats:
+                seat['is_occupied'], seat['is_booked'] = self.states.get(seat['id'], (False, False))
+            return seats
+        return self._view('snapshot', build)
+
+    def compiled_layout(self):
+        self.refresh_if_due()
+        with self.condition:
+            return self.layout
+
+    def occupancy(self):
+        """(version, {'layout_hash', 'occupied', 'booked'}) with one bit per seat of the layout"""
+        def build():
+            states = [self.states.get(seat_id, (False, False)) for seat_id in self.layout.ids]
+            return {
+                'layout_hash': self.layout.hash,
+                'occupied': _bitmap(state[0] for state in states),
+                'booked': _bitmap(state[1] for state in states),
+            }
+        return self._view('occupancy', build)
+
+    def deltas_since(self, version):
+        """Changes after `version`, or None when the buffer no longer reaches back that far"""
+        with self.condition:
+            if version == self.version:
+                return []
+            pending = [delta for delta in self.deltas if delta[0] > version]
+            if not pending or pending[0][0] != version + 1:
+                return None
+            if any(delta[3] for delta in pending):
+                return None  # layout changed, viewers need a fresh snapshot
+            return [(v, changed, removed) for v, changed, removed, _ in pending]
+
+    def wait(self, version, timeout):
+        with self.condition:
+            if self.next_transition is not None:
+                until_transition = (self.next_transition - timezone.now()).total_seconds()
+                timeout = max(min(timeout, until_transition), 0)
+            if self.version == version:
+                self.condition.wait(timeout)
+
+
+# ---- queries, shared by one map and by batches of them ----
+def _layout_rows(restaurant_ids):
+    return Seat.objects.filter(restaurant_id__in=restaurant_ids).order_by('id').values(
+        'id', 'code', 'is_private_room', 'x_position', 'y_position', 'restaurant_id'
+    )
+
+
+def _occupied_rows(restaurant_ids, now):
+    return OccupiedSeat.objects.filter(
+        seat__restaurant_id__in=restaurant_ids, occupied_until__gt=now
+    ).values_list('seat_id', 'occupied_until', 'seat__restaurant_id')
+
+
+def _booking_rows(restaurant_ids, now):
+    return Booking.objects.filter(
+        restaurant_id__in=restaurant_ids, end_time__gt=now, status='confirmed'
+    ).values_list('seats', 'start_time', 'end_time', 'restaurant_id')
+
+
+def _group(rows, key):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(key(row), []).append(row)
+    return grouped
+
+
+_seat_maps = {}
+_registry_lock = threading.Lock()
+_evicted_at = time.monotonic()
+
+
+def _evict_idle(now):
+    """Drop maps without open streams that nobody has read for IDLE_SECONDS (registry lock held)"""
+    global _evicted_at
+    if now - _evicted_at < RESYNC_SECONDS:
+        return
+    _evicted_at = now
+    for restaurant_id, seat_map in list(_seat_maps.items()):
+        if seat_map.watchers == 0 and now - seat_map.used_at >= IDLE_SECONDS:
+            del _seat_maps[restaurant_id]
+
+
+def get_seat_map(restaurant_id):
+    now = time.monotonic()
+    with _registry_lock:
+        _evict_idle(now)
+        seat_map = _seat_maps.get(restaurant_id)
+        if seat_map is None:
+            seat_map = _seat_maps[restaurant_id] = SeatMap(restaurant_id)
+        seat_map.used_at = now
+    return seat_map
+
+
+def get_seat_maps(restaurant_ids):
+    """Seat maps of many restaurants; those due for a refresh are loaded with one query per table"""
+    seat_maps = {restaurant_id: get_seat_map(restaurant_id) for restaurant_id in restaurant_ids}
+    due = [seat_map for seat_map in seat_maps.values() if seat_map.is_due()]
+    if not due:
+        return seat_maps
+
+    now = timezone.now()
+    ids = [seat_map.restaurant_id for seat_map in due]
+    stale = [seat_map.restaurant_id for seat_map in due if seat_map._layout_due()]
+    layouts = _group(_layout_rows(stale), lambda row: row['restaurant_id']) if stale else {}
+    occupied = _group(_occupied_rows(ids, now), lambda row: row[2])
+    bookings = _group(_booking_rows(ids, now), lambda row: row[3])
+    for seat_map in due:
+        restaurant_id = seat_map.restaurant_id
+        seat_map.refresh(
+            layout=layouts.get(restaurant_id, []) if restaurant_id in stale else None,
+            rows=(now, occupied.get(restaurant_id, ()), bookings.get(restaurant_id, ()))
+        )
+    return seat_maps
+
+
+def discard(restaurant_id):
+    """Drop a map that should not have been created (e.g. for an unknown restaurant)"""
+    with _registry_lock:
+        _seat_maps.pop(restaurant_id, None)
+
+
+def has_maps():
+    """Whether any restaurant's map is held (streamed or recently read) and so kept current"""
+    return bool(_seat_maps)
+
+
+def notify_changed(restaurant_id, reload_layout=False):
+    """Called on writes; only restaurants with a held map get recomputed"""
+    seat_map = _seat_maps.get(restaurant_id)
+    if seat_map is not None and seat_map.layout is not None:
+        seat_map.refresh(reload_layout=reload_layout)
+
+
+# -------------------- Server-Sent Events --------------------
+def _event(name, version, data):
+    return f"event: {name}\nid: {version}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream(restaurant_id, last_version=None):
+    """Yield one snapshot, then deltas as they are published, until the stream expires"""
+    seat_map = get_seat_map(restaurant_id)
+    deadline = time.monotonic() + STREAM_SECONDS
+    with seat_map.condition:
+        seat_map.watchers += 1
+    try:
+        pending = seat_map.deltas_since(last_version) if last_version is not None else None
+        if pending is None:
+            version, seats = seat_map.snapshot()
+            yield _event('snapshot', version, {
+                'restaurant_id': restaurant_id, 'version': version, 'seats': seats
+            })
+        else:
+            version = last_version
+
+        yield 'retry: 1000\n\n'  # reconnect quickly once the stream expires
+
+        while time.monotonic() < deadline:
+            pending = seat_map.deltas_since(version)
+            if pending is None:
+                version, seats = seat_map.snapshot()
+                yield _event('snapshot', version, {
+                    'restaurant_id': restaurant_id, 'version': version, 'seats': seats
+                })
+                continue
+
+            for delta_version, changed, removed in pending:
+                version = delta_version
+                if changed or removed:
+                    yield _event('delta', version, {
+                        'version': version, 'seats': changed, 'removed': removed
+                    })
+
+            seat_map.wait(version, min(HEARTBEAT_SECONDS, max(deadline - time.monotonic(), 0)))
+            seat_map.refresh_if_due()
+            if seat_map.version == version:
+                yield ': keep-alive\n\n'
+    finally:
+        with seat_map.condition:
+            seat_map.watchers -= 1
+            seat_map.used_at = time.monotonic()
@@ -4,6 +4,16 @@ from .models import (
     Discount, Booking, Order, OrderItem, Review, OccupiedSeat, RewardRedemption
 )
 
+# -------------------- Sparse Fieldsets --------------------
+class SparseFieldsMixin:
+    """Takes fields=<names> to keep only those fields (see foodapp.fieldsets)"""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 # -------------------- Institution Serializer --------------------
 class InstitutionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -25,10 +35,17 @@ class GuestSessionSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # -------------------- Restaurant Serializer --------------------
-class RestaurantSerializer(serializers.ModelSerializer):
+class RestaurantSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Restaurant
         fields = '__all__'
+        presets = {
+            'card': (
+                'id', 'name', 'area', 'cuisines', 'average_rating', 'total_reviews', 'is_open',
+                'opening_time', 'closing_time', 'has_private_room', 'has_smoking_zone',
+                'has_prayer_zone', 'color_theme', 'logo', 'logo_asset',
+            ),
+        }
 
 # -------------------- Seat Serializer --------------------
 class SeatSerializer(serializers.ModelSerializer):
@@ -39,13 +56,19 @@ class SeatSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # -------------------- Menu Item Serializer --------------------
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     restaurant_name = serializers.CharField(source='restaurant.name', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     
     class Meta:
         model = MenuItem
         fields = '__all__'
+        presets = {
+            'card': (
+                'id', 'name', 'price', 'cuisine_type', 'is_vegetarian', 'spice_level',
+                'is_available', 'is_student_set', 'popular_rank',
+            ),
+        }
 
 # -------------------- Discount Serializer --------------------
 class DiscountSerializer(serializers.ModelSerializer):
@@ -56,7 +79,7 @@ class DiscountSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # -------------------- Booking Serializer --------------------
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     restaurant_name = serializers.CharField(source='restaurant.name', read_only=True)
     restaurant_address = serializers.CharField(source='restaurant.area', read_only=True)
     user_email = serializers.CharField(source='user.email', read_only=True)
@@ -68,6 +91,13 @@ class BookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = '__all__'
+        presets = {
+            'card': ('id', 'restaurant_name', 'start_time', 'end_time', 'status', 'seat_list', 'total_amount'),
+        }
+        field_sources = {
+            'seat_list': ('seats', 'seat_codes'),
+            'duration_hours': ('start_time', 'end_time'),
+        }
 
     def get_seat_list(self, obj):
         # Return both database seats and generated seat codes
@@ -90,7 +120,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 # -------------------- Order Serializer --------------------
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     restaurant_name = serializers.CharField(source='restaurant.name', read_only=True)
     restaurant_area = serializers.CharField(source='restaurant.area', read_only=True)
     user_email = serializers.CharField(source='user.email', read_only=True)
@@ -104,6 +134,16 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = '__all__'
+        presets = {
+            'card': (
+                'id', 'restaurant_name', 'status', 'payment_status', 'total_amount', 'items_count',
+                'created_at',
+            ),
+        }
+        field_sources = {
+            'items_count': ('items',),
+            'customer_info': ('user', 'guest_session', 'delivery_contact'),
+        }
 
     def get_items_count(self, obj):
         return obj.items.count()
@@ -125,7 +165,7 @@ class OrderSerializer(serializers.ModelSerializer):
         return None
 
 # -------------------- Review Serializer --------------------
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user_email = serializers.CharField(source='user.email', read_only=True)
     restaurant_name = serializers.CharField(source='restaurant.name', read_only=True)
     order_id = serializers.IntegerField(source='order.id', read_only=True)
@@ -0,0 +1,117 @@
+# Model signal handlers that keep in-memory state in sync with writes
+
+from django.db.models.signals import post_init, pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    Seat, Booking, OccupiedSeat, Discount, MenuItem, Order, OrderItem, UserProfile, Restaurant
+)
+from . import (
+    seatmap, discounts, pricing, rollups, leaderboards, bestsellers, profiles, singleflight, availability
+)
+
+
+# -------------------- Live Seat Map --------------------
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    seatmap.notify_changed(instance.restaurant_id)
+
+
+@receiver(m2m_changed, sender=Booking.seats.through)
+def booking_seats_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Booking):
+        seatmap.notify_changed(instance.restaurant_id)
+
+
+# -------------------- Availability Search --------------------
+@receiver([post_save, post_delete], sender=Booking)
+def booking_availability_changed(sender, instance, **kwargs):
+    availability.invalidate()
+
+
+@receiver(m2m_changed, sender=Booking.seats.through)
+def booking_seats_availability_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        availability.invalidate()
+
+
+@receiver([post_save, post_delete], sender=OccupiedSeat)
+def occupied_seat_changed(sender, instance, **kwargs):
+    if not seatmap.has_maps():
+        return  # avoid the seat lookup during bulk seeding
+    if 'created' not in kwargs and instance.occupied_until <= timezone.now():
+        return  # deleting an expired occupancy (the sweeper) changes nothing
+    restaurant_id = Seat.objects.filter(id=instance.seat_id).values_list('restaurant_id', flat=True).first()
+    if restaurant_id is not None:
+        seatmap.notify_changed(restaurant_id)
+
+
+@receiver([post_save, post_delete], sender=Seat)
+def seat_changed(sender, instance, **kwargs):
+    seatmap.notify_changed(instance.restaurant_id, reload_layout=True)
+
+
+# -------------------- Discount Engine --------------------
+@receiver([post_save, post_delete], sender=Discount)
+def discount_changed(sender, instance, **kwargs):
+    discounts.invalidate(instance.restaurant_id)
+
+
+# -------------------- Price Snapshots --------------------
+@receiver([post_save, post_delete], sender=MenuItem)
+def menu_item_changed(sender, instance, **kwargs):
+    pricing.invalidate(instance.restaurant_id)
+    singleflight.expire(f'restaurant:{instance.restaurant_id}')
+
+
+# -------------------- Restaurant Responses --------------------
+@receiver([post_save, post_delete], sender=Restaurant)
+def restaurant_changed(sender, instance, **kwargs):
+    singleflight.expire('restaurants', f'restaurant:{instance.id}')
+    availability.invalidate()
+
+
+# -------------------- Daily Order Rollups --------------------
+@receiver(post_init, sender=Order)
+def order_loaded(sender, instance, **kwargs):
+    rollups.remember(instance)
+
+
+@receiver(pre_save, sender=Order)
+def order_saving(sender, instance, **kwargs):
+    rollups.before_save(instance)
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    rollups.order_saved(instance, created)
+    if created:
+        leaderboards.order_changed(instance, 1)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    rollups.order_deleted(instance)
+    leaderboards.order_changed(instance, -1)
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance, created, **kwargs):
+    if created:
+        rollups.items_changed(instance.order, instance.quantity)
+        bestsellers.items_ordered(instance.order, {instance.menu_item_id: instance.quantity})
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance, **kwargs):
+    order = Order.objects.filter(id=instance.order_id).first()
+    if order is not None:
+        rollups.items_changed(order, -instance.quantity)
+        bestsellers.items_ordered(order, {instance.menu_item_id: -instance.quantity})
+
+
+# -------------------- Profile Cache --------------------
+@receiver([post_save, post_delete], sender=UserProfile)
+def user_profile_changed(sender, instance, **kwargs):
+    profiles.invalidate(instance.id)
@@ -0,0 +1,127 @@
+# Single-flight response cache with stale-while-revalidate.
+#
+# A missing key is computed by one caller while the others wait for its result:
+# threads of this process wait on an Event, other processes poll the shared
+# cache while a lock marks the computation in flight. Once a value is stale it
+# keeps being served while a single background refresh runs.
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from . import locks
+
+logger = logging.getLogger(__name__)
+
+FRESH_SECONDS = getattr(settings, 'SINGLE_FLIGHT_FRESH_SECONDS', 30)
+STALE_SECONDS = getattr(settings, 'SINGLE_FLIGHT_STALE_SECONDS', 300)
+WAIT_SECONDS = getattr(settings, 'SINGLE_FLIGHT_WAIT_SECONDS', 5)
+LOCK_SECONDS = 30  # Lock lifetime, in case the computing worker dies
+POLL_SECONDS = 0.02
+
+_in_flight = {}  # key -> Event set when this process finishes computing it
+_lock = threading.Lock()
+
+
+def _entry_key(key):
+    return f'sf:{key}'
+
+
+def _generation_key(group):
+    return f'sf:gen:{group}'
+
+
+def expire(*groups):
+    """Mark every entry of these groups stale (they are still served while refreshing)"""
+    for group in groups:
+        try:
+            cache.incr(_generation_key(group))
+        except ValueError:
+            cache.set(_generation_key(group), 1, None)
+
+
+def _generations(groups):
+    values = cache.get_many([_generation_key(group) for group in groups])
+    return tuple(values.get(_generation_key(group), 0) for group in groups)
+
+
+def _store(key, groups, compute):
+    generations = _generations(groups)  # read first, so a concurrent expire() wins
+    value = compute()
+    cache.set(_entry_key(key), {
+        'value': value,
+        'fresh_until': time.time() + FRESH_SECONDS,
+        'generations': generations,
+    }, FRESH_SECONDS + STALE_SECONDS)
+    return value
+
+
+def _is_fresh(entry, groups):
+    return entry['fresh_until'] > time.time() and entry['generations'] == _generations(groups)
+
+
+def _refresh_in_background(key, groups, compute):
+    if not locks.try_lock(_entry_key(key), LOCK_SECONDS):
+        return  # someone is already refreshing it
+
+    def run():
+        close_old_connections()
+        try:
+            _store(key, groups, compute)
+        except Exception:
+            logger.exception('Background refresh of %s failed', key)
+        finally:
+            locks.unlock(_entry_key(key))
+            close_old_connections()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def get_or_compute(key, compute, groups=()):
+    """Cached result of compute(); `groups` name what expire() can invalidate it by.
+
+    Exceptions from compute() propagate to the caller that ran it and are not
+    cached; waiters then compute for themselves.
+    """
+    entry = cache.get(_entry_key(key))
+    if entry is not None:
+        if not _is_fresh(entry, groups):
+            _refresh_in_background(key, groups, compute)
+        return entry['value']
+
+    with _lock:
+        event = _in_flight.get(key)
+        leader = event is None
+        if leader:
+            event = _in_flight[key] = threading.Event()
+
+    if not leader:
+        event.wait(WAIT_SECONDS)
+        entry = cache.get(_entry_key(key))
+        return entry['value'] if entry is not None else compute()
+
+    try:
+        deadline = time.monotonic() + WAIT_SECONDS
+        while not locks.try_lock(_entry_key(key), LOCK_SECONDS):
+            # Another process is computing it; wait for its result
+            entry = cache.get(_entry_key(key))
+            if entry is not None:
+                return entry['value']
+            if time.monotonic() >= deadline:
+                return compute()
+            time.sleep(POLL_SECONDS)
+        try:
+            entry = cache.get(_entry_key(key))  # it may have landed just before we locked
+            if entry is not None:
+                return entry['value']
+            return _store(key, groups, compute)
+        finally:
+            locks.unlock(_entry_key(key))
+    finally:
+        with _lock:
+            _in_flight.pop(key, None)
+        event.set()
@@ -0,0 +1,99 @@
+# TTL compaction for rows that expire: finished seat occupancies, idle guest
+# sessions and daily item sales older than every best-seller window
+
+import gzip
+import json
+import logging
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OccupiedSeat, GuestSession, Order, Booking, DailyItemSales
+from . import bestsellers, rollups
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'SWEEPER_BATCH_SIZE', 500)
+# Expired occupancies are kept this long after occupied_until before deletion
+OCCUPANCY_GRACE = timedelta(minutes=getattr(settings, 'SWEEPER_OCCUPANCY_GRACE_MINUTES', 60))
+# Guest sessions with no orders or bookings are dropped after this many days
+GUEST_SESSION_TTL = timedelta(days=getattr(settings, 'GUEST_SESSION_TTL_DAYS', 7))
+ARCHIVE_DIR = Path(getattr(settings, 'SWEEPER_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def _archive(table, rows):
+    """Append rows as gzipped NDJSON, one file per table per day"""
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    path = ARCHIVE_DIR / f"{table}-{timezone.now():%Y%m%d}.ndjson.gz"
+    with gzip.open(path, 'at', encoding='utf-8') as archive_file:
+        for row in rows:
+            archive_file.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+
+
+def _sweep(queryset, table, batch_size, max_batches, archive, pause):
+    """Delete matching rows in id-ordered batches; returns the number removed"""
+    removed = 0
+    for _ in range(max_batches):
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            # Re-apply the filter: a row may have stopped matching since the ids
+            # were read (a guest session that just got an order must not go)
+            batch = queryset.filter(id__in=ids)
+            if archive:
+                rows = list(batch.values())
+                batch = queryset.filter(id__in=[row['id'] for row in rows])
+                # Written only once the rows are really gone; a rollback leaves no copy
+                transaction.on_commit(lambda rows=rows: _archive(table, rows))
+            _, deleted = batch.delete()
+        removed += deleted.get(queryset.model._meta.label, 0)
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)  # let other writers in between batches
+    return removed
+
+
+def expired_occupancies(now=None):
+    now = now or timezone.now()
+    return OccupiedSeat.objects.filter(occupied_until__lte=now - OCCUPANCY_GRACE)
+
+
+def stale_guest_sessions(now=None):
+    now = now or timezone.now()
+    return GuestSession.objects.filter(created_at__lt=now - GUEST_SESSION_TTL).exclude(
+        id__in=Order.objects.filter(guest_session__isnull=False).values('guest_session_id')
+    ).exclude(
+        id__in=Booking.objects.filter(guest_session__isnull=False).values('guest_session_id')
+    )
+
+
+def expired_item_sales():
+    """Days no best-seller window reads any more"""
+    return DailyItemSales.objects.filter(day__lte=rollups.recent_day(max(bestsellers.WINDOWS)))
+
+
+def sweep(batch_size=None, max_batches=1000, archive=False, pause=0.0):
+    """Run every compaction pass and report rows reclaimed and time spent"""
+    batch_size = batch_size or BATCH_SIZE
+    started = time.monotonic()
+    now = timezone.now()
+
+    report = {
+        'occupied_seats': _sweep(expired_occupancies(now), 'occupied_seats',
+                                 batch_size, max_batches, archive, pause),
+        'guest_sessions': _sweep(stale_guest_sessions(now), 'guest_sessions',
+                                 batch_size, max_batches, archive, pause),
+        # Derived from OrderItem, so never archived
+        'item_sales': _sweep(expired_item_sales(), 'item_sales', batch_size, max_batches, False, pause),
+    }
+    report['seconds'] = round(time.monotonic() - started, 3)
+    logger.info("Sweeper reclaimed %s expired occupancies, %s guest sessions and %s item sales rows in %ss",
+                report['occupied_seats'], report['guest_sessions'], report['item_sales'], report['seconds'])
+    return report
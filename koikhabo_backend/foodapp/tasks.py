@@ -0,0 +1,101 @@
+# Background tasks run by the job queue worker (python manage.py run_jobs)
+
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, F
+
+from . import bestsellers, feed, leaderboards, payments, profiles, recommendations, singleflight, sweeper
+from .jobs import task, enqueue
+from .models import UserProfile, Restaurant, Review, Order
+from .analytics import build_dashboard_analytics
+
+DASHBOARD_CACHE_KEY = 'admin_dashboard:analytics'
+
+
+@task('award_reward_points')
+def award_reward_points(user_id, total_amount, order_id=None):
+    """Award points for an order once, however often the job is delivered"""
+    points_earned = int(Decimal(str(total_amount)) // 100)  # 1 point per 100 tk
+    with transaction.atomic():
+        # Jobs queued before order_id was part of the payload have nothing to claim
+        if order_id is not None and not Order.objects.filter(
+            id=order_id, reward_points_awarded=False
+        ).update(reward_points_awarded=True):
+            return
+        if points_earned > 0:
+            UserProfile.objects.filter(id=user_id).update(reward_points=F('reward_points') + points_earned)
+    profiles.invalidate(int(user_id))  # .update() skips the post_save signal
+
+
+@task('recompute_restaurant_rating')
+def recompute_restaurant_rating(restaurant_id):
+    summary = Review.objects.filter(restaurant_id=restaurant_id).aggregate(
+        avg_rating=Avg('rating'), total=Count('id')
+    )
+    Restaurant.objects.filter(id=restaurant_id).update(
+        average_rating=round(summary['avg_rating'] or 0, 2),
+        total_reviews=summary['total']
+    )
+    leaderboards.request_rebuild()  # the rating board is only rebuilt, never patched
+    singleflight.expire('restaurants', f'restaurant:{restaurant_id}')  # .update() skips signals
+
+
+@task('refresh_leaderboards')
+def refresh_leaderboards():
+    leaderboards.rebuild()
+
+
+@task('refresh_feed_features')
+def refresh_feed_features():
+    feed.rebuild_user_features()
+
+
+@task('refresh_dashboard_analytics')
+def refresh_dashboard_analytics():
+    analytics = build_dashboard_analytics()
+    cache.set(DASHBOARD_CACHE_KEY, analytics, None)
+    return analytics
+
+
+@task('sweep_expired')
+def sweep_expired(interval=None, archive=False):
+    """Compact expired rows; with an interval (seconds) the job schedules its next run"""
+    try:
+        return sweeper.sweep(archive=archive)
+    finally:
+        # Even when this run fails: retries give up after max_attempts, the schedule must not
+        if interval:
+            enqueue('sweep_expired', {'interval': interval, 'archive': archive},
+                    priority=-5, delay=interval, dedup_key='sweep-expired')
+
+
+@task('build_recommendations')
+def build_recommendations(full=False, interval=None):
+    """Update the co-occurrence matrix; with an interval (seconds) the job schedules its next run"""
+    try:
+        return recommendations.build(full=full)
+    finally:
+        if interval:  # even when this run fails, as in sweep_expired
+            enqueue('build_recommendations', {'interval': interval},
+                    priority=-5, delay=interval, dedup_key='build-recommendations')
+
+
+@task('rebuild_bestsellers')
+def rebuild_bestsellers(interval=None):
+    """Recount best-seller days from OrderItem; with an interval (seconds) the job schedules its next run"""
+    try:
+        return bestsellers.rebuild()
+    finally:
+        if interval:  # even when this run fails, as in sweep_expired
+            enqueue('rebuild_bestsellers', {'interval': interval},
+                    priority=-5, delay=interval, dedup_key='rebuild-bestsellers')
+
+
+@task('reconcile_payment')
+def reconcile_payment(order_id):
+    """Settle a charge whose outcome was unknown; raising makes the job retry with backoff"""
+    order = Order.objects.filter(id=order_id).first()
+    if order and payments.reconcile(order) == 'pending':
+        raise payments.PaymentError(f'Payment for order {order_id} is still unsettled')
@@ -1,3 +1,1184 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import (
+    Booking, DailyItemSales, DailyOrderRollup, Discount, FoodCategory, GuestSession, Institution,
+    Job, MenuItem, OccupiedSeat, Order, OrderItem, Restaurant, Seat, UserProfile
+)
+from . import (
+    analytics, assets, availability, bestsellers, discounts, feed, fieldsets, idempotency, jobs,
+    leaderboards, locks, menu_io, mock_gateway, payments, profiles, ratelimit, recommendations,
+    rollups, seatmap, singleflight, sweeper, tasks
+)
+from .serializers import RestaurantSerializer
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'foodapp-tests'},
+    'durable': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'foodapp-tests-durable',
+                'TIMEOUT': None},
+}
+
+
+# -------------------- Fixtures --------------------
+def make_restaurant(name='Kacchi Bhai', area='Dhanmondi', capacity=20, **fields):
+    # Opening and closing at midnight means open around the clock
+    fields = {'latitude': Decimal('23.750000'), 'longitude': Decimal('90.370000'), **fields}
+    return Restaurant.objects.create(
+        name=name, description='', area=area, address='Road 27', phone='01700000000',
+        opening_time=time(0, 0), closing_time=time(0, 0), capacity=capacity, **fields
+    )
+
+
+def make_item(restaurant, name='Kacchi', price='250.00', **fields):
+    category, _ = FoodCategory.objects.get_or_create(name='Main')
+    fields = {'cuisine_type': 'bengali', **fields}
+    return MenuItem.objects.create(
+        restaurant=restaurant, name=name, description='', price=Decimal(price), category=category, **fields
+    )
+
+
+def make_order(restaurant, total='500.00', status='confirmed', **fields):
+    fields.setdefault('payment_method', 'cash')
+    return Order.objects.create(
+        restaurant=restaurant, subtotal=Decimal(total), total_amount=Decimal(total), status=status, **fields
+    )
+
+
+def at_local(day, hour=12):
+    return timezone.make_aware(datetime.combine(day, time(hour, 0)))
+
+
+def reset_process_state():
+    """Per-process caches outlive the rolled-back rows of a test"""
+    for alias in TEST_CACHES:
+        caches[alias].clear()
+    seatmap._seat_maps.clear()
+    availability._index = None
+    discounts._indexes.clear()
+    discounts._state.update(version=None, checked_at=0)
+    profiles._entries.clear()
+    leaderboards._boards = None
+    leaderboards._state['checked_at'] = 0
+    recommendations._matrix = None
+    recommendations._state.update(version=None, checked_at=0)
+    feed._features = None
+    feed._user_cuisines = None
+    feed._user_state.update(checked_at=0, generated_at=None)
+
+
+@override_settings(CACHES=TEST_CACHES, RATE_LIMIT={'ENABLED': False})
+class FoodappTestCase(TestCase):
+    def setUp(self):
+        reset_process_state()
+        self.addCleanup(reset_process_state)
+        self.patch(locks, 'LOCK_DIR', self.temp_dir())
+        self.client = APIClient()
+
+    def temp_dir(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, True)
+        return path
+
+    def patch(self, target, name, value):
+        patcher = mock.patch.object(target, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+# -------------------- Live Seat Map --------------------
+class SeatMapTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        self.restaurant = make_restaurant()
+        self.seats = [
+            Seat.objects.create(restaurant=self.restaurant, code=f'A{i}', x_position=i, y_position=0)
+            for i in range(1, 4)
+        ]
+
+    def test_occupancy_writes_publish_a_delta(self):
+        seat_map = seatmap.get_seat_map(self.restaurant.id)
+        version, seats = seat_map.snapshot()
+        self.assertFalse(any(seat['is_occupied'] for seat in seats))
+
+        OccupiedSeat.objects.create(seat=self.seats[1], occupied_until=timezone.now() + timedelta(hours=1))
+
+        deltas = seat_map.deltas_since(version)
+        self.assertEqual(len(deltas), 1)
+        self.assertEqual(deltas[0][1], [{'id': self.seats[1].id, 'is_occupied': True, 'is_booked': False}])
+
+    def test_resync_picks_up_layout_changes_from_other_workers(self):
+        seat_map = seatmap.get_seat_map(self.restaurant.id)
+        version, _ = seat_map.snapshot()
+        old_hash = seat_map.compiled_layout().hash
+
+        # .update() skips the signals, like a write handled by another process
+        Seat.objects.filter(id=self.seats[0].id).update(x_position=9)
+        self.assertEqual(seat_map.compiled_layout().hash, old_hash)
+
+        seat_map.synced_at -= seatmap.RESYNC_SECONDS
+        seat_map.layout_synced_at -= seatmap.RESYNC_SECONDS
+        self.assertNotEqual(seat_map.compiled_layout().hash, old_hash)
+        self.assertIsNone(seat_map.deltas_since(version))  # viewers need a new snapshot
+
+    def test_resync_without_layout_changes_publishes_nothing(self):
+        seat_map = seatmap.get_seat_map(self.restaurant.id)
+        version, _ = seat_map.snapshot()
+        seat_map.synced_at -= seatmap.RESYNC_SECONDS
+        seat_map.layout_synced_at -= seatmap.RESYNC_SECONDS
+        seat_map.refresh_if_due()
+        self.assertEqual(seat_map.version, version)
+
+    def test_idle_maps_are_evicted_unless_streamed(self):
+        streamed, idle = make_restaurant(name='Streamed'), make_restaurant(name='Idle')
+        stream = seatmap.event_stream(streamed.id)
+        next(stream)
+        seatmap.get_seat_map(idle.id)
+        self.assertTrue(seatmap.has_maps())
+
+        for seat_map in seatmap._seat_maps.values():
+            seat_map.used_at -= seatmap.IDLE_SECONDS
+        self.patch(seatmap, '_evicted_at', 0)
+        seatmap.get_seat_map(self.restaurant.id)
+        self.assertIn(streamed.id, seatmap._seat_maps)
+        self.assertNotIn(idle.id, seatmap._seat_maps)
+
+        stream.close()
+        self.assertEqual(seatmap._seat_maps[streamed.id].watchers, 0)
+
+    def test_expired_streams_resume_from_the_last_version(self):
+        self.patch(seatmap, 'STREAM_SECONDS', 0)
+        events = list(seatmap.event_stream(self.restaurant.id))
+        self.assertTrue(events[0].startswith('event: snapshot'))
+        version = seatmap.get_seat_map(self.restaurant.id).version
+
+        OccupiedSeat.objects.create(seat=self.seats[0], occupied_until=timezone.now() + timedelta(hours=1))
+        self.patch(seatmap, 'STREAM_SECONDS', 0.01)
+        events = list(seatmap.event_stream(self.restaurant.id, version))
+        self.assertFalse(any(event.startswith('event: snapshot') for event in events))
+        self.assertTrue(events[1].startswith('event: delta'))
+
+    def test_booked_seats_show_on_the_seat_map(self):
+        seat_map = seatmap.get_seat_map(self.restaurant.id)
+        version, _ = seat_map.snapshot()
+        start = timezone.now() - timedelta(minutes=5)
+        payload = {
+            'seat_ids': [self.seats[0].id, 'A2', 'table_1_seat_1'],
+            'start_time': start.isoformat(), 'end_time': (start + timedelta(hours=2)).isoformat(),
+        }
+        url = f'/api/restaurants/{self.restaurant.id}/book/'
+
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        booking = Booking.objects.get(id=response.json()['booking_id'])
+        self.assertEqual(set(booking.seats.all()), set(self.seats[:2]))
+        self.assertEqual(booking.seat_codes, ['table_1_seat_1'])
+
+        _, seats = seat_map.snapshot()
+        self.assertEqual([seat['is_booked'] for seat in seats], [True, True, False])
+        self.assertTrue(seat_map.deltas_since(version))
+
+        response = self.client.post(url, {**payload, 'seat_ids': ['A1']}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_layout_is_cached_by_hash(self):
+        url = f'/api/restaurants/{self.restaurant.id}/seats/layout/'
+        response = self.client.get(url)
+        layout_hash = response.data['hash']
+        self.assertEqual(response.data['codes'], ['A1', 'A2', 'A3'])
+        self.assertEqual(response['ETag'], f'"{layout_hash}"')
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=f'"{layout_hash}"').status_code, 304)
+        self.assertIn('immutable', self.client.get(url, {'hash': layout_hash})['Cache-Control'])
+
+    def test_occupancy_bitmaps_follow_layout_order(self):
+        OccupiedSeat.objects.create(seat=self.seats[2], occupied_until=timezone.now() + timedelta(hours=1))
+        response = self.client.get(f'/api/restaurants/{self.restaurant.id}/seats/occupancy/')
+        self.assertEqual(response.data['occupied'], 'BA==')  # bit 2 only
+        self.assertEqual(response.data['booked'], 'AA==')
+
+    def test_unknown_restaurant_is_not_kept(self):
+        response = self.client.get('/api/restaurants/999999/seats/occupancy/')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(999999, seatmap._seat_maps)
+
+
+# -------------------- Job Queue --------------------
+_job_calls = []
+
+
+@jobs.task('tests.record')
+def _record(value=None):
+    _job_calls.append(value)
+
+
+@jobs.task('tests.fail')
+def _fail():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        _job_calls.clear()
+
+    def test_dedup_key_returns_the_queued_job(self):
+        first = jobs.enqueue('tests.record', {'value': 1}, dedup_key='same')
+        second = jobs.enqueue('tests.record', {'value': 2}, dedup_key='same')
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(jobs.work('worker'), 1)
+        self.assertEqual(_job_calls, [1])
+
+    def test_a_claimed_job_is_not_claimed_again(self):
+        job = jobs.enqueue('tests.record')
+        self.assertEqual(jobs.claim_next('worker-a').id, job.id)
+        self.assertIsNone(jobs.claim_next('worker-b'))
+
+    def test_higher_priority_runs_first_and_future_jobs_wait(self):
+        jobs.enqueue('tests.record', {'value': 'low'})
+        jobs.enqueue('tests.record', {'value': 'high'}, priority=10)
+        jobs.enqueue('tests.record', {'value': 'later'}, delay=60)
+        jobs.work('worker')
+        self.assertEqual(_job_calls, ['high', 'low'])
+
+    def test_failures_back_off_then_fail(self):
+        job = jobs.enqueue('tests.fail', max_attempts=2)
+        with self.assertLogs('foodapp.jobs', 'WARNING'):
+            jobs.work('worker')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_at, timezone.now())
+
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        with self.assertLogs('foodapp.jobs', 'WARNING'):
+            jobs.work('worker')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIn('boom', job.last_error)
+
+    def test_jobs_of_dead_workers_are_released(self):
+        job = jobs.enqueue('tests.record')
+        jobs.claim_next('worker-a')
+        Job.objects.filter(id=job.id).update(
+            locked_at=timezone.now() - timedelta(seconds=jobs.LOCK_TIMEOUT + 1)
+        )
+        self.assertEqual(jobs.release_stale_jobs(), 1)
+        self.assertEqual(Job.objects.get(id=job.id).status, 'queued')
+
+    def test_scheduled_jobs_keep_their_schedule_when_a_run_fails(self):
+        job = jobs.enqueue('build_recommendations', {'interval': 600}, dedup_key='build-recommendations',
+                           max_attempts=2)
+        with mock.patch.object(recommendations, 'build', side_effect=RuntimeError('boom')):
+            with self.assertLogs('foodapp.jobs', 'WARNING'):
+                jobs.work('worker')
+
+        self.assertNotEqual(Job.objects.get(id=job.id).status, 'queued')  # superseded by the next run
+        [next_run] = Job.objects.filter(dedup_key='build-recommendations', status='queued')
+        self.assertGreater(next_run.run_at, timezone.now() + timedelta(seconds=500))
+
+    def test_redelivered_reward_jobs_award_once(self):
+        user = UserProfile.objects.create(email='rahim@example.com')
+        order = make_order(make_restaurant(), total='450.00', user=user)
+        self.assertEqual(profiles.get_profile(user.id).reward_points, 0)
+
+        payload = {'user_id': user.id, 'total_amount': '450.00', 'order_id': order.id}
+        for _ in range(2):  # e.g. released after the worker died, then run again
+            tasks.award_reward_points(**payload)
+        self.assertEqual(profiles.get_profile(user.id).reward_points, 4)
+
+
+# -------------------- TTL Compaction --------------------
+class SweeperTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch(sweeper, 'ARCHIVE_DIR', Path(self.temp_dir()))
+        self.restaurant = make_restaurant()
+        self.seat = Seat.objects.create(restaurant=self.restaurant, code='A1', x_position=0, y_position=0)
+
+    def stale_session(self, session_id):
+        guest = GuestSession.objects.create(session_id=session_id)
+        GuestSession.objects.filter(id=guest.id).update(
+            created_at=timezone.now() - sweeper.GUEST_SESSION_TTL - timedelta(hours=1)
+        )
+        return guest
+
+    def test_occupancies_are_kept_for_the_grace_period(self):
+        now = timezone.now()
+        OccupiedSeat.objects.create(seat=self.seat, occupied_until=now - sweeper.OCCUPANCY_GRACE - timedelta(minutes=1))
+        recent = OccupiedSeat.objects.create(seat=self.seat, occupied_until=now - timedelta(minutes=1))
+
+        self.assertEqual(sweeper.sweep()['occupied_seats'], 1)
+        self.assertEqual(list(OccupiedSeat.objects.values_list('id', flat=True)), [recent.id])
+
+    def test_guest_sessions_with_orders_are_kept(self):
+        self.stale_session('idle')
+        ordered = self.stale_session('ordered')
+        make_order(self.restaurant, guest_session=ordered)
+        GuestSession.objects.create(session_id='new')
+
+        self.assertEqual(sweeper.sweep()['guest_sessions'], 1)
+        self.assertEqual(set(GuestSession.objects.values_list('session_id', flat=True)), {'ordered', 'new'})
+
+    def test_a_session_that_orders_during_the_sweep_is_kept(self):
+        guest = self.stale_session('racing')
+        real_atomic = transaction.atomic
+        raced = []
+
+        def atomic(*args, **kwargs):
+            # The order lands after the ids were read, before the batch is deleted
+            if not raced:
+                raced.append(True)
+                make_order(self.restaurant, guest_session=guest)
+            return real_atomic(*args, **kwargs)
+
+        with mock.patch.object(sweeper.transaction, 'atomic', atomic):
+            removed = sweeper._sweep(sweeper.stale_guest_sessions(), 'guest_sessions', 10, 1, False, 0)
+        self.assertEqual(removed, 0)
+        self.assertTrue(GuestSession.objects.filter(id=guest.id).exists())
+
+    def test_archive_is_written_after_commit(self):
+        guest = self.stale_session('archived')
+        with self.captureOnCommitCallbacks() as callbacks:
+            sweeper.sweep(archive=True)
+        self.assertEqual(list(sweeper.ARCHIVE_DIR.iterdir()), [])
+
+        for callback in callbacks:
+            callback()
+        [path] = sweeper.ARCHIVE_DIR.iterdir()
+        with gzip.open(path, 'rt') as archive_file:
+            rows = [json.loads(line) for line in archive_file]
+        self.assertEqual([row['id'] for row in rows], [guest.id])
+
+
+# -------------------- Discount Engine --------------------
+class DiscountTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        self.restaurant = make_restaurant()
+        self.now = timezone.now()
+
+    def discount(self, percentage, minimum, valid_from=None, valid_until=None):
+        return Discount.objects.create(
+            restaurant=self.restaurant, name=f'{percentage}%', description='',
+            discount_percentage=Decimal(percentage), minimum_order=Decimal(minimum),
+            valid_from=valid_from or self.now - timedelta(days=1),
+            valid_until=valid_until or self.now + timedelta(days=1)
+        )
+
+    def test_best_rate_the_subtotal_qualifies_for(self):
+        self.discount(10, 0)
+        self.discount(20, 1000)
+        self.discount(15, 500)
+        for subtotal, percentage, amount in ((100, 10, '10.00'), (600, 15, '90.00'), (1000, 20, '200.00')):
+            discount, discount_amount = discounts.best_discount(self.restaurant.id, subtotal)
+            self.assertEqual(discount['discount_percentage'], percentage)
+            self.assertEqual(discount_amount, Decimal(amount))
+
+    def test_discounts_apply_only_inside_their_window(self):
+        self.discount(25, 0, valid_from=self.now + timedelta(hours=1), valid_until=self.now + timedelta(hours=2))
+        self.assertEqual(discounts.best_discount(self.restaurant.id, 100, at=self.now), (None, Decimal('0.00')))
+        discount, _ = discounts.best_discount(self.restaurant.id, 100, at=self.now + timedelta(minutes=90))
+        self.assertEqual(discount['discount_percentage'], 25)
+        self.assertEqual(discounts.best_discount(self.restaurant.id, 100, at=self.now + timedelta(hours=3))[0], None)
+
+    def test_writes_recompile_the_index(self):
+        self.assertIsNone(discounts.best_discount(self.restaurant.id, 100)[0])
+        self.discount(5, 0)
+        self.assertEqual(discounts.best_discount(self.restaurant.id, 100)[1], Decimal('5.00'))
+
+
+# -------------------- Cart Quotes --------------------
+class CartQuoteTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        self.restaurant = make_restaurant()
+        self.item = make_item(self.restaurant, price='120.00')
+        self.cart = {'restaurant_id': self.restaurant.id, 'payment_method': 'bkash',
+                     'items': [{'menu_item_id': self.item.id, 'quantity': 2}]}
+
+    def test_quote_prices_the_cart(self):
+        response = self.client.post('/api/cart/quote/', self.cart, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['subtotal'], '240.00')
+        self.assertEqual(response.data['delivery_fee'], '50')
+        self.assertEqual(response.data['total_amount'], '290.00')
+
+    def test_price_changes_are_caught_at_checkout(self):
+        version = self.client.post('/api/cart/quote/', self.cart, format='json').data['price_version']
+        self.item.price = Decimal('150.00')
+        self.item.save()
+
+        response = self.client.post('/api/orders/', {**self.cart, 'price_version': version}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['quote']['subtotal'], '300.00')
+        self.assertFalse(Order.objects.exists())
+
+    def test_unavailable_items_are_not_charged(self):
+        other = make_item(self.restaurant, name='Borhani', price='60.00', is_available=False)
+        cart = {**self.cart, 'items': self.cart['items'] + [{'menu_item_id': other.id}]}
+        response = self.client.post('/api/cart/quote/', cart, format='json')
+        self.assertEqual(response.data['unavailable_items'], [other.id])
+        self.assertEqual(response.data['subtotal'], '240.00')
+
+    def test_bad_carts_in_a_batch_fail_on_their_own(self):
+        carts = [self.cart, 1, {'restaurant_id': 999999, 'items': []}, {'restaurant_id': self.restaurant.id, 'items': 5}]
+        response = self.client.post('/api/cart/quote/', {'carts': carts}, format='json')
+        self.assertEqual(response.status_code, 200)
+        quotes = response.data['quotes']
+        self.assertEqual(quotes[0]['subtotal'], '240.00')
+        self.assertEqual([('error' in quote) for quote in quotes], [False, True, True, True])
+        self.assertIsNone(quotes[1]['restaurant_id'])
+
+    def test_malformed_bodies_are_rejected(self):
+        self.assertEqual(self.client.post('/api/cart/quote/', {'carts': 'x'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/cart/quote/', [1], format='json').status_code, 400)
+
+
+# -------------------- Menu Import / Export --------------------
+class MenuImportTests(FoodappTestCase):
+    HEADER = 'name,price,cuisine_type,category,is_available\n'
+
+    def setUp(self):
+        super().setUp()
+        self.restaurant = make_restaurant()
+        FoodCategory.objects.create(name='Main')
+
+    def load(self, text, fmt='csv'):
+        return menu_io.import_menu(self.restaurant, io.StringIO(text), fmt)
+
+    def test_blank_flags_take_the_model_default(self):
+        report = self.load(self.HEADER + 'Kacchi,250,bengali,main,\nFuchka,60,bengali,main,no\n')
+        self.assertEqual((report['created'], report['errors']), (2, []))
+        availability_by_name = dict(MenuItem.objects.values_list('name', 'is_available'))
+        self.assertEqual(availability_by_name, {'Kacchi': True, 'Fuchka': False})
+
+    def test_rows_update_items_by_name(self):
+        item = make_item(self.restaurant, name='Kacchi', price='250.00')
+        report = self.load(self.HEADER + 'Kacchi,275,bengali,main,\n')
+        self.assertEqual((report['created'], report['updated']), (0, 1))
+        item.refresh_from_db()
+        self.assertEqual((item.price, item.is_available), (Decimal('275.00'), True))
+
+    def test_an_invalid_row_rolls_the_import_back(self):
+        report = self.load(self.HEADER + 'Kacchi,250,bengali,main,yes\nFuchka,cheap,bengali,main,yes\n')
+        self.assertEqual(report['errors'], [{'line': 3, 'error': 'price must be a number'}])
+        self.assertFalse(MenuItem.objects.exists())
+
+    def test_export_round_trips(self):
+        make_item(self.restaurant, name='Kacchi', set_items=['Rice', 'Mutton'])
+        make_item(self.restaurant, name='Fuchka', price='60.00', is_available=False)
+        for fmt in menu_io.FORMATS:
+            exported = ''.join(menu_io.export_menu(self.restaurant, fmt))
+            report = self.load(exported, fmt)
+            self.assertEqual((report['created'], report['updated'], report['errors']), (0, 2, []))
+        self.assertEqual(MenuItem.objects.get(name='Kacchi').set_items, ['Rice', 'Mutton'])
+        self.assertFalse(MenuItem.objects.get(name='Fuchka').is_available)
+
+
+# -------------------- Order Export --------------------
+class OrderExportTests(FoodappTestCase):
+    def test_admins_stream_filtered_orders(self):
+        restaurant = make_restaurant()
+        delivered = make_order(restaurant, status='delivered')
+        make_order(restaurant, status='cancelled')
+
+        response = self.client.get('/api/admin/orders/export/', {'admin_name': 'Nabil', 'status': 'delivered'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['order_id'] for line in lines], [delivered.id])
+
+    def test_export_needs_an_admin(self):
+        self.assertEqual(self.client.get('/api/admin/orders/export/').status_code, 401)
+
+
+# -------------------- Rollups and Time Series --------------------
+class RollupTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        self.restaurant = make_restaurant()
+
+    def buckets(self):
+        return {
+            (row.status, row.order_count, row.revenue, row.item_count)
+            for row in DailyOrderRollup.objects.filter(restaurant=self.restaurant).exclude(order_count=0)
+        }
+
+    def test_order_writes_move_counts_between_buckets(self):
+        order = make_order(self.restaurant, total='300.00')
+        OrderItem.objects.create(order=order, menu_item=make_item(self.restaurant), quantity=3, price=100)
+        self.assertEqual(self.buckets(), {('confirmed', 1, Decimal('300.00'), 3)})
+
+        order.status = 'delivered'
+        order.save()
+        self.assertEqual(self.buckets(), {('delivered', 1, Decimal('300.00'), 3)})
+
+        order.delete()
+        self.assertEqual(self.buckets(), set())
+
+    def test_rebuild_matches_incremental_counts(self):
+        for total in ('100.00', '250.00'):
+            make_order(self.restaurant, total=total)
+        incremental = self.buckets()
+        DailyOrderRollup.objects.all().delete()
+        rollups.rebuild()
+        self.assertEqual(self.buckets(), incremental)
+
+    def test_series_end_is_exclusive(self):
+        monday = date(2025, 1, 6)
+        for day in (monday, monday + timedelta(days=1)):
+            order = make_order(self.restaurant)
+            Order.objects.filter(id=order.id).update(created_at=at_local(day))
+        rollups.rebuild()
+
+        # A date `to` arrives as the next day's midnight
+        start, end = at_local(monday, 0), at_local(monday + timedelta(days=1), 0)
+        for bucket in ('day', 'week', 'hour'):
+            points = analytics.timeseries('orders', bucket, start, end)
+            self.assertEqual(sum(point['value'] for point in points), 1, bucket)
+        self.assertEqual(len(analytics.timeseries('orders', 'day', start, end)), 1)
+
+    def test_timeseries_endpoint_validates_its_input(self):
+        url = '/api/admin/timeseries/'
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.assertEqual(self.client.get(url, {'admin_name': 'Nabil', 'bucket': 'year'}).status_code, 400)
+        response = self.client.get(url, {'admin_name': 'Nabil', 'from': '2025-01-06', 'to': '2025-01-06'})
+        self.assertEqual(len(response.data['points']), 1)
+
+
+# -------------------- Leaderboards and Recommendations --------------------
+class LeaderboardTests(FoodappTestCase):
+    def test_boards_rank_restaurants_and_follow_new_orders(self):
+        small, big = make_restaurant(name='Small'), make_restaurant(name='Big')
+        make_order(small, total='100.00')
+        make_order(big, total='900.00')
+        self.assertEqual([entry['id'] for entry in leaderboards.top('revenue')], [big.id, small.id])
+
+        make_order(small, total='1000.00')
+        self.assertEqual([entry['id'] for entry in leaderboards.top('revenue')], [small.id, big.id])
+
+    def test_snapshot_survives_the_default_cache(self):
+        leaderboards.rebuild()
+        caches['default'].clear()
+        self.assertIsNotNone(caches['durable'].get(leaderboards.SNAPSHOT_CACHE_KEY))
+
+
+class RecommendationTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        self.restaurant = make_restaurant()
+        self.kacchi, self.borhani, self.fuchka = (
+            make_item(self.restaurant, name=name) for name in ('Kacchi', 'Borhani', 'Fuchka')
+        )
+
+    def order(self, *items, age=timedelta(minutes=5)):
+        order = make_order(self.restaurant)
+        for item in items:
+            OrderItem.objects.create(order=order, menu_item=item, quantity=1, price=item.price)
+        Order.objects.filter(id=order.id).update(created_at=timezone.now() - age)
+
+    def test_items_ordered_together_are_recommended(self):
+        self.order(self.kacchi, self.borhani)
+        self.order(self.kacchi, self.borhani)
+        self.order(self.kacchi, self.fuchka)
+        self.assertEqual(recommendations.build()['orders'], 3)
+        recommended = recommendations.recommend(self.restaurant.id, [self.kacchi.id])
+        self.assertEqual([item['menu_item_id'] for item in recommended], [self.borhani.id, self.fuchka.id])
+
+    def test_recent_orders_wait_for_the_next_build(self):
+        self.order(self.kacchi, self.borhani, age=timedelta(0))
+        self.assertEqual(recommendations.build()['orders'], 0)
+        self.assertEqual(recommendations.recommend(self.restaurant.id, [self.kacchi.id]), [])
+
+
+# -------------------- Personalized Feed --------------------
+class FeedTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dhanmondi = make_restaurant(name='Dhanmondi Grill', cuisines=['Bengali'])
+        self.gulshan = make_restaurant(name='Gulshan Wok', area='Gulshan', cuisines=['Chinese'],
+                                       latitude=Decimal('23.790000'), longitude=Decimal('90.415000'))
+        self.user = UserProfile.objects.create(email='rahim@example.com')
+
+    def ranked(self, user_id=None):
+        return [card['id'] for card in feed.build_feed(user_id)]
+
+    def test_anonymous_feed_ranks_by_rating(self):
+        Restaurant.objects.filter(id=self.gulshan.id).update(average_rating=Decimal('4.50'))
+        self.assertEqual(self.ranked(), [self.gulshan.id, self.dhanmondi.id])
+
+    def test_preferences_reorder_the_feed(self):
+        self.assertEqual(self.ranked(self.user.id), [self.dhanmondi.id, self.gulshan.id])
+        self.user.preferred_areas = ['Gulshan']
+        self.user.save()
+        feed.invalidate(self.user.id)  # as the profile update view does
+        self.assertEqual(self.ranked(self.user.id), [self.gulshan.id, self.dhanmondi.id])
+
+    def test_proximity_is_measured_from_the_institution(self):
+        institution = Institution.objects.create(name='NSU', type='university', area='Bashundhara',
+                                                 latitude=Decimal('23.815000'), longitude=Decimal('90.425000'))
+        self.user.institution = institution
+        self.user.save()
+        scores = {card['id']: card['feed_score'] for card in feed.build_feed(self.user.id)}
+        self.assertGreater(scores[self.gulshan.id], scores[self.dhanmondi.id])
+
+    def test_cuisine_affinity_comes_from_the_precomputed_features(self):
+        order = make_order(self.gulshan, user=self.user)
+        OrderItem.objects.create(order=order, menu_item=make_item(self.gulshan, cuisine_type='chinese'),
+                                 quantity=2, price=100)
+        Restaurant.objects.filter(id=self.dhanmondi.id).update(average_rating=Decimal('1.00'))
+        feed.rebuild_user_features()
+        self.assertEqual(feed.get_user_cuisines()[self.user.id], {'chinese': 1.0})
+        self.assertEqual(self.ranked(self.user.id), [self.gulshan.id, self.dhanmondi.id])
+
+        # Once warm, a request is a profile lookup plus scoring: no queries at all
+        feed.invalidate(self.user.id)
+        with self.assertNumQueries(0):
+            feed.build_feed(self.user.id)
+
+    def test_stale_user_features_queue_a_rebuild(self):
+        feed.rebuild_user_features()
+        snapshot = caches['durable'].get(feed.USER_FEATURES_CACHE_KEY)
+        snapshot['generated_at'] -= timedelta(seconds=feed.USER_FEATURES_REBUILD_SECONDS + 1)
+        caches['durable'].set(feed.USER_FEATURES_CACHE_KEY, snapshot, None)
+        feed._user_state['checked_at'] = 0
+        feed.get_user_cuisines()
+        self.assertTrue(Job.objects.filter(task='refresh_feed_features', status='queued').exists())
+
+    def test_feed_endpoint(self):
+        response = self.client.get('/api/feed/', {'user_id': self.user.id, 'limit': 1, 'fields': 'id,feed_score'})
+        self.assertEqual(response.data['user_id'], self.user.id)
+        self.assertEqual([set(card) for card in response.data['restaurants']], [{'id', 'feed_score'}])
+        self.assertEqual(self.client.get('/api/feed/', {'user_id': 999999}).status_code, 404)
+        self.assertEqual(self.client.get('/api/feed/', {'limit': 'x'}).status_code, 400)
+
+
+# -------------------- Menu Best Sellers --------------------
+class BestsellerTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        self.restaurant = make_restaurant()
+        self.kacchi, self.borhani, self.fuchka = (
+            make_item(self.restaurant, name=name) for name in ('Kacchi', 'Borhani', 'Fuchka')
+        )
+
+    def sell(self, item, quantity, days_ago=0):
+        order = make_order(self.restaurant)
+        Order.objects.filter(id=order.id).update(created_at=timezone.now() - timedelta(days=days_ago))
+        order.refresh_from_db()
+        OrderItem.objects.create(order=order, menu_item=item, quantity=quantity, price=item.price)
+
+    def test_popular_sort_ranks_the_menu(self):
+        self.sell(self.borhani, 5)
+        self.sell(self.kacchi, 2)
+        url = f'/api/restaurants/{self.restaurant.id}/menu/'
+
+        items = self.client.get(url, {'sort': 'popular'}).data['menu_items']
+        self.assertEqual([(item['name'], item['popular_rank']) for item in items],
+                         [('Borhani', 1), ('Kacchi', 2), ('Fuchka', None)])
+        unsorted = self.client.get(url, {'window': '30'}).data['menu_items']
+        self.assertEqual([item['name'] for item in unsorted], ['Kacchi', 'Borhani', 'Fuchka'])
+        self.assertEqual(self.client.get(url, {'window': '14'}).status_code, 400)
+
+    def test_windows_cover_whole_local_days(self):
+        self.sell(self.kacchi, 1, days_ago=6)  # the oldest day of the 7-day window
+        self.sell(self.borhani, 1, days_ago=7)
+        self.sell(self.fuchka, 1, days_ago=30)  # outside both windows, never recorded
+        self.assertEqual(bestsellers.ranking(self.restaurant.id, 7), {self.kacchi.id: 1})
+        self.assertEqual(set(bestsellers.ranking(self.restaurant.id, 30)), {self.kacchi.id, self.borhani.id})
+        self.assertFalse(DailyItemSales.objects.filter(menu_item=self.fuchka).exists())
+
+    def test_sweeper_prunes_days_outside_every_window(self):
+        self.sell(self.kacchi, 1, days_ago=29)
+        DailyItemSales.objects.create(restaurant=self.restaurant, menu_item=self.borhani,
+                                      day=rollups.recent_day(30), quantity=3)
+        self.assertEqual(sweeper.sweep()['item_sales'], 1)
+        self.assertEqual(list(DailyItemSales.objects.values_list('menu_item_id', flat=True)), [self.kacchi.id])
+
+    def test_rebuild_repairs_drift(self):
+        self.sell(self.kacchi, 1)
+        self.sell(self.borhani, 2)
+        self.assertEqual(bestsellers.ranking(self.restaurant.id)[self.borhani.id], 1)
+
+        # .update() skips the signals, like a bulk correction made in SQL
+        DailyItemSales.objects.filter(menu_item=self.kacchi).update(quantity=9)
+        self.assertEqual(bestsellers.ranking(self.restaurant.id)[self.borhani.id], 1)  # cached
+        bestsellers.rebuild()
+        self.assertEqual(bestsellers.ranking(self.restaurant.id), {self.borhani.id: 1, self.kacchi.id: 2})
+        self.assertEqual(DailyItemSales.objects.get(menu_item=self.kacchi).quantity, 1)
+
+
+# -------------------- Session Tokens --------------------
+class SessionTokenTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        self.restaurant = make_restaurant()
+        self.item = make_item(self.restaurant)
+        self.cart = {'restaurant_id': self.restaurant.id, 'payment_method': 'cash',
+                     'items': [{'menu_item_id': self.item.id, 'quantity': 1}]}
+
+    def test_login_token_identifies_the_user(self):
+        token = self.client.post('/api/auth/login/', {'email': 'rahim@example.com'}, format='json').data['token']
+        user = UserProfile.objects.get(email='rahim@example.com')
+        make_order(self.restaurant, user=user)
+
+        response = self.client.get('/api/orders/history/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.data['total_orders'], 1)
+        response = self.client.get('/api/orders/history/', HTTP_AUTHORIZATION=f'Bearer {token}x')
+        self.assertEqual(response.status_code, 401)
+
+    def test_writes_need_the_token_rather_than_a_user_id(self):
+        token = self.client.post('/api/auth/login/', {'email': 'rahim@example.com'}, format='json').data['token']
+        user = UserProfile.objects.get(email='rahim@example.com')
+
+        response = self.client.post('/api/orders/', {**self.cart, 'user_id': user.id}, format='json')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Order.objects.exists())
+
+        response = self.client.post('/api/orders/', self.cart, format='json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get().user, user)
+
+    def test_guests_get_a_row_only_once_they_order(self):
+        guest = self.client.post('/api/auth/guest/').data
+        self.assertIsNone(guest['guest_id'])
+        self.assertFalse(GuestSession.objects.exists())
+
+        headers = {'HTTP_X_GUEST_TOKEN': guest['guest_token']}
+        self.assertEqual(self.client.post('/api/orders/', self.cart, format='json', **headers).status_code, 200)
+        self.assertTrue(GuestSession.objects.filter(session_id=guest['session_id']).exists())
+        self.assertEqual(self.client.get('/api/orders/history/', **headers).data['total_orders'], 1)
+
+    def test_guest_checkout_passes_cors_from_the_frontend(self):
+        origin = 'http://localhost:3000'
+        preflight = self.client.options(
+            '/api/orders/', HTTP_ORIGIN=origin, HTTP_ACCESS_CONTROL_REQUEST_METHOD='POST',
+            HTTP_ACCESS_CONTROL_REQUEST_HEADERS='content-type,x-guest-token,idempotency-key'
+        )
+        allowed = preflight['Access-Control-Allow-Headers'].split(', ')
+        self.assertTrue({'x-guest-token', 'idempotency-key', 'x-session-token'} <= set(allowed))
+
+        token = self.client.post('/api/auth/guest/').data['guest_token']
+        response = self.client.post('/api/orders/', self.cart, format='json', HTTP_ORIGIN=origin,
+                                    HTTP_X_GUEST_TOKEN=token, HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Access-Control-Allow-Origin'], origin)
+        self.assertIn('Idempotent-Replayed', response['Access-Control-Expose-Headers'])
+
+    def test_legacy_guest_ids_are_validated(self):
+        response = self.client.get('/api/orders/history/', {'guest_id': 'null'})
+        self.assertEqual(response.status_code, 400)
+
+
+# -------------------- Admission Control --------------------
+class RateLimitTests(FoodappTestCase):
+    @override_settings(RATE_LIMIT={'ENABLED': True, 'CLIENT': (0.01, 2), 'GLOBAL': (100, 100)})
+    def test_clients_over_their_burst_are_told_to_retry(self):
+        client = APIClient()
+        statuses = [client.get('/api/institutions/').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertGreaterEqual(int(client.get('/api/institutions/')['Retry-After']), 1)
+        self.assertEqual(client.get('/api/health/').status_code, 200)  # exempt
+
+    @override_settings(RATE_LIMIT={'ENABLED': True, 'CLIENT': (0.01, 2), 'GLOBAL': (100, 100)})
+    def test_limits_are_shared_by_every_worker(self):
+        # Each client builds its own middleware, like a separate worker process
+        workers = [APIClient() for _ in range(3)]
+        statuses = [worker.get('/api/institutions/').status_code for worker in workers]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_write_slots_do_not_leak_on_the_file_cache(self):
+        file_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': self.temp_dir()}
+        with override_settings(CACHES={**TEST_CACHES, 'default': file_cache}):
+            backend = ratelimit.CacheBackend(ratelimit.get_config())
+            self.assertFalse(backend.atomic)
+
+            def work():
+                for _ in range(20):
+                    if backend.acquire('writes', 100):
+                        backend.release('writes')
+
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(backend.cache.get('ratelimit:slots:writes'), 0)
+
+
+# -------------------- Idempotency Keys --------------------
+class IdempotencyTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        self.restaurant = make_restaurant()
+        self.item = make_item(self.restaurant)
+        self.cart = {'restaurant_id': self.restaurant.id, 'payment_method': 'cash',
+                     'items': [{'menu_item_id': self.item.id, 'quantity': 1}]}
+
+    def post(self, data, key='order-1', **headers):
+        return self.client.post('/api/orders/', data, format='json', HTTP_IDEMPOTENCY_KEY=key, **headers)
+
+    def test_retries_replay_the_first_response(self):
+        first, second = self.post(self.cart), self.post(self.cart)
+        self.assertEqual(first.data['order_id'], second.data['order_id'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_a_key_reused_for_another_request_is_rejected(self):
+        self.post(self.cart)
+        other = {**self.cart, 'items': [{'menu_item_id': self.item.id, 'quantity': 2}]}
+        self.assertEqual(self.post(other).status_code, 422)
+
+    def test_keys_are_per_caller(self):
+        for _ in range(2):
+            token = self.client.post('/api/auth/guest/').data['guest_token']
+            self.post(self.cart, HTTP_X_GUEST_TOKEN=token)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_body_identities_are_scoped_apart(self):
+        guests = [GuestSession.objects.create(session_id=f'legacy-{i}') for i in range(2)]
+        responses = [self.post({**self.cart, 'guest_id': guest.id}) for guest in guests]
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        self.assertFalse(responses[1].has_header('Idempotent-Replayed'))
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_a_result_stored_while_waiting_for_the_lock_is_replayed(self):
+        first = self.post(self.cart)
+        real_get = idempotency.cache.get
+        reads = []
+
+        def get(key, *args, **kwargs):
+            # The waiter's first read predates the original's result
+            reads.append(key)
+            return None if len(reads) == 1 else real_get(key, *args, **kwargs)
+
+        with mock.patch.object(idempotency.cache, 'get', get):
+            retry = self.post(self.cart)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['order_id'], first.data['order_id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failures_are_not_replayed(self):
+        self.assertEqual(self.post({**self.cart, 'restaurant_id': 999999}).status_code, 404)
+        self.assertEqual(self.post(self.cart).status_code, 200)
+
+    def test_only_one_caller_takes_a_lock(self):
+        barrier = threading.Barrier(8)
+        results = []
+
+        def contend():
+            barrier.wait()
+            results.append(locks.try_lock('contended', 60))
+
+        threads = [threading.Thread(target=contend) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 1)
+
+        locks.unlock('contended')
+        self.assertTrue(locks.try_lock('contended', 60))
+
+    def test_abandoned_locks_expire(self):
+        self.assertTrue(locks.try_lock('abandoned', 60))
+        stale = timezone.now().timestamp() - 120
+        os.utime(locks._path('abandoned'), (stale, stale))
+        self.assertFalse(locks.try_lock('abandoned', 60))  # clears it for the next attempt
+        self.assertTrue(locks.try_lock('abandoned', 60))
+
+
+# -------------------- Single-Flight --------------------
+class SingleFlightTests(FoodappTestCase):
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.wait(1)
+            return {'value': 42}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(singleflight.get_or_compute('key', compute)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        started.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'value': 42}] * 5)
+
+    def test_expired_values_are_served_while_one_refresh_runs(self):
+        values = iter([1, 2])
+        compute = lambda: next(values)
+        self.assertEqual(singleflight.get_or_compute('key', compute, groups=('g',)), 1)
+        singleflight.expire('g')
+        self.assertEqual(singleflight.get_or_compute('key', compute, groups=('g',)), 1)
+
+        deadline = timezone.now() + timedelta(seconds=2)
+        while singleflight.get_or_compute('key', compute, groups=('g',)) != 2:
+            self.assertLess(timezone.now(), deadline, 'background refresh never landed')
+
+
+# -------------------- Payments --------------------
+class CircuitBreakerTests(TestCase):
+    def test_opens_after_repeated_failures_and_lets_one_trial_through(self):
+        breaker = payments.CircuitBreaker(threshold=2, reset_seconds=0)
+        breaker.reset_seconds = 60
+        breaker.failure()
+        self.assertEqual(breaker.state, 'closed')
+        breaker.failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+
+        breaker.opened_at -= 60
+        self.assertTrue(breaker.allow())  # the trial call
+        self.assertFalse(breaker.allow())
+        breaker.failure()
+        self.assertEqual(breaker.state, 'open')
+
+        breaker.opened_at -= 60
+        self.assertTrue(breaker.allow())
+        breaker.success()
+        self.assertEqual(breaker.state, 'closed')
+
+
+class PaymentTests(FoodappTestCase):
+    ACCOUNT = {'phone': '01712345678', 'pin': '1234'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.gateway = mock_gateway.make_server(port=0, faults={'latency': 0})
+        threading.Thread(target=cls.gateway.serve_forever, daemon=True).start()
+        host, port = cls.gateway.server_address
+        cls.gateway_settings = override_settings(PAYMENT_GATEWAYS={
+            provider: {'BASE_URL': f'http://{host}:{port}/{provider}', 'TIMEOUT': 2, 'HEDGE_AFTER': 1}
+            for provider in payments.PROVIDERS
+        })
+        cls.gateway_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gateway_settings.disable()
+        cls.gateway.shutdown()
+        cls.gateway.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.patch(payments, '_gateways', {})
+        self.order = make_order(make_restaurant(), payment_method='bkash')
+
+    def pay(self, account, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(f'/api/orders/{self.order.id}/pay/', account, format='json', **headers)
+
+    def test_payment_marks_the_order_paid(self):
+        response = self.pay(self.ACCOUNT)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['transaction_id'].startswith('BKASH'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'paid')
+
+    def test_declined_payment_can_be_retried(self):
+        self.assertEqual(self.pay({**self.ACCOUNT, 'pin': '0000'}).status_code, 402)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'failed')
+        self.assertEqual(self.pay(self.ACCOUNT).status_code, 200)
+
+    def test_card_details_are_validated_before_any_charge(self):
+        calls = self.gateway.gateway.stats()['calls']['bkash']
+        self.assertEqual(self.pay({'phone': '123', 'pin': '1234'}).status_code, 400)
+        self.assertEqual(self.gateway.gateway.stats()['calls']['bkash'], calls)
+
+    def test_idempotency_fingerprint_leaves_out_the_pin(self):
+        first = self.pay(self.ACCOUNT, key='pay-1')
+        retry = self.pay({**self.ACCOUNT, 'pin': '9999'}, key='pay-1')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data, first.data)
+
+    @override_settings(PAYMENT_GATEWAYS={'bkash': {'BASE_URL': 'http://127.0.0.1:9/bkash', 'TIMEOUT': 1,
+                                                   'MAX_ATTEMPTS': 1}})
+    def test_unreachable_gateway_leaves_the_order_pending_and_reconciles_later(self):
+        response = self.pay(self.ACCOUNT)
+        self.assertEqual(response.status_code, 503)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'pending')
+        self.assertTrue(Job.objects.filter(task='reconcile_payment', status='queued').exists())
+
+
+# -------------------- Response Compression --------------------
+class CompressionTests(FoodappTestCase):
+    def test_large_json_is_gzipped(self):
+        for i in range(10):
+            make_restaurant(name=f'Restaurant {i}')
+        response = self.client.get('/api/restaurants/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 10)
+
+    def test_event_streams_are_left_uncompressed(self):
+        restaurant = make_restaurant()
+        response = self.client.get(f'/api/restaurants/{restaurant.id}/seats/live/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertTrue(next(iter(response.streaming_content)).startswith(b'event: snapshot'))
+        response.close()
+
+
+# -------------------- Sparse Fieldsets and Batches --------------------
+class FieldsetTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        self.restaurant = make_restaurant()
+
+    def test_fields_and_presets_select_the_response_keys(self):
+        url = f'/api/restaurants/{self.restaurant.id}/'
+        self.assertEqual(set(self.client.get(url, {'fields': 'id,name'}).data), {'id', 'name'})
+        card = RestaurantSerializer.Meta.presets['card']
+        self.assertEqual(set(self.client.get(url, {'fields': 'card', 'exclude': 'logo'}).data), set(card) - {'logo'})
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(f'/api/restaurants/{self.restaurant.id}/', {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Unknown field(s): secret'})
+
+    def test_selection_limits_the_columns_read(self):
+        self.assertEqual(fieldsets.columns(RestaurantSerializer, {'name', 'area'}), {'id', 'name', 'area'})
+
+    def test_history_seats_and_leaderboards_take_fieldsets(self):
+        user = UserProfile.objects.create(email='rahim@example.com', name='Rahim')
+        order = make_order(self.restaurant, user=user)
+        url = '/api/user/history/'
+        response = self.client.get(url, {'user_id': user.id, 'order_fields': 'id,status'})
+        self.assertEqual(response.data['orders'], [{'id': order.id, 'status': 'confirmed'}])
+        self.assertEqual(self.client.get(url, {'user_id': user.id, 'review_fields': 'x'}).status_code, 400)
+
+        response = self.client.get(f'/api/restaurants/{self.restaurant.id}/seats/', {'fields': 'id,name'})
+        self.assertEqual(response.data['restaurant'], {'id': self.restaurant.id, 'name': 'Kacchi Bhai'})
+
+        Restaurant.objects.filter(id=self.restaurant.id).update(average_rating=Decimal('4.5'))
+        response = self.client.get('/api/restaurants/leaderboards/', {'fields': 'id,rank'})
+        self.assertEqual(response.data['restaurants'], [{'id': self.restaurant.id, 'rank': 1}])
+
+
+class BatchTests(FoodappTestCase):
+    def test_one_response_for_many_restaurants(self):
+        first, second = make_restaurant(name='First'), make_restaurant(name='Second')
+        available = make_item(first, name='Kacchi')
+        make_item(first, name='Sold out', is_available=False)
+        Seat.objects.create(restaurant=second, code='A1', x_position=0, y_position=0)
+
+        response = self.client.get('/api/restaurants/batch/', {
+            'ids': f'{first.id},{second.id},999999', 'fields': 'id,name', 'menu_fields': 'id',
+        })
+        data = response.json()
+        self.assertEqual(data['not_found'], [999999])
+        self.assertEqual(data['restaurants'][str(first.id)], {'id': first.id, 'name': 'First'})
+        self.assertEqual(data['menus'][str(first.id)], [{'id': available.id}])
+        self.assertEqual([seat['code'] for seat in data['seats'][str(second.id)]['seats']], ['A1'])
+
+    def test_request_size_and_resources_are_checked(self):
+        url = '/api/restaurants/batch/'
+        self.assertEqual(self.client.get(url, {'ids': 'a'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': '1', 'include': 'reviews'}).status_code, 400)
+        too_many = ','.join(str(i) for i in range(1, 100))
+        self.assertEqual(self.client.get(url, {'ids': too_many}).status_code, 400)
+
+
+# -------------------- Branding Assets --------------------
+class AssetTests(FoodappTestCase):
+    PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 32
+
+    def setUp(self):
+        super().setUp()
+        self.patch(assets, 'ROOT', self.temp_dir())
+
+    def test_assets_are_stored_once_by_content(self):
+        digest = assets.put(self.PNG)
+        self.assertEqual(assets.put(self.PNG), digest)
+        self.assertEqual(assets.read(digest), self.PNG)
+        with self.assertRaises(assets.AssetError):
+            assets.put(b'#!/bin/sh')
+
+    def test_assets_are_served_for_good(self):
+        digest = assets.put(self.PNG)
+        response = self.client.get(f'/api/assets/{digest}/')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get(f'/api/assets/{digest}/', HTTP_IF_NONE_MATCH=f'"{digest}"').status_code, 304)
+        self.assertEqual(self.client.get(f'/api/assets/{"0" * 64}/').status_code, 404)
+
+    def test_inline_svg_logos_move_to_the_store(self):
+        restaurant = make_restaurant(logo='<svg xmlns="http://www.w3.org/2000/svg"></svg>')
+        self.assertTrue(assets.is_digest(restaurant.logo_asset))
+        self.assertFalse(assets.is_inline_svg(restaurant.logo))
+
+
+# -------------------- Availability Search --------------------
+class AvailabilityTests(FoodappTestCase):
+    def setUp(self):
+        super().setUp()
+        self.restaurant = make_restaurant(capacity=4)
+        self.start = at_local(timezone.localdate() + timedelta(days=1))  # clear of the midnight close
+        self.end = self.start + timedelta(hours=2)
+
+    def book(self, seats, start=None, end=None):
+        return Booking.objects.create(
+            restaurant=self.restaurant, start_time=start or self.start, end_time=end or self.end,
+            status='confirmed', seat_codes=[f'G{i}' for i in range(seats)]
+        )
+
+    def search(self, party_size, **kwargs):
+        return availability.search(party_size, self.start, self.end, **kwargs)
+
+    def test_bookings_use_up_capacity(self):
+        self.assertEqual(self.search(2)[0][0]['free_seats'], 4)
+        self.book(3)
+        self.assertEqual(self.search(1)[0][0]['free_seats'], 1)
+        self.assertEqual(self.search(2)[0], [])
+
+    def test_back_to_back_bookings_do_not_overlap(self):
+        self.book(4, start=self.end, end=self.end + timedelta(hours=1))
+        self.book(4, start=self.start - timedelta(hours=1), end=self.start)
+        self.assertEqual(self.search(4)[0][0]['free_seats'], 4)
+
+    def test_full_restaurants_offer_nearby_slots(self):
+        self.book(4, end=self.start + timedelta(hours=1))
+        available, elsewhere = self.search(2, alternatives=True)
+        self.assertEqual(available, [])
+        starts = [slot['start'] - self.start for slot in elsewhere[0]['slots']]
+        self.assertEqual(starts, [timedelta(hours=-2), timedelta(hours=1), timedelta(hours=1.5)])
+
+    def test_generation_never_repeats_after_the_key_is_lost(self):
+        for _ in range(2):
+            cache.delete(availability.GENERATION_KEY)  # evicted or expired
+            availability.invalidate()
+            index = availability.get_index()
+        cache.delete(availability.GENERATION_KEY)
+        availability.invalidate()
+        self.assertIsNot(availability.get_index(), index)
+
+    def test_search_endpoint_validates_the_window(self):
+        url = '/api/availability/search/'
+        self.assertEqual(self.client.get(url, {'party_size': 2}).status_code, 400)
+        past = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.client.get(url, {'party_size': 2, 'start': past}).status_code, 400)
+        response = self.client.get(url, {'party_size': 2, 'start': self.start.isoformat()})
+        self.assertEqual([item['id'] for item in response.data['restaurants']], [self.restaurant.id])
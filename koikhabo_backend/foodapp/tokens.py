@@ -0,0 +1,59 @@
+# Signed, expiring session tokens. They carry the user id, so resolving a
+# request needs no session table and no database lookup.
+
+from django.conf import settings
+from django.core import signing
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+USER_SALT = 'foodapp.session.user'
+GUEST_SALT = 'foodapp.session.guest'
+MAX_AGE = getattr(settings, 'SESSION_TOKEN_MAX_AGE', 60 * 60 * 24 * 30)
+GUEST_MAX_AGE = getattr(settings, 'GUEST_TOKEN_MAX_AGE', 60 * 60 * 24 * 90)
+
+
+class InvalidToken(APIException):
+    """Raised from views; DRF turns it into a 401 with the usual error body"""
+    status_code = status.HTTP_401_UNAUTHORIZED
+
+    def __init__(self, message='Invalid or expired session token'):
+        super().__init__(detail={'error': message})
+
+
+def issue_user_token(user_id):
+    return signing.dumps({'u': user_id}, salt=USER_SALT, compress=True)
+
+
+def read_user_token(token):
+    try:
+        payload = signing.loads(token, salt=USER_SALT, max_age=MAX_AGE)
+    except signing.SignatureExpired:
+        raise InvalidToken('Session expired, please log in again')
+    except signing.BadSignature:
+        raise InvalidToken()
+    return payload['u']
+
+
+def issue_guest_token(session_id):
+    """Guest identity without a GuestSession row; the row is created on first order or booking"""
+    return signing.dumps({'g': session_id}, salt=GUEST_SALT, compress=True)
+
+
+def read_guest_token(token):
+    try:
+        payload = signing.loads(token, salt=GUEST_SALT, max_age=GUEST_MAX_AGE)
+    except signing.BadSignature:  # includes SignatureExpired
+        raise InvalidToken('Invalid or expired guest token')
+    return payload['g']
+
+
+def token_from_request(request):
+    """`Authorization: Bearer <token>` or an `X-Session-Token` header"""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):].strip() or None
+    return request.META.get('HTTP_X_SESSION_TOKEN') or None
+
+
+def guest_token_from_request(request):
+    return request.META.get('HTTP_X_GUEST_TOKEN') or None
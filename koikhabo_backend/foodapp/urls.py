@@ -19,23 +19,41 @@ urlpatterns = [
     
     # Restaurants
     path('restaurants/', views.restaurants_list, name='restaurants-list'),
+    path('restaurants/leaderboards/', views.restaurant_leaderboards, name='restaurant-leaderboards'),
+    path('restaurants/batch/', views.restaurants_batch, name='restaurants-batch'),
+    path('feed/', views.restaurant_feed, name='restaurant-feed'),
     path('restaurants/<int:restaurant_id>/', views.restaurant_detail, name='restaurant-detail'),
     path('restaurants/<int:restaurant_id>/menu/', views.restaurant_menu, name='restaurant-menu'),
+    path('restaurants/<int:restaurant_id>/menu/import/', views.restaurant_menu_import, name='restaurant-menu-import'),
+    path('restaurants/<int:restaurant_id>/menu/export/', views.restaurant_menu_export, name='restaurant-menu-export'),
+    path('restaurants/<int:restaurant_id>/menu/recommendations/', views.restaurant_menu_recommendations, name='restaurant-menu-recommendations'),
+    path('restaurants/<int:restaurant_id>/branding/', views.restaurant_branding, name='restaurant-branding'),
+    path('assets/<str:digest>/', views.asset, name='asset'),
     path('restaurants/<int:restaurant_id>/seats/', views.restaurant_seats, name='restaurant-seats'),
+    path('restaurants/<int:restaurant_id>/seats/layout/', views.restaurant_seat_layout, name='restaurant-seat-layout'),
+    path('restaurants/<int:restaurant_id>/seats/occupancy/', views.restaurant_seat_occupancy, name='restaurant-seat-occupancy'),
+    path('restaurants/<int:restaurant_id>/seats/live/', views.restaurant_seats_live, name='restaurant-seats-live'),
     
     # Bookings
     path('restaurants/<int:restaurant_id>/book/', views.create_booking, name='create-booking'),
     path('bookings/', views.user_bookings, name='user-bookings'),
+    path('availability/search/', views.availability_search, name='availability-search'),
+    
+    # Cart
+    path('cart/quote/', views.cart_quote, name='cart-quote'),
     
     # Orders
     path('orders/', views.create_order, name='create-order'),
     path('orders/history/', views.order_history, name='order-history'),
     path('orders/<int:order_id>/', views.order_status, name='order-status'),
     path('orders/<int:order_id>/review/', views.create_review, name='create-review'),
+    path('orders/<int:order_id>/pay/', views.pay_order, name='pay-order'),
     
     # Payment validation
     path('payment/validate/', views.validate_payment, name='validate-payment'),
     
     # Admin
     path('admin/dashboard/', views.admin_dashboard, name='admin-dashboard'),
+    path('admin/orders/export/', views.admin_orders_export, name='admin-orders-export'),
+    path('admin/timeseries/', views.admin_timeseries, name='admin-timeseries'),
 ]
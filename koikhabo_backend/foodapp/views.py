@@ -5,13 +5,18 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Q
 from django.conf import settings
+from django.core.cache import cache
 from datetime import datetime, timedelta, date
 import uuid
 import re
+import csv
 from .models import (
     Institution, UserProfile, GuestSession, Restaurant, Seat, MenuItem, 
     Discount, Booking, Order, OrderItem, Review, OccupiedSeat, RewardRedemption
@@ -21,6 +26,12 @@ from .serializers import (
     InstitutionSerializer, UserProfileSerializer, RestaurantSerializer, 
     MenuItemSerializer, BookingSerializer, OrderSerializer, ReviewSerializer
 )
+from .idempotency import idempotent
+from . import (
+    seatmap, jobs, tasks, pricing, menu_io, exports, rollups, analytics, leaderboards,
+    recommendations, feed, bestsellers, tokens, profiles, singleflight, payments, fieldsets, batch, assets,
+    availability,
+)
 
 # -------------------- Health Check --------------------
 @api_view(['GET'])
@@ -49,25 +60,59 @@ def user_login(request):
         user.name = full_name
         user.save()
 
-    return Response({
+    data = {
         'user_id': user.id,
         'email': user.email,
         'name': user.name,
         'reward_points': user.reward_points,
         'institution': user.institution.name if user.institution else None,
         'preferred_areas': user.preferred_areas,
-        'created': created
-    })
+        'created': created,
+        # Send back as "Authorization: Bearer <token>" instead of user_id
+        'token': tokens.issue_user_token(user.id),
+        'token_expires_in': tokens.MAX_AGE,
+    }
+    profiles.remember(user)
+    return Response(data)
+
+
+def _user_id(request):
+    """User id from the session token when one is sent.
+
+    Reads still accept the deprecated ?user_id= parameter; writes no longer
+    trust a bare user_id and need the token.
+    """
+    token = tokens.token_from_request(request)
+    if token:
+        return tokens.read_user_token(token)
+    if request.method != 'GET':
+        if request.data.get('user_id'):
+            raise tokens.InvalidToken('Log in again to continue')
+        return None
+    return request.GET.get('user_id')
+
+
+def _guest_session_id(request):
+    """Session id from an X-Guest-Token header, if one was sent"""
+    token = tokens.guest_token_from_request(request)
+    return tokens.read_guest_token(token) if token else None
+
+
+def _guest_row_id(session_id):
+    """Create the GuestSession row the first time a token guest orders or books"""
+    guest, _ = GuestSession.objects.get_or_create(session_id=session_id)
+    return guest.id
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def guest_session(request):
+    # Nothing is stored until the guest orders or books; see _guest_row_id()
     session_id = str(uuid.uuid4())
-    guest = GuestSession.objects.create(session_id=session_id)
-    
+
     return Response({
-        'session_id': guest.session_id,
-        'guest_id': guest.id
+        'session_id': session_id,
+        'guest_token': tokens.issue_guest_token(session_id),  # send as X-Guest-Token
+        'guest_id': None,
     })
 
 @api_view(['POST'])
@@ -108,13 +153,14 @@ def institutions_list(request):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def update_user_areas(request):
-    user_id = request.data.get('user_id')
+    user_id = _user_id(request)
     areas = request.data.get('areas', [])
     
     try:
         user = UserProfile.objects.get(id=user_id)
         user.preferred_areas = areas
         user.save()
+        feed.invalidate(user.id)
         return Response({'message': 'Areas updated successfully'})
     except UserProfile.DoesNotExist:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -122,23 +168,36 @@ def update_user_areas(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def user_history(request):
-    user_id = request.GET.get('user_id')
+    """The user's orders, bookings and reviews; ?order_fields=, ?booking_fields= and ?review_fields= trim them"""
+    user_id = _user_id(request)
+    order_fields, booking_fields, review_fields = _history_fields(request)
     
     try:
-        user = UserProfile.objects.get(id=user_id)
+        user = profiles.get_profile(user_id)
         orders = Order.objects.filter(user=user).order_by('-created_at')
         bookings = Booking.objects.filter(user=user).order_by('-created_at')
         reviews = Review.objects.filter(user=user).order_by('-created_at')
+        orders = fieldsets.restrict(orders, OrderSerializer, order_fields)
+        bookings = fieldsets.restrict(bookings, BookingSerializer, booking_fields)
+        reviews = fieldsets.restrict(reviews, ReviewSerializer, review_fields)
         
         return Response({
-            'orders': OrderSerializer(orders, many=True).data,
-            'bookings': BookingSerializer(bookings, many=True).data,
-            'reviews': ReviewSerializer(reviews, many=True).data,
+            'orders': OrderSerializer(orders, many=True, fields=order_fields).data,
+            'bookings': BookingSerializer(bookings, many=True, fields=booking_fields).data,
+            'reviews': ReviewSerializer(reviews, many=True, fields=review_fields).data,
             'reward_points': user.reward_points
         })
     except UserProfile.DoesNotExist:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
+def _history_fields(request):
+    """Selections for responses that list orders, bookings and reviews together"""
+    return (
+        fieldsets.select(request, OrderSerializer, prefix='order_'),
+        fieldsets.select(request, BookingSerializer, prefix='booking_'),
+        fieldsets.select(request, ReviewSerializer, prefix='review_'),
+    )
+
 # -------------------- Restaurant Management --------------------
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -152,135 +211,468 @@ def restaurants_list(request):
     has_private_room = request.GET.get('has_private_room')
     has_smoking = request.GET.get('has_smoking')
     has_prayer = request.GET.get('has_prayer')
+    selected = fieldsets.select(request, RestaurantSerializer)
 
-    # Log if location parameters were sent (for debugging)
-    if request.GET.get('latitude') or request.GET.get('longitude'):
-        print(f"🚫 LOCATION PARAMETERS IGNORED: lat={request.GET.get('latitude')}, lng={request.GET.get('longitude')}")
-
-    restaurants = Restaurant.objects.filter(is_open=True)
+    def build():
+        restaurants = Restaurant.objects.filter(is_open=True)
 
-    # Apply filters
-    if search:
-        restaurants = restaurants.filter(
-            Q(name__icontains=search) | Q(area__icontains=search)
-        )
+        # Apply filters
+        if search:
+            restaurants = restaurants.filter(
+                Q(name__icontains=search) | Q(area__icontains=search)
+            )
 
-    if cuisine_filter:
-        restaurants = restaurants.filter(cuisines__contains=[cuisine_filter])
+        if cuisine_filter:
+            restaurants = restaurants.filter(cuisines__contains=[cuisine_filter])
 
-    if has_private_room == 'true':
-        restaurants = restaurants.filter(has_private_room=True)
+        if has_private_room == 'true':
+            restaurants = restaurants.filter(has_private_room=True)
 
-    if has_smoking == 'true':
-        restaurants = restaurants.filter(has_smoking_zone=True)
+        if has_smoking == 'true':
+            restaurants = restaurants.filter(has_smoking_zone=True)
 
-    if has_prayer == 'true':
-        restaurants = restaurants.filter(has_prayer_zone=True)
+        if has_prayer == 'true':
+            restaurants = restaurants.filter(has_prayer_zone=True)
 
-    # ALWAYS RETURN ALL RESTAURANTS - NO LOCATION FILTERING
-    restaurant_data = []
-    for restaurant in restaurants:
-        data = RestaurantSerializer(restaurant).data
+        # ALWAYS RETURN ALL RESTAURANTS - NO LOCATION FILTERING
         # No distance calculation or filtering
-        restaurant_data.append(data)
-
-    print(f"✅ RETURNING ALL {len(restaurant_data)} RESTAURANTS (no location filtering)")
+        restaurants = fieldsets.restrict(restaurants, RestaurantSerializer, selected)
+        return RestaurantSerializer(restaurants, many=True, fields=selected).data
+
+    # Concurrent identical requests share one computation (see singleflight)
+    cache_key = 'restaurants:' + '|'.join([
+        search, cuisine_filter, str(has_private_room), str(has_smoking), str(has_prayer),
+        fieldsets.cache_key(selected)
+    ])
+    restaurant_data = singleflight.get_or_compute(cache_key, build, groups=('restaurants',))
     return Response(restaurant_data)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def restaurant_detail(request, restaurant_id):
+    selected = fieldsets.select(request, RestaurantSerializer)
+    restaurants = fieldsets.restrict(Restaurant.objects.all(), RestaurantSerializer, selected)
     try:
-        restaurant = Restaurant.objects.get(id=restaurant_id)
-        return Response(RestaurantSerializer(restaurant).data)
+        data = singleflight.get_or_compute(
+            f'restaurant:{restaurant_id}:{fieldsets.cache_key(selected)}',
+            lambda: RestaurantSerializer(restaurants.get(id=restaurant_id), fields=selected).data,
+            groups=(f'restaurant:{restaurant_id}',)
+        )
+        return Response(data)
     except Restaurant.DoesNotExist:
         return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
-def restaurant_menu(request, restaurant_id):
+def restaurants_batch(request):
+    """Detail, menu and seats of ?ids=1,2,3 in one response, keyed by restaurant id.
+
+    ?include= picks resources (detail,menu,seats; all by default); ?fields= and
+    ?menu_fields= select restaurant and menu item fields.
+    """
+    raw_ids = [value.strip() for value in request.GET.get('ids', '').split(',') if value.strip()]
+    if not raw_ids or not all(value.isdigit() for value in raw_ids):
+        return Response({'error': 'ids must be a comma-separated list of restaurant ids'},
+                      status=status.HTTP_400_BAD_REQUEST)
+    restaurant_ids = list(dict.fromkeys(int(value) for value in raw_ids))
+    if len(restaurant_ids) > batch.MAX_IDS:
+        return Response({'error': f'At most {batch.MAX_IDS} restaurants per request'},
+                      status=status.HTTP_400_BAD_REQUEST)
+
+    include = [value.strip() for value in request.GET.get('include', '').split(',') if value.strip()]
+    unknown = [value for value in include if value not in batch.RESOURCES]
+    if unknown:
+        return Response({'error': f"Unknown resource(s): {', '.join(unknown)}"},
+                      status=status.HTTP_400_BAD_REQUEST)
+    window = request.GET.get('window', str(bestsellers.DEFAULT_WINDOW))
+    if window not in ('7', '30'):
+        return Response({'error': 'Window must be 7 or 30'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(batch.load(
+        restaurant_ids,
+        include=include or batch.RESOURCES,
+        window=int(window),
+        restaurant_fields=fieldsets.select(request, RestaurantSerializer),
+        menu_fields=fieldsets.select(request, MenuItemSerializer, extra=('popular_rank',), prefix='menu_')
+    ))
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def restaurant_feed(request):
+    """Open restaurants ranked for the session user or ?user_id= (generic ranking without one)"""
+    user_id = str(_user_id(request) or '')
+    if user_id and not user_id.isdigit():
+        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 20)), feed.MAX_RESULTS))
+    except ValueError:
+        return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+    selected = fieldsets.select(request, RestaurantSerializer, extra=('feed_score',))
+
     try:
+        restaurants = feed.build_feed(int(user_id) if user_id else None, limit)
+    except UserProfile.DoesNotExist:
+        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'user_id': int(user_id) if user_id else None,
+        'restaurants': fieldsets.project(restaurants, selected)
+    })
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def restaurant_leaderboards(request):
+    """Top restaurants by rating, trending (7-day orders), orders or revenue, per area or overall"""
+    metric = request.GET.get('metric', 'rating')
+    if metric not in leaderboards.METRICS:
+        return Response({'error': 'Metric must be revenue, orders, rating or trending'},
+                      status=status.HTTP_400_BAD_REQUEST)
+    if metric == 'revenue' and not _is_admin(request):
+        return Response({'error': 'Unauthorized'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), leaderboards.TOP_K))
+    except ValueError:
+        return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Entries carry the board's own restaurant columns; other fields come back absent
+    selected = fieldsets.select(request, RestaurantSerializer, extra=('rank', 'score'))
+    area = request.GET.get('area') or None
+    return Response({
+        'metric': metric,
+        'area': area,
+        'restaurants': fieldsets.project(leaderboards.top(metric, area, limit), selected),
+    })
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def restaurant_menu(request, restaurant_id):
+    category = request.GET.get('category')
+    sort = request.GET.get('sort')
+    # Best-seller rank over the last 7 (or ?window=30) days; None if not sold
+    window = request.GET.get('window', str(bestsellers.DEFAULT_WINDOW))
+    if window not in ('7', '30'):
+        return Response({'error': 'Window must be 7 or 30'}, status=status.HTTP_400_BAD_REQUEST)
+    # ?fields= / ?exclude= select menu item fields
+    selected = fieldsets.select(request, MenuItemSerializer, extra=('popular_rank',))
+
+    def build():
         restaurant = Restaurant.objects.get(id=restaurant_id)
         menu_items = MenuItem.objects.filter(restaurant=restaurant, is_available=True)
         
-        category = request.GET.get('category')
         if category:
             menu_items = menu_items.filter(cuisine_type=category)
+
+        ranks = bestsellers.ranking(restaurant.id, int(window))
+        menu_items = list(fieldsets.restrict(menu_items, MenuItemSerializer, selected))
+        items_data = list(MenuItemSerializer(menu_items, many=True, fields=selected).data)
+        for item, menu_item in zip(items_data, menu_items):
+            item['popular_rank'] = ranks.get(menu_item.id)
+        if sort == 'popular':
+            items_data.sort(key=lambda item: (item['popular_rank'] is None, item['popular_rank'] or 0))
+        if selected is not None and 'popular_rank' not in selected:
+            for item in items_data:
+                del item['popular_rank']
         
-        return Response({
+        return {
             'restaurant': RestaurantSerializer(restaurant).data,
-            'menu_items': MenuItemSerializer(menu_items, many=True).data
-        })
+            'menu_items': items_data
+        }
+
+    try:
+        # Menu writes expire the group, so a changed menu is refreshed once, not per request
+        data = singleflight.get_or_compute(
+            f'menu:{restaurant_id}:{category or ""}:{window}:{sort or ""}:{fieldsets.cache_key(selected)}', build,
+            groups=(f'restaurant:{restaurant_id}',)
+        )
+        return Response(data)
     except Restaurant.DoesNotExist:
         return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def restaurant_menu_recommendations(request, restaurant_id):
+    """Dishes frequently ordered together with ?items=1,2,3"""
+    raw_items = [value for value in request.GET.get('items', '').split(',') if value.strip()]
+    if not raw_items or not all(value.strip().isdigit() for value in raw_items):
+        return Response({'error': 'items must be a comma-separated list of menu item ids'},
+                      status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 5)), recommendations.NEIGHBOURS))
+    except ValueError:
+        return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        results = recommendations.recommend(restaurant_id, [int(value) for value in raw_items], limit)
+    except pricing.PricingError:
+        return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'items': [int(value) for value in raw_items], 'recommendations': results})
+
+def _is_admin(request):
+    admin_name = request.GET.get('admin_name')
+    return bool(admin_name) and admin_name in settings.ADMIN_USERS
+
+def _io_format(request, default='csv'):
+    fmt = request.GET.get('format')
+    if not fmt:
+        content_type = request.content_type or ''
+        fmt = 'ndjson' if 'ndjson' in content_type else default
+    return fmt.lower()
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def restaurant_menu_import(request, restaurant_id):
+    if not _is_admin(request):
+        return Response({'error': 'Unauthorized'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    fmt = _io_format(request)
+    if fmt not in menu_io.FORMATS:
+        return Response({'error': 'Format must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+    dry_run = request.GET.get('dry_run') == 'true'
+
+    try:
+        restaurant = Restaurant.objects.get(id=restaurant_id)
+    except Restaurant.DoesNotExist:
+        return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    # Multipart uploads are spooled to disk by Django; raw bodies are read as they arrive
+    if request.content_type and request.content_type.startswith('multipart/'):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'File is required'}, status=status.HTTP_400_BAD_REQUEST)
+        stream = upload
+    else:
+        stream = request.stream or []
+
+    try:
+        report = menu_io.import_menu(restaurant, stream, fmt, dry_run=dry_run)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return Response({'error': f'Could not parse file: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if report['errors']:
+        return Response(report, status=status.HTTP_400_BAD_REQUEST)
+    return Response(report)
+
+@require_GET
+def restaurant_menu_export(request, restaurant_id):
+    if not _is_admin(request):
+        return JsonResponse({'error': 'Unauthorized'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    fmt = _io_format(request)
+    if fmt not in menu_io.FORMATS:
+        return JsonResponse({'error': 'Format must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        restaurant = Restaurant.objects.get(id=restaurant_id)
+    except Restaurant.DoesNotExist:
+        return JsonResponse({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    response = StreamingHttpResponse(
+        menu_io.export_menu(restaurant, fmt),
+        content_type='text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    )
+    response['Content-Disposition'] = f'attachment; filename="menu-{restaurant.id}.{fmt}"'
+    return response
+
+# -------------------- Branding Assets --------------------
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def restaurant_branding(request, restaurant_id):
+    """Upload a logo and/or wallpaper (multipart files `logo`, `wallpaper`) to the asset store"""
+    if not _is_admin(request):
+        return Response({'error': 'Unauthorized'}, status=status.HTTP_401_UNAUTHORIZED)
+    try:
+        restaurant = Restaurant.objects.get(id=restaurant_id)
+    except Restaurant.DoesNotExist:
+        return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    uploads = {kind: request.FILES[kind] for kind in assets.KINDS if kind in request.FILES}
+    if not uploads:
+        return Response({'error': 'Upload a logo or wallpaper file'}, status=status.HTTP_400_BAD_REQUEST)
+    digests = {}
+    for kind, upload in uploads.items():
+        if upload.size > assets.MAX_BYTES:
+            return Response({'error': f'{kind} is larger than {assets.MAX_BYTES} bytes'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        try:
+            digests[f'{kind}_asset'] = assets.put(upload.read())
+        except assets.AssetError as e:
+            return Response({'error': f'{kind}: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    for field, digest in digests.items():
+        setattr(restaurant, field, digest)
+    restaurant.save(update_fields=list(digests))
+    return Response(RestaurantSerializer(restaurant).data)
+
+@require_GET
+def asset(request, digest):
+    """A stored asset by its SHA-256; the URL never changes content, so it is cached for a year"""
+    etag = f'"{digest}"'
+    headers = {'Cache-Control': assets.CACHE_CONTROL, 'ETag': etag}
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            f, content_type = assets.open_asset(digest)
+        except FileNotFoundError:
+            return JsonResponse({'error': 'Asset not found'}, status=status.HTTP_404_NOT_FOUND)
+        response = FileResponse(f, content_type=content_type)
+        headers['X-Content-Type-Options'] = 'nosniff'
+        if content_type == 'image/svg+xml':
+            headers['Content-Security-Policy'] = assets.SVG_POLICY
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
 # -------------------- Seat Management --------------------
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def restaurant_seats(request, restaurant_id):
+    """The seat snapshot; ?fields= / ?exclude= trim the restaurant"""
+    selected = fieldsets.select(request, RestaurantSerializer)
+    restaurants = fieldsets.restrict(Restaurant.objects.all(), RestaurantSerializer, selected)
     try:
-        restaurant = Restaurant.objects.get(id=restaurant_id)
-        seats = Seat.objects.filter(restaurant=restaurant)
-        
-        # Get occupied seats
-        now = timezone.now()
-        occupied_seats = OccupiedSeat.objects.filter(
-            seat__restaurant=restaurant,
-            occupied_until__gt=now
-        ).values_list('seat_id', flat=True)
-        
-        # Get booked seats
-        booked_seats = Booking.objects.filter(
-            restaurant=restaurant,
-            start_time__lte=now,
-            end_time__gt=now,
-            status='confirmed'
-        ).values_list('seats', flat=True)
-        
-        seat_data = []
-        for seat in seats:
-            seat_info = {
-                'id': seat.id,
-                'code': seat.code,
-                'is_private_room': seat.is_private_room,
-                'x_position': seat.x_position,
-                'y_position': seat.y_position,
-                'is_occupied': seat.id in occupied_seats,
-                'is_booked': any(seat.id in booking for booking in booked_seats)
-            }
-            seat_data.append(seat_info)
-        
-        return Response({
-            'restaurant': RestaurantSerializer(restaurant).data,
-            'seats': seat_data,
-            'layout': 'restaurant'  # Could be customized per restaurant
-        })
+        # Shared with restaurant_detail's cache entry
+        restaurant_data = singleflight.get_or_compute(
+            f'restaurant:{restaurant_id}:{fieldsets.cache_key(selected)}',
+            lambda: RestaurantSerializer(restaurants.get(id=restaurant_id), fields=selected).data,
+            groups=(f'restaurant:{restaurant_id}',)
+        )
     except Restaurant.DoesNotExist:
         return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
 
+    # Occupancy is computed once per restaurant and shared by every viewer
+    version, seat_data = seatmap.get_seat_map(restaurant_id).snapshot()
+
+    return Response({
+        'restaurant': restaurant_data,
+        'seats': seat_data,
+        'version': version,
+        'layout': 'restaurant'  # Could be customized per restaurant
+    })
+
+def _seat_map_or_404(restaurant_id):
+    """The seat map, or None for an unknown restaurant (only checked when it has no seats)"""
+    seat_map = seatmap.get_seat_map(restaurant_id)
+    if not len(seat_map.compiled_layout()) and not Restaurant.objects.filter(id=restaurant_id).exists():
+        seatmap.discard(restaurant_id)
+        return None
+    return seat_map
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def restaurant_seat_layout(request, restaurant_id):
+    """Packed static layout: parallel ids/codes/x/y arrays and a private-room bitmap.
+
+    Fetched as ?hash=<layout_hash from the occupancy endpoint>, it is cached for good.
+    """
+    seat_map = _seat_map_or_404(restaurant_id)
+    if seat_map is None:
+        return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+    layout = seat_map.compiled_layout()
+
+    etag = f'"{layout.hash}"'
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(layout.data)
+    response['ETag'] = etag
+    if request.GET.get('hash') == layout.hash:
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={seatmap.LAYOUT_MAX_AGE}'
+    return response
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def restaurant_seat_occupancy(request, restaurant_id):
+    """Occupied and booked bitmaps (bit i = seat i of the layout with layout_hash)"""
+    seat_map = _seat_map_or_404(restaurant_id)
+    if seat_map is None:
+        return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+    version, occupancy = seat_map.occupancy()
+    return Response({'restaurant_id': restaurant_id, 'version': version, **occupancy})
+
+@require_GET
+def restaurant_seats_live(request, restaurant_id):
+    """Server-Sent Events stream: one seat snapshot, then seat-state deltas"""
+    if not Restaurant.objects.filter(id=restaurant_id).exists():
+        return JsonResponse({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    last_version = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    response = StreamingHttpResponse(
+        seatmap.event_stream(restaurant_id, last_version),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # -------------------- Booking Management --------------------
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def availability_search(request):
+    """Open restaurants that can seat ?party_size= from ?start= to ?end= (ISO 8601).
+
+    ?area= and ?features=private_room,smoking,prayer narrow the search;
+    ?alternatives=true adds nearby free time slots at the restaurants that are full.
+    """
+    try:
+        party_size = int(request.GET.get('party_size', ''))
+    except ValueError:
+        return Response({'error': 'party_size is required'}, status=status.HTTP_400_BAD_REQUEST)
+    features = [value.strip() for value in request.GET.get('features', '').split(',') if value.strip()]
+    alternatives = request.GET.get('alternatives') == 'true'
+    try:
+        start, end = availability.parse_window(request.GET.get('start'), request.GET.get('end'))
+        available, elsewhere = availability.search(
+            party_size, start, end, area=request.GET.get('area'), features=features, alternatives=alternatives
+        )
+    except availability.AvailabilityError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    data = {'party_size': party_size, 'start': start, 'end': end, 'restaurants': available}
+    if alternatives:
+        data['alternatives'] = elsewhere
+    return Response(data)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def user_bookings(request):
-    user_id = request.GET.get('user_id')
+    user_id = _user_id(request)
+    guest_session_id = _guest_session_id(request)
+    selected = fieldsets.select(request, BookingSerializer)
+
+    if guest_session_id and not user_id:
+        bookings = Booking.objects.filter(
+            guest_session__session_id=guest_session_id
+        ).order_by('-created_at')
+        bookings = fieldsets.restrict(bookings, BookingSerializer, selected)
+        return Response({'bookings': BookingSerializer(bookings, many=True, fields=selected).data})
 
     if not user_id:
         return Response({'error': 'User ID required'}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        user = UserProfile.objects.get(id=user_id)
+        user = profiles.get_profile(user_id)
         bookings = Booking.objects.filter(user=user).order_by('-created_at')
+        bookings = fieldsets.restrict(bookings, BookingSerializer, selected)
 
         return Response({
-            'bookings': BookingSerializer(bookings, many=True).data
+            'bookings': BookingSerializer(bookings, many=True, fields=selected).data
         })
     except UserProfile.DoesNotExist:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+    except ValueError:
+        return Response({'error': 'Invalid user ID'}, status=status.HTTP_400_BAD_REQUEST)
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@idempotent
 def create_booking(request, restaurant_id):
-    user_id = request.data.get('user_id')
+    user_id = _user_id(request)
     guest_id = request.data.get('guest_id')
+    guest_session_id = _guest_session_id(request)
     # restaurant_id comes from URL parameter
     seat_ids = request.data.get('seat_ids', [])
     start_time = request.data.get('start_time')
@@ -294,10 +686,19 @@ def create_booking(request, restaurant_id):
         start_dt = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
         end_dt = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
 
+        # Seat ids or codes of this restaurant's seats become real seat links (the
+        # seat map reads those); anything else is a generated seat kept as a code
+        requested = [str(seat_id) for seat_id in seat_ids]
+        seats = list(Seat.objects.filter(restaurant=restaurant).filter(
+            Q(code__in=requested) | Q(id__in=[int(seat_id) for seat_id in requested if seat_id.isdigit()])
+        ))
+        linked = {str(seat.id) for seat in seats} | {seat.code for seat in seats}
+        seat_codes = [seat_id for seat_id in seat_ids if str(seat_id) not in linked]
+
         # Check for conflicts
         conflicting_bookings = Booking.objects.filter(
             restaurant=restaurant,
-            seats__in=seat_ids,
+            seats__in=seats,
             start_time__lt=end_dt,
             end_time__gt=start_dt,
             status='confirmed'
@@ -313,20 +714,25 @@ def create_booking(request, restaurant_id):
         payment_method = request.data.get('payment_method', 'cash')
         total_amount = request.data.get('total_amount', 0)
 
+        if guest_session_id and not user_id:
+            guest_id = _guest_row_id(guest_session_id)
+
         # Create booking with all details
-        booking = Booking.objects.create(
-            user_id=user_id if user_id else None,
-            guest_session_id=guest_id if guest_id else None,
-            restaurant=restaurant,
-            start_time=start_dt,
-            end_time=end_dt,
-            status='confirmed',
-            customer_name=customer_name,
-            customer_phone=customer_phone,
-            payment_method=payment_method,
-            total_amount=total_amount,
-            seat_codes=seat_ids  # Store the generated seat IDs
-        )
+        with transaction.atomic():
+            booking = Booking.objects.create(
+                user_id=user_id if user_id else None,
+                guest_session_id=guest_id if guest_id else None,
+                restaurant=restaurant,
+                start_time=start_dt,
+                end_time=end_dt,
+                status='confirmed',
+                customer_name=customer_name,
+                customer_phone=customer_phone,
+                payment_method=payment_method,
+                total_amount=total_amount,
+                seat_codes=seat_codes  # Store the generated seat IDs
+            )
+            booking.seats.set(seats)
 
         return Response({
             'booking_id': booking.id,
@@ -387,41 +793,108 @@ def validate_card(card_number, expiry_month, expiry_year, pin):
 
     return True, "Valid"
 
+def payment_details_error(payment_method, data):
+    """Error message for invalid payment details, or None when they look valid"""
+    if payment_method in ['bkash', 'nagad']:
+        if not validate_bd_phone(data.get('phone', '')):
+            return 'Invalid Bangladesh phone number'
+        if not validate_pin(data.get('pin', '')):
+            return 'Invalid PIN'
+
+    elif payment_method == 'card':
+        is_valid, message = validate_card(
+            data.get('card_number', ''), data.get('expiry_month', ''),
+            data.get('expiry_year', ''), data.get('pin', '')
+        )
+        if not is_valid:
+            return message
+
+    return None
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def validate_payment(request):
-    payment_method = request.data.get('payment_method')
+    error = payment_details_error(request.data.get('payment_method'), request.data)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
 
-    if payment_method in ['bkash', 'nagad']:
-        phone = request.data.get('phone', '')
-        pin = request.data.get('pin', '')
+    return Response({'message': 'Payment details valid'})
 
-        if not validate_bd_phone(phone):
-            return Response({'error': 'Invalid Bangladesh phone number'},
-                          status=status.HTTP_400_BAD_REQUEST)
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@idempotent(fields=())  # the body is card or wallet details and a PIN; never hash them
+def pay_order(request, order_id):
+    # Charges the order through its gateway; the details are passed on, never stored
+    try:
+        order = Order.objects.get(id=order_id)
+    except Order.DoesNotExist:
+        return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if not validate_pin(pin):
-            return Response({'error': 'Invalid PIN'},
-                          status=status.HTTP_400_BAD_REQUEST)
+    if order.payment_method not in payments.PROVIDERS:
+        return Response({'error': 'Cash orders are paid on delivery'}, status=status.HTTP_400_BAD_REQUEST)
+    if order.payment_status == 'paid':
+        return Response({'order_id': order.id, 'payment_status': 'paid', 'message': 'Order is already paid'})
 
-    elif payment_method == 'card':
-        card_number = request.data.get('card_number', '')
-        expiry_month = request.data.get('expiry_month', '')
-        expiry_year = request.data.get('expiry_year', '')
-        pin = request.data.get('pin', '')
+    error = payment_details_error(order.payment_method, request.data)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+    fields = ['phone', 'pin'] if order.payment_method in ['bkash', 'nagad'] else [
+        'card_number', 'expiry_month', 'expiry_year', 'pin'
+    ]
+    account = {field: str(request.data.get(field, '')) for field in fields}
 
-        is_valid, message = validate_card(card_number, expiry_month, expiry_year, pin)
-        if not is_valid:
-            return Response({'error': message}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        result = payments.pay_order(order, account)
+    except payments.PaymentError as e:
+        return Response({'error': str(e), 'order_id': order.id, 'payment_status': order.payment_status},
+                        status=e.status_code)
 
-    return Response({'message': 'Payment details valid'})
+    if order.payment_status != 'paid':
+        return Response({
+            'error': result.get('message') or 'Payment failed',
+            'order_id': order.id,
+            'payment_status': order.payment_status
+        }, status=status.HTTP_402_PAYMENT_REQUIRED)
+    return Response({
+        'order_id': order.id,
+        'payment_status': order.payment_status,
+        'transaction_id': result.get('transaction_id'),
+        'message': 'Payment successful'
+    })
 
 # -------------------- Order Management --------------------
 @api_view(['POST'])
 @permission_classes([AllowAny])
+def cart_quote(request):
+    # Accepts a single cart or {"carts": [...]}; prices come from cached snapshots
+    carts = request.data.get('carts') if isinstance(request.data, dict) else None
+    single = carts is None
+    if single:
+        carts = [request.data]
+    elif not isinstance(carts, list):
+        return Response({'error': 'carts must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+
+    quotes = []
+    for cart in carts:
+        try:
+            quotes.append(pricing.format_quote(pricing.quote_cart(cart)))
+        except pricing.PricingError as e:
+            if single:
+                return Response({'error': str(e)}, status=e.status_code)
+            restaurant_id = cart.get('restaurant_id') if isinstance(cart, dict) else None
+            quotes.append({'restaurant_id': restaurant_id, 'error': str(e)})
+
+    if single:
+        return Response(quotes[0])
+    return Response({'quotes': quotes})
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@idempotent
 def create_order(request):
-    user_id = request.data.get('user_id')
+    user_id = _user_id(request)
     guest_id = request.data.get('guest_id')
+    guest_session_id = _guest_session_id(request)
     restaurant_id = request.data.get('restaurant_id')
     items = request.data.get('items', [])
     payment_method = request.data.get('payment_method')
@@ -430,16 +903,33 @@ def create_order(request):
     try:
         restaurant = Restaurant.objects.get(id=restaurant_id)
 
-        # Calculate totals
-        subtotal = 0
-        for item in items:
-            menu_item = MenuItem.objects.get(id=item['menu_item_id'])
-            subtotal += menu_item.price * item['quantity']
-
-        # Apply discounts and calculate total
-        discount_amount = 0
-        delivery_fee = 50 if payment_method != 'cash' else 0  # Free delivery for cash
-        total_amount = subtotal - discount_amount + delivery_fee
+        # Price the cart from the cached snapshot; a client quoting first can send
+        # its price_version so we can tell it when prices changed in between
+        quote = pricing.quote_cart({
+            'restaurant_id': restaurant.id,
+            'items': items,
+            'payment_method': payment_method
+        })
+        quoted_version = request.data.get('price_version')
+        if quoted_version and quoted_version != quote['price_version']:
+            return Response({
+                'error': 'Prices have changed, please review your cart',
+                'quote': pricing.format_quote(quote)
+            }, status=status.HTTP_409_CONFLICT)
+        if quote['unavailable_items']:
+            return Response({
+                'error': 'Some items are no longer available',
+                'unavailable_items': quote['unavailable_items']
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        subtotal = quote['subtotal']
+        discount = quote['discount']
+        discount_amount = quote['discount_amount']
+        delivery_fee = quote['delivery_fee']
+        total_amount = quote['total_amount']
+
+        if guest_session_id and not user_id:
+            guest_id = _guest_row_id(guest_session_id)
 
         # Create order
         order = Order.objects.create(
@@ -458,26 +948,35 @@ def create_order(request):
         )
 
         # Create order items
-        for item in items:
-            menu_item = MenuItem.objects.get(id=item['menu_item_id'])
-            OrderItem.objects.create(
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
-                menu_item=menu_item,
-                quantity=item['quantity'],
-                price=menu_item.price
+                menu_item_id=line['menu_item_id'],
+                quantity=line['quantity'],
+                price=line['unit_price']
             )
-
-        # Award reward points for users
+            for line in quote['items']
+        ])
+        rollups.items_changed(order, sum(line['quantity'] for line in quote['items']))
+        sold = {}
+        for line in quote['items']:
+            sold[line['menu_item_id']] = sold.get(line['menu_item_id'], 0) + line['quantity']
+        bestsellers.items_ordered(order, sold)
+
+        # Award reward points for users (off the request path)
         if user_id:
-            user = UserProfile.objects.get(id=user_id)
-            points_earned = int(total_amount // 100)  # 1 point per 100 tk
-            user.reward_points += points_earned
-            user.save()
+            jobs.enqueue('award_reward_points', {
+                'user_id': user_id,
+                'total_amount': str(total_amount),
+                'order_id': order.id,
+            }, priority=10, dedup_key=f'reward-points:order:{order.id}')
 
         return Response({
             'order_id': order.id,
             'status': 'confirmed',
             'total_amount': str(total_amount),
+            'discount_amount': str(discount_amount),
+            'discount_name': discount['name'] if discount else None,
             'rider_name': order.rider_name,
             'rider_phone': order.rider_phone,
             'estimated_delivery': '30-45 minutes'
@@ -485,41 +984,54 @@ def create_order(request):
 
     except (Restaurant.DoesNotExist, MenuItem.DoesNotExist) as e:
         return Response({'error': 'Invalid restaurant or menu item'}, status=status.HTTP_404_NOT_FOUND)
+    except pricing.PricingError as e:
+        return Response({'error': str(e)}, status=e.status_code)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def order_history(request):
-    user_id = request.GET.get('user_id')
+    user_id = _user_id(request)
     guest_id = request.GET.get('guest_id')
+    guest_session_id = _guest_session_id(request)
 
     try:
         orders = Order.objects.all().order_by('-created_at')
 
         # Filter by user or guest
         if user_id:
-            user = UserProfile.objects.get(id=user_id)
+            user = profiles.get_profile(user_id)
             orders = orders.filter(user=user)
+        elif guest_session_id:
+            # No row yet just means the guest has not ordered
+            orders = orders.filter(guest_session__session_id=guest_session_id)
         elif guest_id:
             guest = GuestSession.objects.get(id=guest_id)
             orders = orders.filter(guest_session=guest)
         else:
             return Response({'error': 'User ID or Guest ID required'}, status=status.HTTP_400_BAD_REQUEST)
 
+        selected = fieldsets.select(request, OrderSerializer)
         return Response({
-            'orders': OrderSerializer(orders, many=True).data,
+            'orders': OrderSerializer(
+                fieldsets.restrict(orders, OrderSerializer, selected), many=True, fields=selected
+            ).data,
             'total_orders': orders.count()
         })
     except (UserProfile.DoesNotExist, GuestSession.DoesNotExist):
         return Response({'error': 'User or guest not found'}, status=status.HTTP_404_NOT_FOUND)
+    except ValueError:
+        # e.g. ?guest_id=null from clients that predate guest tokens
+        return Response({'error': 'Invalid user or guest ID'}, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def order_status(request, order_id):
+    selected = fieldsets.select(request, OrderSerializer)
     try:
-        order = Order.objects.get(id=order_id)
-        return Response(OrderSerializer(order).data)
+        order = fieldsets.restrict(Order.objects.all(), OrderSerializer, selected).get(id=order_id)
+        return Response(OrderSerializer(order, fields=selected).data)
     except Order.DoesNotExist:
         return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -527,7 +1039,7 @@ def order_status(request, order_id):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def create_review(request, order_id):
-    user_id = request.data.get('user_id')
+    user_id = _user_id(request)
     rating = request.data.get('rating')
     text = request.data.get('text', '')
 
@@ -542,7 +1054,7 @@ def create_review(request, order_id):
             return Response({'error': 'Only registered users can leave reviews'},
                           status=status.HTTP_400_BAD_REQUEST)
 
-        user = UserProfile.objects.get(id=user_id)
+        user = profiles.get_profile(user_id)
 
         # Check if review already exists
         if Review.objects.filter(user=user, order=order).exists():
@@ -557,13 +1069,10 @@ def create_review(request, order_id):
             text=text
         )
 
-        # Update restaurant average rating
-        restaurant = order.restaurant
-        reviews = Review.objects.filter(restaurant=restaurant)
-        avg_rating = sum(r.rating for r in reviews) / len(reviews)
-        restaurant.average_rating = round(avg_rating, 2)
-        restaurant.total_reviews = len(reviews)
-        restaurant.save()
+        # Update restaurant average rating; bursts of reviews share one pending recompute
+        jobs.enqueue('recompute_restaurant_rating', {
+            'restaurant_id': order.restaurant_id
+        }, dedup_key=f'restaurant-rating:{order.restaurant_id}')
 
         return Response({
             'review_id': review.id,
@@ -584,91 +1093,92 @@ def admin_dashboard(request):
     if not admin_name or admin_name not in settings.ADMIN_USERS:
         return Response({'error': 'Unauthorized'}, status=status.HTTP_401_UNAUTHORIZED)
 
-    # Enhanced admin dashboard with detailed analytics
-    from django.db.models import Sum, Count, Avg
-    from datetime import datetime, timedelta
-
-    # Get all data
-    users = UserProfile.objects.all()
-    all_orders = Order.objects.all().order_by('-created_at')
-    all_bookings = Booking.objects.all().order_by('-created_at')
-    all_reviews = Review.objects.all().order_by('-created_at')
-
-    # Calculate revenue statistics
-    total_revenue = all_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-    delivered_orders = all_orders.filter(status='delivered')
-    confirmed_revenue = delivered_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-
-    # Restaurant-wise revenue and order stats
-    restaurant_stats = all_orders.values(
-        'restaurant__name',
-        'restaurant__id',
-        'restaurant__area'
-    ).annotate(
-        total_orders=Count('id'),
-        total_revenue=Sum('total_amount'),
-        avg_order_value=Avg('total_amount')
-    ).order_by('-total_revenue')
-
-    # Recent activity (last 7 days)
-    week_ago = datetime.now() - timedelta(days=7)
-    recent_orders = all_orders.filter(created_at__gte=week_ago)
-    recent_revenue = recent_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-
-    # User activity stats with detailed order information
-    user_stats = []
-    for user in users:
-        user_orders = all_orders.filter(user=user)
-        user_bookings = all_bookings.filter(user=user)
-        user_spent = user_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-
-        # Get user's recent orders with restaurant info
-        recent_user_orders = user_orders[:5]  # Last 5 orders
-        order_details = []
-        for order in recent_user_orders:
-            order_details.append({
-                'order_id': order.id,
-                'restaurant_name': order.restaurant.name,
-                'total_amount': float(order.total_amount),
-                'status': order.status,
-                'created_at': order.created_at,
-                'items_count': order.items.count()
-            })
-
-        user_stats.append({
-            'user_id': user.id,
-            'email': user.email,
-            'name': user.name,
-            'institution': user.institution.name if user.institution else 'No Institution',
-            'total_orders': user_orders.count(),
-            'total_bookings': user_bookings.count(),
-            'total_spent': float(user_spent),
-            'reward_points': user.reward_points,
-            'last_order': user_orders.first().created_at if user_orders.exists() else None,
-            'recent_orders': order_details
-        })
+    # Aggregates are built by a background job; serve the last snapshot and
+    # queue a refresh once it is older than DASHBOARD_ANALYTICS_MAX_AGE seconds
+    dashboard = cache.get(tasks.DASHBOARD_CACHE_KEY)
+    if dashboard is None:
+        dashboard = tasks.refresh_dashboard_analytics()
+    else:
+        max_age = getattr(settings, 'DASHBOARD_ANALYTICS_MAX_AGE', 60)
+        if timezone.now() - dashboard['generated_at'] > timedelta(seconds=max_age):
+            jobs.enqueue('refresh_dashboard_analytics', priority=-10,
+                         dedup_key='refresh-dashboard-analytics')
+
+    order_fields, booking_fields, review_fields = _history_fields(request)
+    all_orders = fieldsets.restrict(Order.objects.order_by('-created_at'), OrderSerializer, order_fields)
+    all_bookings = fieldsets.restrict(Booking.objects.order_by('-created_at'), BookingSerializer, booking_fields)
+    all_reviews = fieldsets.restrict(Review.objects.order_by('-created_at'), ReviewSerializer, review_fields)
 
-    # Sort users by total spent (highest spenders first)
-    user_stats.sort(key=lambda x: x['total_spent'], reverse=True)
+    return Response({
+        'users': dashboard['users'],
+        'orders': OrderSerializer(all_orders[:100], many=True, fields=order_fields).data,  # Latest 100 orders
+        'bookings': BookingSerializer(all_bookings[:50], many=True, fields=booking_fields).data,
+        'reviews': ReviewSerializer(all_reviews[:50], many=True, fields=review_fields).data,
+        'restaurant_stats': dashboard['restaurant_stats'],
+        'stats': dashboard['stats'],
+        'stats_generated_at': dashboard['generated_at'],
+    })
+
+@require_GET
+def admin_orders_export(request):
+    """Stream every matching order as NDJSON or CSV"""
+    if not _is_admin(request):
+        return JsonResponse({'error': 'Unauthorized'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    fmt = request.GET.get('format', 'ndjson').lower()
+    if fmt not in exports.FORMATS:
+        return JsonResponse({'error': 'Format must be ndjson or csv'}, status=status.HTTP_400_BAD_REQUEST)
+
+    statuses = [s for s in request.GET.get('status', '').split(',') if s]
+    try:
+        orders = exports.filter_orders(
+            date_from=request.GET.get('from'),
+            date_to=request.GET.get('to'),
+            restaurant=request.GET.get('restaurant'),
+            statuses=statuses
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(
+        exports.export_orders(orders, fmt),
+        content_type='application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+    )
+    response['Content-Disposition'] = f'attachment; filename="orders.{fmt}"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def admin_timeseries(request):
+    """Revenue, order or booking counts per hour/day/week, gaps filled with zeros"""
+    if not _is_admin(request):
+        return Response({'error': 'Unauthorized'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    metric = request.GET.get('metric', 'revenue')
+    bucket = request.GET.get('bucket', 'day')
+    if metric not in analytics.METRICS:
+        return Response({'error': 'Metric must be revenue, orders or bookings'}, status=status.HTTP_400_BAD_REQUEST)
+    if bucket not in analytics.BUCKETS:
+        return Response({'error': 'Bucket must be hour, day or week'}, status=status.HTTP_400_BAD_REQUEST)
+
+    restaurant_id = request.GET.get('restaurant')
+    if restaurant_id and not restaurant_id.isdigit():
+        return Response({'error': f"Invalid restaurant '{restaurant_id}'"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        end = exports.parse_bound(request.GET.get('to'), end=True) or timezone.now()
+        start = exports.parse_bound(request.GET.get('from')) or end - timedelta(days=7)
+        if start >= end:
+            raise ValueError("'from' must be before 'to'")
+        points = analytics.timeseries(metric, bucket, start, end, restaurant_id=restaurant_id)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     return Response({
-        'users': user_stats,
-        'orders': OrderSerializer(all_orders[:100], many=True).data,  # Latest 100 orders
-        'bookings': BookingSerializer(all_bookings[:50], many=True).data,
-        'reviews': ReviewSerializer(all_reviews[:50], many=True).data,
-        'restaurant_stats': list(restaurant_stats),
-        'stats': {
-            'total_users': users.count(),
-            'total_orders': all_orders.count(),
-            'total_bookings': all_bookings.count(),
-            'total_reviews': all_reviews.count(),
-            'total_revenue': float(total_revenue),
-            'confirmed_revenue': float(confirmed_revenue),
-            'recent_revenue': float(recent_revenue),
-            'avg_order_value': float(all_orders.aggregate(avg=Avg('total_amount'))['avg'] or 0),
-            'pending_orders': all_orders.filter(status='pending').count(),
-            'confirmed_orders': all_orders.filter(status='confirmed').count(),
-            'delivered_orders': delivered_orders.count(),
-            'cancelled_orders': all_orders.filter(status='cancelled').count(),
-        }
+        'metric': metric,
+        'bucket': bucket,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'restaurant': int(restaurant_id) if restaurant_id else None,
+        'points': points,
     })
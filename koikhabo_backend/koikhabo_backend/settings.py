@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+from corsheaders.defaults import default_headers
 from decouple import config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +52,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'foodapp.ratelimit.RateLimitMiddleware',
+    'foodapp.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -136,6 +139,11 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
 ]
+# Request headers the frontend sends on top of the defaults: guest and session
+# tokens, and Idempotency-Key on order/booking writes
+CORS_ALLOW_HEADERS = (*default_headers, 'x-guest-token', 'idempotency-key', 'x-session-token')
+# Response headers the frontend reads: 429/409 back-off and idempotent replays
+CORS_EXPOSE_HEADERS = ['Retry-After', 'Idempotent-Replayed']
 
 # Time zone for Bangladesh
 TIME_ZONE = 'Asia/Dhaka'
@@ -147,4 +155,122 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Changed from IsAuthenticated
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'foodapp.renderers.FastJSONRenderer',  # orjson; same output as JSONRenderer
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Response compression (foodapp.compression): brotli if installed, else gzip
+COMPRESSION_MIN_BYTES = 1024  # Smaller bodies are sent uncompressed
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Cache shared by all worker processes (web and job workers)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+    },
+    # Precomputed data stored without a timeout; kept apart so the default cache's culling never drops it
+    'durable': {
+        'BACKEND': config('DURABLE_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('DURABLE_CACHE_LOCATION', default=str(BASE_DIR / '.cache' / 'durable')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Live seat map (foodapp.seatmap). Under runserver/WSGI every open event stream
+# holds a worker thread, so streams are short and the browser's EventSource
+# reconnects with Last-Event-ID, resuming from the delta buffer.
+SEATMAP_STREAM_SECONDS = 25
+SEATMAP_HEARTBEAT_SECONDS = 10
+
+# Background job queue (python manage.py run_jobs)
+JOB_BACKOFF_BASE_SECONDS = 5
+JOB_BACKOFF_MAX_SECONDS = 3600
+JOB_LOCK_TIMEOUT_SECONDS = 600
+DASHBOARD_ANALYTICS_MAX_AGE = 60  # Seconds before the dashboard queues a refresh
+
+# TTL compaction (python manage.py sweep_expired)
+SWEEPER_BATCH_SIZE = 500
+SWEEPER_OCCUPANCY_GRACE_MINUTES = 60
+GUEST_SESSION_TTL_DAYS = 7
+SWEEPER_ARCHIVE_DIR = BASE_DIR / 'archive'
+PRICE_SNAPSHOT_TTL = 300  # Seconds; MenuItem writes also drop the snapshot
+
+# Restaurant leaderboards
+LEADERBOARD_SIZE = 20  # Entries kept per board
+LEADERBOARD_SYNC_SECONDS = 10  # How often a process checks for a newer snapshot
+LEADERBOARD_REBUILD_SECONDS = 300  # Snapshot age that queues a rebuild
+
+# "Ordered together" recommendations (python manage.py build_recommendations)
+RECOMMENDATION_NEIGHBOURS = 10  # Neighbours precomputed per menu item
+RECOMMENDATION_MIN_PAIR_COUNT = 1  # Orders a pair needs before it is recommended
+
+# Personalized feed (/api/feed/)
+FEED_CACHE_SECONDS = 60  # Per-user ranking cache
+FEED_FEATURES_TTL = 300  # Seconds before restaurant features are rebuilt
+FEED_USER_FEATURES_SYNC_SECONDS = 10  # How often a process checks for newer per-user features
+FEED_USER_FEATURES_REBUILD_SECONDS = 300  # Per-user feature age that queues a rebuild
+
+# Menu best sellers
+BESTSELLER_CACHE_SECONDS = 300  # Menu best-seller ranks; order writes also drop them
+
+# Content-addressed branding assets (/api/assets/<sha256>/)
+ASSET_ROOT = config('ASSET_ROOT', default=str(BASE_DIR / 'media' / 'assets'))
+ASSET_MAX_BYTES = 2 * 1024 * 1024  # Largest logo or wallpaper upload
+
+# Cross-restaurant availability search (/api/availability/search/)
+AVAILABILITY_HORIZON_DAYS = 14  # How far ahead a search may start
+AVAILABILITY_REBUILD_SECONDS = 300  # Index age that forces a rebuild without writes
+
+# Batched multi-get (/api/restaurants/batch/)
+BATCH_MAX_IDS = 50  # Restaurants per request
+
+# Signed session tokens issued at login, and the per-process profile cache
+SESSION_TOKEN_MAX_AGE = 60 * 60 * 24 * 30  # Seconds
+PROFILE_CACHE_SIZE = 2048
+PROFILE_CACHE_TTL = 60  # Seconds a cached profile may miss writes from other processes
+GUEST_TOKEN_MAX_AGE = 60 * 60 * 24 * 90  # Seconds; guests get a GuestSession row only once they order or book
+
+# Admission control (foodapp.ratelimit): (tokens per second, burst) per bucket
+RATE_LIMIT = {
+    'ENABLED': config('RATE_LIMIT_ENABLED', default=True, cast=bool),
+    # Limits shared by every worker through the default cache; LocalBackend keeps
+    # them per process and is only right with a single worker
+    'BACKEND': 'foodapp.ratelimit.CacheBackend',
+    'CLIENT': (10, 40),
+    'GLOBAL': (200, 400),
+    'ENDPOINTS': {
+        'create-order': (20, 40),
+        'create-booking': (10, 20),
+        'guest-session': (20, 60),
+        'user-login': (10, 30),
+    },
+    'WRITE_CONCURRENCY': 8,
+    'EXEMPT': ('health-check',),
+}
+
+# Cross-process locks (single-flight computations, in-flight idempotent requests)
+# as O_EXCL files on local disk; set to None to use cache.add on a shared cache
+LOCK_DIR = config('LOCK_DIR', default=str(BASE_DIR / '.cache' / 'locks'))
+
+# Idempotency-Key handling for create_order / create_booking
+IDEMPOTENCY_TTL = 60 * 60 * 24  # Seconds a successful response is replayed
+IDEMPOTENCY_WAIT_SECONDS = 10  # How long a duplicate waits for the in-flight original
+
+# Single-flight response cache for restaurant list/detail/menu
+SINGLE_FLIGHT_FRESH_SECONDS = 30
+SINGLE_FLIGHT_STALE_SECONDS = 300  # Served while one background refresh runs
+SINGLE_FLIGHT_WAIT_SECONDS = 5  # How long a request waits for another's computation
+
+# Payment gateways (foodapp.payments); python manage.py run_mock_gateway serves the default URL
+PAYMENT_GATEWAY_URL = config('PAYMENT_GATEWAY_URL', default='http://127.0.0.1:8765')
+PAYMENT_GATEWAYS = {
+    # TIMEOUT covers the whole call; HEDGE_AFTER starts a second attempt if the first is slow
+    'bkash': {'BASE_URL': f'{PAYMENT_GATEWAY_URL}/bkash', 'TIMEOUT': 4, 'HEDGE_AFTER': 0.8},
+    'nagad': {'BASE_URL': f'{PAYMENT_GATEWAY_URL}/nagad', 'TIMEOUT': 4, 'HEDGE_AFTER': 0.8},
+    'card': {'BASE_URL': f'{PAYMENT_GATEWAY_URL}/card', 'TIMEOUT': 6, 'HEDGE_AFTER': 1.5},
 }
+PAYMENT_RECONCILE_DELAY_SECONDS = 30  # Before a charge with an unknown outcome is looked up
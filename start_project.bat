@@ -29,6 +29,10 @@ REM Start backend server
 echo 🚀 Starting Django backend server...
 start "Koikhabo Backend" cmd /k "python manage.py runserver"
 
+REM Start the background job worker (reward points, ratings, dashboard refreshes)
+echo ⚙️ Starting background job worker...
+start "Koikhabo Jobs" cmd /k "python manage.py run_jobs"
+
 REM Wait a moment for backend to start
 timeout /t 3 /nobreak > nul
 